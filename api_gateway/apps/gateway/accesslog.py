@@ -0,0 +1,168 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ACCESS_LOG_SETTINGS = {
+    'ENABLED': True,
+    # Частка успішних запитів, які потрапляють у лог
+    'SAMPLE_RATE': 1.0,
+    # Помилки (5xx) і повільні запити логуються завжди
+    'ALWAYS_LOG_ERRORS': True,
+    'SLOW_MS': 1000,
+    'HEADERS': ['User-Agent', 'Authorization'],
+    'REDACT_HEADERS': ['Authorization', 'Cookie', 'X-Internal-Identity'],
+    'QUEUE_SIZE': 10000,
+    # Файл для записів; порожньо - stdout
+    'FILE': '',
+}
+
+
+def get_access_log_settings():
+    options = dict(DEFAULT_ACCESS_LOG_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_ACCESS_LOG', {}))
+    return options
+
+
+class JsonRecordFormatter(logging.Formatter):
+    '''Запис логу доступу -> один рядок JSON (виконується у фоновому потоці)'''
+
+    def format(self, record):
+        return json.dumps(record.args, separators=(',', ':'), default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    '''Кладе запис у чергу як є, без форматування; при повній черзі - відкидає'''
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Форматування відкладаємо до фонового потоку
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLog:
+    '''Один структурований запис на запит gateway.
+
+    Запит лише складає невеликий dict і кладе його в чергу; серіалізацію і
+    запис виконує QueueListener у фоновому потоці.
+    '''
+
+    def __init__(self):
+        self.options = get_access_log_settings()
+        self.redact = {header.lower() for header in self.options['REDACT_HEADERS']}
+        self.logger = logging.getLogger('gateway.access')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = None
+        self.listener = None
+        self._lock = threading.Lock()
+        self.sampled_out = 0
+
+    def _ensure_started(self):
+        if self.listener is not None:
+            return
+        with self._lock:
+            if self.listener is not None:
+                return
+            if self.options['FILE']:
+                output = logging.FileHandler(self.options['FILE'])
+            else:
+                output = logging.StreamHandler(sys.stdout)
+            output.setFormatter(JsonRecordFormatter())
+
+            log_queue = queue.Queue(self.options['QUEUE_SIZE'])
+            self.handler = NonBlockingQueueHandler(log_queue)
+            self.logger.addHandler(self.handler)
+            self.listener = QueueListener(log_queue, output)
+            self.listener.start()
+
+    def should_log(self, status_code, duration):
+        if not self.options['ENABLED']:
+            return False
+        if self.options['ALWAYS_LOG_ERRORS'] and (status_code is None or status_code >= 500):
+            return True
+        if duration * 1000 >= self.options['SLOW_MS']:
+            return True
+        sample_rate = self.options['SAMPLE_RATE']
+        if sample_rate >= 1 or random.random() < sample_rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def get_headers(self, request):
+        headers = {}
+        for header in self.options['HEADERS']:
+            value = request.headers.get(header)
+            if value is None:
+                continue
+            headers[header] = '[REDACTED]' if header.lower() in self.redact else value
+        return headers
+
+    def log(self, request, response, duration):
+        '''Запис про оброблений запит (duration - секунди)'''
+        status_code = response.status_code if response is not None else None
+        if not self.should_log(status_code, duration):
+            return
+        self._ensure_started()
+
+        route = getattr(request, 'gateway_route', None)
+        claims = getattr(request, 'jwt_claims', None)
+        record = {
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'route': route.prefix if route else None,
+            'service': route.service if route else None,
+            'status': status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'upstream_ms': round(request.gateway_upstream_seconds * 1000, 2)
+            if hasattr(request, 'gateway_upstream_seconds') else None,
+            'instance': getattr(request, 'gateway_instance', None),
+            'cache': response.get('X-Cache') if response is not None else None,
+            'client_ip': get_client_ip(request),
+            'user_id': claims.get(settings.JWT_USER_ID_CLAIM) if claims else None,
+            'headers': self.get_headers(request),
+        }
+        # dict як єдиний аргумент: logging зберігає його в record.args
+        self.logger.info('access', record)
+
+    def stats(self):
+        return {
+            'sampled_out': self.sampled_out,
+            'dropped': self.handler.dropped if self.handler else 0,
+            'queued': self.handler.queue.qsize() if self.handler else 0,
+        }
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+
+
+def get_client_ip(request):
+    '''IP клієнта з урахуванням X-Forwarded-For'''
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+access_log = AccessLog()
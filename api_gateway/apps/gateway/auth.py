@@ -0,0 +1,42 @@
+from django.conf import settings
+
+from shared import tokens
+from shared.identity import sign_identity
+from shared.tokens import get_bearer_token
+
+
+def get_verifying_key():
+    return settings.JWT_VERIFYING_KEY or settings.JWT_SIGNING_KEY
+
+
+def decode_access_token(token):
+    '''Перевіряє access токен simplejwt (підпис, exp, тип) і повертає claims'''
+    key = get_verifying_key()
+    if not key:
+        return None
+    return tokens.decode_access_token(token, key, settings.JWT_ALGORITHM)
+
+
+def get_token_claims(request):
+    '''Claims перевіреного access токена запиту (кешуються на request)'''
+    if not hasattr(request, 'jwt_claims'):
+        token = get_bearer_token(request)
+        request.jwt_claims = decode_access_token(token) if token else None
+    return request.jwt_claims
+
+
+def get_identity_header(request):
+    '''Підписана ідентичність користувача для сервісів або None'''
+    if not settings.INTERNAL_IDENTITY_SECRET:
+        return None
+    claims = get_token_claims(request)
+    if not claims or claims.get(settings.JWT_USER_ID_CLAIM) is None:
+        return None
+
+    identity = {
+        'user_id': claims[settings.JWT_USER_ID_CLAIM],
+        'exp': claims['exp'],
+    }
+    if claims.get('email'):
+        identity['email'] = claims['email']
+    return sign_identity(identity, settings.INTERNAL_IDENTITY_SECRET)
@@ -0,0 +1,159 @@
+import json
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpRequest, QueryDict
+
+from .auth import get_token_claims
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BATCH_SETTINGS = {
+    'MAX_REQUESTS': 10,
+    'METHODS': ['GET'],
+    # Потоки для частин batch у sync режимі (спільні для всіх запитів)
+    'MAX_WORKERS': 32,
+    'PATH_PREFIX': '/api/',
+}
+
+# Заголовки батьківського запиту, які не переходять у частини
+EXCLUDED_META = {
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'QUERY_STRING',
+    # Частини не стискаються окремо - стискається вся відповідь batch
+    'HTTP_ACCEPT_ENCODING',
+    'HTTP_IF_NONE_MATCH',
+}
+
+# Заголовки відповіді частини, які повертаємо клієнту
+PART_HEADERS = ['Content-Type', 'Cache-Control', 'ETag', 'X-Cache', 'Retry-After']
+
+
+def get_batch_settings():
+    options = dict(DEFAULT_BATCH_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_BATCH', {}))
+    return options
+
+
+class BatchError(Exception):
+    '''Некоректний batch запит'''
+
+
+def parse_batch(request, options, batch_path):
+    '''Тіло batch запиту -> список частин {id, method, path, query, body}'''
+    try:
+        data = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BatchError('Request body must be valid JSON')
+
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("'requests' must be a non-empty list")
+    if len(items) > options['MAX_REQUESTS']:
+        raise BatchError(f"At most {options['MAX_REQUESTS']} requests per batch allowed")
+
+    parts = []
+    seen_ids = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f"Request {index} must be an object")
+
+        part_id = str(item.get('id', index))
+        if part_id in seen_ids:
+            raise BatchError(f"Duplicate request id: {part_id}")
+        seen_ids.add(part_id)
+
+        method = str(item.get('method', 'GET')).upper()
+        if method not in options['METHODS']:
+            raise BatchError(f"Method {method} is not allowed in batch")
+
+        path = item.get('path')
+        if not isinstance(path, str) or not path.startswith(options['PATH_PREFIX']):
+            raise BatchError(f"Request {part_id}: path must start with {options['PATH_PREFIX']}")
+        if path.startswith(batch_path):
+            raise BatchError(f"Request {part_id}: nested batch requests are not allowed")
+
+        query = item.get('query') or {}
+        if not isinstance(query, dict):
+            raise BatchError(f"Request {part_id}: query must be an object")
+
+        parts.append({
+            'id': part_id,
+            'method': method,
+            'path': path,
+            'query': query,
+            'body': item.get('body'),
+        })
+    return parts
+
+
+def build_subrequest(request, part):
+    '''HttpRequest частини batch з заголовками і авторизацією батьківського'''
+    subrequest = HttpRequest()
+    subrequest.META = {
+        key: value for key, value in request.META.items()
+        if key not in EXCLUDED_META
+    }
+    subrequest.method = part['method']
+    subrequest.path = subrequest.path_info = part['path']
+    subrequest.META['REQUEST_METHOD'] = part['method']
+    subrequest.META['PATH_INFO'] = part['path']
+
+    query_string = urlencode(part['query'], doseq=True)
+    subrequest.META['QUERY_STRING'] = query_string
+    subrequest.GET = QueryDict(query_string)
+
+    body = b''
+    if part['body'] is not None:
+        body = json.dumps(part['body']).encode('utf-8')
+        subrequest.META['CONTENT_TYPE'] = 'application/json'
+        subrequest.META['CONTENT_LENGTH'] = str(len(body))
+    subrequest._body = body
+
+    # Токен перевірено один раз для всього batch
+    subrequest.jwt_claims = get_token_claims(request)
+    subrequest.gateway_batch = True
+    return subrequest
+
+
+def decode_part(response):
+    '''Відповідь частини -> {status, headers, body}'''
+    headers = {
+        key: response[key] for key in PART_HEADERS if response.has_header(key)
+    }
+    content = response.content
+    body = None
+    if content:
+        if 'json' in response.get('Content-Type', ''):
+            try:
+                body = json.loads(content)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                body = content.decode('utf-8', 'replace')
+        else:
+            body = content.decode('utf-8', 'replace')
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def error_part(error):
+    logger.error(f"Batch part failed: {error}")
+    return {'status': 500, 'headers': {}, 'body': {'error': 'Internal server error'}}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    '''Спільний пул потоків для частин batch'''
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_batch_settings()['MAX_WORKERS'],
+                    thread_name_prefix='gateway-batch')
+    return _executor
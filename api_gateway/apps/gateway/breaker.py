@@ -0,0 +1,166 @@
+import threading
+import time
+import logging
+from collections import deque
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_BREAKER_SETTINGS = {
+    'WINDOW_SIZE': 20,                # скільки останніх викликів враховуємо
+    'MIN_CALLS': 10,                  # мінімум викликів для рішення
+    'FAILURE_RATE_THRESHOLD': 0.5,    # частка помилок для відкриття
+    'SLOW_CALL_THRESHOLD': 5,         # виклик довший за це (сек) - повільний
+    'SLOW_CALL_RATE_THRESHOLD': 0.8,  # частка повільних для відкриття
+    'OPEN_SECONDS': 30,               # скільки тримати відкритим
+    'HALF_OPEN_MAX_CALLS': 3,         # пробні виклики в half_open
+}
+
+
+def get_breaker_settings(service_name):
+    breakers = getattr(settings, 'GATEWAY_CIRCUIT_BREAKER', {})
+    options = dict(DEFAULT_BREAKER_SETTINGS)
+    options.update(breakers.get('default', {}))
+    options.update(breakers.get(service_name, {}))
+    return options
+
+
+class CircuitBreaker:
+    '''Circuit breaker для одного сервіса.
+
+    closed - виклики йдуть, результати пишуться у вікно;
+    open - виклики одразу відхиляються до кінця OPEN_SECONDS;
+    half_open - пропускаємо HALF_OPEN_MAX_CALLS пробних викликів,
+    будь-яка помилка знову відкриває breaker, всі успішні - закривають.
+    '''
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.options = get_breaker_settings(service_name)
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=self.options['WINDOW_SIZE'])
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(
+            f"Circuit breaker for {self.service_name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        elif state == HALF_OPEN:
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+        elif state == CLOSED:
+            self._calls.clear()
+
+    def retry_after(self):
+        '''Скільки секунд до наступної пробної спроби'''
+        if self.state != OPEN:
+            return 0
+        return max(0, self.options['OPEN_SECONDS'] - (time.monotonic() - self._opened_at))
+
+    def allow(self):
+        '''Чи можна зараз викликати сервіс'''
+        with self._lock:
+            if self.state == OPEN and self.retry_after() <= 0:
+                self._transition(HALF_OPEN)
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._half_open_calls < self.options['HALF_OPEN_MAX_CALLS']:
+                self._half_open_calls += 1
+                return True
+
+            self.rejected += 1
+            return False
+
+    def cancel(self):
+        '''Дозволений виклик так і не відбувся - повертаємо пробний слот'''
+        with self._lock:
+            if self.state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record(self, success, duration):
+        '''Записує результат виклику (success - без помилки і 5xx)'''
+        slow = duration >= self.options['SLOW_CALL_THRESHOLD']
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if not success or slow:
+                    self._transition(OPEN)
+                    return
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.options['HALF_OPEN_MAX_CALLS']:
+                    self._transition(CLOSED)
+                return
+
+            if self.state != CLOSED:
+                return
+
+            self._calls.append((success, slow))
+            if len(self._calls) < self.options['MIN_CALLS']:
+                return
+
+            total = len(self._calls)
+            failure_rate = sum(1 for ok, _ in self._calls if not ok) / total
+            slow_rate = sum(1 for _, is_slow in self._calls if is_slow) / total
+            if (failure_rate >= self.options['FAILURE_RATE_THRESHOLD']
+                    or slow_rate >= self.options['SLOW_CALL_RATE_THRESHOLD']):
+                self._transition(OPEN)
+
+    def stats(self):
+        with self._lock:
+            total = len(self._calls)
+            return {
+                'state': self.state,
+                'calls_in_window': total,
+                'failure_rate': round(
+                    sum(1 for ok, _ in self._calls if not ok) / total, 3) if total else 0,
+                'slow_call_rate': round(
+                    sum(1 for _, slow in self._calls if slow) / total, 3) if total else 0,
+                'retry_after': round(self.retry_after(), 1),
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+class CircuitBreakerRegistry:
+    '''Circuit breaker-и по сервісам'''
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, service_name):
+        breaker = self._breakers.get(service_name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(service_name)
+                if breaker is None:
+                    breaker = CircuitBreaker(service_name)
+                    self._breakers[service_name] = breaker
+        return breaker
+
+    def stats(self):
+        return {
+            service_name: self.get(service_name).stats()
+            for service_name in settings.MICROSERVICES
+        }
+
+
+circuit_breakers = CircuitBreakerRegistry()
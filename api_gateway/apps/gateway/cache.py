@@ -0,0 +1,273 @@
+import hashlib
+import math
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .compression import response_compressor
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CACHE_SETTINGS = {
+    'ENABLED': True,
+    'KEY_PREFIX': 'gateway:response',
+    'LOCAL_MAX_ENTRIES': 512,
+    'VARY_HEADERS': ['Accept', 'Accept-Language'],
+    'ROUTES': [],
+}
+
+
+def get_cache_settings():
+    options = dict(DEFAULT_CACHE_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_RESPONSE_CACHE', {}))
+    return options
+
+
+def parse_cache_control(value):
+    '''Cache-Control -> dict директив'''
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if '=' in part:
+            name, _, arg = part.partition('=')
+            directives[name.strip()] = arg.strip().strip('"')
+        else:
+            directives[part] = True
+    return directives
+
+
+class LRUCache:
+    '''Невеликий потокобезпечний LRU з TTL для кешу в процесі'''
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachePolicy:
+    '''Правило кешування для маршруту'''
+
+    def __init__(self, pattern, ttl):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.ttl = ttl
+
+    def matches(self, path):
+        return self.regex.match(path) is not None
+
+
+class ResponseCache:
+    '''Кеш відповідей для публічних GET маршрутів.
+
+    Два рівні: LRU в процесі перед спільним Django cache. Ключ будується з
+    шляху, відсортованих query параметрів і заголовків з VARY_HEADERS.
+    Зберігаються тільки відповіді на GET, HEAD віддається з тих самих записів.
+    Запити з Authorization не кешуються.
+    '''
+
+    def __init__(self):
+        self.options = get_cache_settings()
+        self.policies = [
+            CachePolicy(route['pattern'], route['ttl'])
+            for route in self.options['ROUTES']
+        ]
+        self.local = LRUCache(self.options['LOCAL_MAX_ENTRIES'])
+        self.counters = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'not_modified': 0,
+            'bypass': 0,
+        }
+
+    def _count(self, name):
+        self.counters[name] += 1
+
+    def get_policy(self, request):
+        '''Правило кешування для запиту або None'''
+        if not self.options['ENABLED'] or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.headers.get('Authorization'):
+            return None
+        for policy in self.policies:
+            if policy.matches(request.path):
+                return policy
+        return None
+
+    def make_key(self, request):
+        query = sorted(request.GET.lists())
+        vary = [
+            (header, request.headers.get(header, ''))
+            for header in self.options['VARY_HEADERS']
+        ]
+        raw = f"{request.path}?{query}|{vary}"
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f"{self.options['KEY_PREFIX']}:{digest}"
+
+    def lookup(self, request, policy):
+        '''Відповідь з кешу або None'''
+        request_cache_control = parse_cache_control(
+            request.headers.get('Cache-Control'))
+        if 'no-cache' in request_cache_control or 'no-store' in request_cache_control:
+            self._count('bypass')
+            return None
+
+        key = self.make_key(request)
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('local_hits')
+        else:
+            entry = cache.get(key)
+            if entry is not None and entry['expires'] > time.time():
+                self._count('shared_hits')
+                self.local.set(key, entry, entry['expires'])
+            else:
+                self._count('misses')
+                return None
+
+        return self.respond(request, entry, 'HIT', key)
+
+    def store(self, request, policy, response):
+        '''Зберігає відповідь сервіса і повертає відповідь клієнту'''
+        if response.status_code != 200 or getattr(response, 'streaming', False):
+            return response
+        # Відповідь на HEAD без тіла - зберігаємо тільки GET, HEAD віддається з них
+        if request.method != 'GET':
+            return response
+
+        upstream_cache_control = parse_cache_control(
+            response.get('Cache-Control'))
+        if 'no-store' in upstream_cache_control or 'private' in upstream_cache_control:
+            return response
+
+        ttl = policy.ttl
+        for directive in ('s-maxage', 'max-age'):
+            if directive in upstream_cache_control:
+                try:
+                    ttl = min(ttl, int(upstream_cache_control[directive]))
+                except (TypeError, ValueError):
+                    pass
+                break
+
+        content = response.content
+        etag = response.get('ETag') or quote_etag(
+            hashlib.sha1(content).hexdigest())
+        entry = {
+            'status': response.status_code,
+            'content': content,
+            'content_type': response.get('Content-Type', 'application/json'),
+            'etag': etag,
+            'expires': time.time() + ttl,
+        }
+
+        key = None
+        if ttl > 0:
+            key = self.make_key(request)
+            self.local.set(key, entry, entry['expires'])
+            cache.set(key, entry, ttl)
+            self._count('stores')
+
+        return self.respond(request, entry, 'MISS', key)
+
+    def get_encoded(self, request, entry, key):
+        '''(тіло, кодування) для клієнта.
+
+        Стиснені варіанти зберігаються в самому записі кешу, тому гаряча
+        сторінка стискається один раз на кодування, а не на кожен запит.
+        '''
+        encoding = response_compressor.choose_encoding(
+            request, entry['content_type'], len(entry['content']))
+        if encoding is None:
+            return entry['content'], None
+
+        encoded = entry.setdefault('encoded', {})
+        if encoding not in encoded:
+            encoded[encoding] = response_compressor.compress_body(entry['content'], encoding)
+            ttl = math.ceil(entry['expires'] - time.time())
+            if key and ttl > 0:
+                cache.set(key, entry, ttl)
+        return encoded[encoding], encoding
+
+    def respond(self, request, entry, cache_status, key=None):
+        '''Відповідь з запису кешу; 304 якшо ETag клієнта збігається'''
+        max_age = max(0, math.ceil(entry['expires'] - time.time()))
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # Слабке порівняння: стиснені варіанти віддаються з W/ ETag
+            etags = [etag.removeprefix('W/') for etag in parse_etags(if_none_match)]
+            if '*' in etags or entry['etag'] in etags:
+                self._count('not_modified')
+                response = HttpResponseNotModified()
+                response['ETag'] = entry['etag']
+                response['Cache-Control'] = f'public, max-age={max_age}'
+                response['X-Cache'] = cache_status
+                return response
+
+        content, encoding = self.get_encoded(request, entry, key)
+        response = HttpResponse(
+            content if request.method != 'HEAD' else b'',
+            status=entry['status'],
+            content_type=entry['content_type']
+        )
+        if request.method == 'HEAD':
+            response['Content-Length'] = str(len(content))
+        response['ETag'] = entry['etag']
+        if encoding:
+            response_compressor.set_encoding_headers(response, encoding)
+        if response_compressor.min_size_for(entry['content_type']) is not None:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response['Cache-Control'] = f'public, max-age={max_age}'
+        response['X-Cache'] = cache_status
+        return response
+
+    def stats(self):
+        counters = dict(self.counters)
+        hits = counters['local_hits'] + counters['shared_hits']
+        lookups = hits + counters['misses']
+        counters['hit_ratio'] = round(hits / lookups, 3) if lookups else None
+        counters['local_entries'] = len(self.local)
+        return counters
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,16 @@
+from django.core.checks import Warning, register
+
+from .auth import get_verifying_key
+
+
+@register()
+def check_jwt_key(app_configs, **kwargs):
+    '''Без ключа gateway не перевіряє токени і не розрізняє користувачів'''
+    if get_verifying_key():
+        return []
+    return [Warning(
+        'JWT_SIGNING_KEY and JWT_VERIFYING_KEY are empty: tokens are not verified.',
+        hint='All requests are rate limited and prioritised as anonymous. '
+             'Set JWT_SIGNING_KEY to the user-service signing key.',
+        id='gateway.W001',
+    )]
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import threading
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_COALESCING_SETTINGS = {
+    'ENABLED': True,
+    'METHODS': ['GET', 'HEAD'],
+    # Заголовки, які входять в ключ (Authorization - щоб не змішувати користувачів)
+    'KEY_HEADERS': ['Authorization', 'Accept', 'Accept-Language'],
+    'WAIT_TIMEOUT': 10,
+}
+
+
+def get_coalescing_settings():
+    options = dict(DEFAULT_COALESCING_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_COALESCING', {}))
+    return options
+
+
+class CoalesceTimeout(Exception):
+    '''Відповідь на спільний запит не прийшла за WAIT_TIMEOUT'''
+
+
+class ResponseSnapshot:
+    '''Незмінна копія відповіді, з якої кожен запит будує свою HttpResponse'''
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.content = response.content
+        self.headers = list(response.items())
+
+    def to_response(self):
+        response = HttpResponse(self.content, status=self.status_code)
+        for key, value in self.headers:
+            response[key] = value
+        return response
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    '''Об'єднує однакові одночасні запити в один виклик сервіса.
+
+    Перший запит з ключем (лідер) виконує виклик, решта чекають його
+    результат не довше timeout секунд.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._async_calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout):
+        '''Повертає (результат, чи був він отриманий від іншого запиту)'''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(timeout):
+            self.timeouts += 1
+            raise CoalesceTimeout(key)
+        if call.error is not None:
+            raise call.error
+        self.coalesced += 1
+        return call.result, True
+
+    async def ado(self, key, fn, timeout):
+        '''Async варіант do(): fn - корутинна функція.
+
+        Виклик виконується окремою задачею: якщо запит-лідер скасовано
+        (клієнт відключився), виклик продовжується для тих, хто чекає.
+        '''
+        task = self._async_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._async_calls[key] = task
+            task.add_done_callback(partial(self._finish_async_call, key))
+            self.leaders += 1
+            return await asyncio.shield(task), False
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise CoalesceTimeout(key)
+        self.coalesced += 1
+        return result, True
+
+    def _finish_async_call(self, key, task):
+        if self._async_calls.get(key) is task:
+            del self._async_calls[key]
+        # Виняток виклику отримують очікуючі; позначаємо його прочитаним
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+            'in_flight': len(self._calls) + len(self._async_calls),
+        }
+
+
+class RequestCoalescer:
+    '''Правила об'єднання запитів gateway (маршрути з options.coalesce)'''
+
+    def __init__(self):
+        self.options = get_coalescing_settings()
+        self.flight = SingleFlight()
+
+    def applies(self, request, route):
+        return (
+            self.options['ENABLED']
+            and route is not None
+            and route.options.get('coalesce', False)
+            and request.method in self.options['METHODS']
+        )
+
+    def make_key(self, request):
+        query = sorted(request.GET.lists())
+        headers = [
+            request.headers.get(header, '')
+            for header in self.options['KEY_HEADERS']
+        ]
+        raw = f"{request.method} {request.path}?{query}|{headers}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def run(self, request, fn):
+        '''Виконує fn() один раз для всіх однакових запитів'''
+        snapshot, _ = self.flight.do(
+            self.make_key(request),
+            lambda: ResponseSnapshot(fn()),
+            self.options['WAIT_TIMEOUT'])
+        return snapshot.to_response()
+
+    async def arun(self, request, fn):
+        async def call():
+            return ResponseSnapshot(await fn())
+
+        snapshot, _ = await self.flight.ado(
+            self.make_key(request), call, self.options['WAIT_TIMEOUT'])
+        return snapshot.to_response()
+
+    def stats(self):
+        return self.flight.stats()
+
+
+request_coalescer = RequestCoalescer()
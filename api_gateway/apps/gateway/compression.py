@@ -0,0 +1,196 @@
+import gzip
+import zlib
+import logging
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий - без нього тільки gzip
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_COMPRESSION_SETTINGS = {
+    'ENABLED': True,
+    # Порядок - наш пріоритет серед тих, що приймає клієнт
+    'ENCODINGS': ['br', 'gzip'],
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    # Префікс Content-Type -> мінімальний розмір тіла для стиснення (байт)
+    'CONTENT_TYPES': {
+        'application/json': 1024,
+        'text/': 1024,
+        'application/javascript': 1024,
+        'image/svg+xml': 1024,
+    },
+}
+
+
+def get_compression_settings():
+    options = dict(DEFAULT_COMPRESSION_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_COMPRESSION', {}))
+    return options
+
+
+def parse_accept_encoding(value):
+    '''Accept-Encoding -> {кодування: q}'''
+    accepted = {}
+    for part in (value or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+class ResponseCompressor:
+    '''Стиснення відповідей gateway за Accept-Encoding клієнта'''
+
+    def __init__(self):
+        self.options = get_compression_settings()
+        self.encodings = [
+            encoding for encoding in self.options['ENCODINGS']
+            if encoding != 'br' or brotli is not None
+        ]
+        self.counters = {'compressed': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def min_size_for(self, content_type):
+        '''Поріг розміру для типу або None, якщо тип не стискаємо'''
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        best = None
+        for prefix, min_size in self.options['CONTENT_TYPES'].items():
+            if content_type.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+                best = (prefix, min_size)
+        return best[1] if best else None
+
+    def choose_encoding(self, request, content_type, size=None):
+        '''Кодування для відповіді або None'''
+        if not self.options['ENABLED']:
+            return None
+        min_size = self.min_size_for(content_type)
+        if min_size is None or (size is not None and size < min_size):
+            return None
+
+        accepted = parse_accept_encoding(request.headers.get('Accept-Encoding'))
+        wildcard = accepted.get('*', 0)
+        for encoding in self.encodings:
+            if accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return None
+
+    def compress_body(self, content, encoding):
+        if encoding == 'br':
+            compressed = brotli.compress(content, quality=self.options['BROTLI_QUALITY'])
+        else:
+            compressed = gzip.compress(content, compresslevel=self.options['GZIP_LEVEL'], mtime=0)
+        self.counters['compressed'] += 1
+        self.counters['bytes_in'] += len(content)
+        self.counters['bytes_out'] += len(compressed)
+        return compressed
+
+    def stream_compressor(self, encoding):
+        '''(compress, flush) для стиснення потоку; лічильники оновлюються по частинах'''
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.options['BROTLI_QUALITY'])
+            process, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.options['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            process, finish = compressor.compress, compressor.flush
+        self.counters['compressed'] += 1
+
+        def compress(chunk):
+            data = process(chunk)
+            self.counters['bytes_in'] += len(chunk)
+            self.counters['bytes_out'] += len(data)
+            return data
+
+        def flush():
+            data = finish()
+            self.counters['bytes_out'] += len(data)
+            return data
+
+        return compress, flush
+
+    def compress_stream(self, chunks, encoding):
+        '''Стискає потік частин тіла на льоту'''
+        compress, flush = self.stream_compressor(encoding)
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield flush()
+
+    async def acompress_stream(self, chunks, encoding):
+        '''Async варіант compress_stream'''
+        compress, flush = self.stream_compressor(encoding)
+        async for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield flush()
+
+    @staticmethod
+    def set_encoding_headers(response, encoding):
+        response['Content-Encoding'] = encoding
+        # Стиснене тіло вже не байт в байт те, на яке вказував сильний ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+    def compress(self, request, response):
+        '''Стискає відповідь, якщо клієнт і тип вмісту це дозволяють'''
+        if (request.method == 'HEAD'
+                or not 200 <= response.status_code < 300
+                or response.status_code in (204, 206)
+                or response.has_header('Content-Encoding')):
+            return response
+
+        content_type = response.get('Content-Type')
+        if self.min_size_for(content_type) is not None:
+            patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming:
+            length = response.get('Content-Length')
+            encoding = self.choose_encoding(
+                request, content_type, int(length) if length else None)
+            if encoding is None:
+                return response
+            if response.is_async:
+                response.streaming_content = self.acompress_stream(
+                    response.streaming_content, encoding)
+            else:
+                response.streaming_content = self.compress_stream(
+                    response.streaming_content, encoding)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            encoding = self.choose_encoding(request, content_type, len(response.content))
+            if encoding is None:
+                return response
+            response.content = self.compress_body(response.content, encoding)
+            response['Content-Length'] = str(len(response.content))
+
+        self.set_encoding_headers(response, encoding)
+        return response
+
+    def stats(self):
+        counters = dict(self.counters)
+        counters['encodings'] = self.encodings
+        if counters['bytes_in']:
+            counters['ratio'] = round(counters['bytes_out'] / counters['bytes_in'], 3)
+        return counters
+
+
+response_compressor = ResponseCompressor()
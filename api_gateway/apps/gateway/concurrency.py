@@ -0,0 +1,324 @@
+import asyncio
+import math
+import re
+import threading
+import logging
+from itertools import count
+
+from django.conf import settings
+
+from .auth import get_token_claims
+
+
+logger = logging.getLogger(__name__)
+
+
+# Менше число - вищий пріоритет
+PRIORITIES = {
+    'critical': 0,
+    'high': 1,
+    'normal': 2,
+    'low': 3,
+}
+
+DEFAULT_CONCURRENCY_SETTINGS = {
+    'ENABLED': True,
+    'ALGORITHM': 'gradient',     # 'aimd' або 'gradient'
+    'INITIAL_LIMIT': 20,
+    'MIN_LIMIT': 4,
+    'MAX_LIMIT': 200,
+    'BACKOFF_RATIO': 0.9,        # у скільки разів зменшуємо ліміт при перевантаженні
+    'TARGET_LATENCY': 1.0,       # aimd: відповідь довша за це (сек) - перевантаження
+    'RTT_TOLERANCE': 1.5,        # gradient: допустиме зростання затримки відносно базової
+    'SMOOTHING': 0.2,            # gradient: частка нового значення ліміту
+    'MAX_QUEUE': 100,
+    # Скільки секунд запит з пріоритетом може чекати в черзі
+    'QUEUE_TIMEOUTS': {'critical': 5, 'high': 3, 'normal': 1, 'low': 0.2},
+}
+
+
+def get_concurrency_settings(service_name):
+    limits = getattr(settings, 'GATEWAY_CONCURRENCY', {})
+    options = dict(DEFAULT_CONCURRENCY_SETTINGS)
+    options.update(limits.get('default', {}))
+    options.update(limits.get(service_name, {}))
+    return options
+
+
+class AIMDLimit:
+    '''Additive increase / multiplicative decrease по затримці та помилкам'''
+
+    def __init__(self, options):
+        self.options = options
+        self.limit = float(options['INITIAL_LIMIT'])
+
+    def update(self, rtt, dropped, in_flight):
+        if dropped or rtt > self.options['TARGET_LATENCY']:
+            self.limit = max(self.options['MIN_LIMIT'], self.limit * self.options['BACKOFF_RATIO'])
+        elif in_flight * 2 >= self.limit:
+            # Збільшуємо тільки коли ліміт реально використовується
+            self.limit = min(self.options['MAX_LIMIT'], self.limit + 1)
+
+
+class GradientLimit:
+    '''Ліміт за відношенням базової затримки до поточної.
+
+    Поки затримка близька до базової (довгострокове середнє), ліміт росте
+    на sqrt(limit); коли сервіс починає ставити запити в чергу і затримка
+    росте, ліміт зменшується пропорційно.
+    '''
+
+    def __init__(self, options):
+        self.options = options
+        self.limit = float(options['INITIAL_LIMIT'])
+        self.long_rtt = None
+
+    def update(self, rtt, dropped, in_flight):
+        if dropped:
+            self.limit = max(self.options['MIN_LIMIT'], self.limit * self.options['BACKOFF_RATIO'])
+            return
+
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+        else:
+            self.long_rtt += (rtt - self.long_rtt) / 100
+
+        if rtt <= 0:
+            return
+        gradient = max(0.5, min(1.0, self.options['RTT_TOLERANCE'] * self.long_rtt / rtt))
+        new_limit = self.limit * gradient
+        if in_flight * 2 >= self.limit:
+            new_limit += math.sqrt(self.limit)
+
+        smoothing = self.options['SMOOTHING']
+        self.limit = (1 - smoothing) * self.limit + smoothing * new_limit
+        self.limit = max(self.options['MIN_LIMIT'], min(self.options['MAX_LIMIT'], self.limit))
+
+
+LIMIT_ALGORITHMS = {
+    'aimd': AIMDLimit,
+    'gradient': GradientLimit,
+}
+
+
+class _Waiter:
+    _seq = count()
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.order = (priority, next(self._seq))
+        self.granted = False
+
+    def wake(self):
+        raise NotImplementedError
+
+
+class _SyncWaiter(_Waiter):
+    def __init__(self, priority):
+        super().__init__(priority)
+        self.event = threading.Event()
+
+    def wake(self):
+        self.event.set()
+
+
+class _AsyncWaiter(_Waiter):
+    def __init__(self, priority):
+        super().__init__(priority)
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self._set)
+
+    def _set(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ConcurrencyLimiter:
+    '''Адаптивний ліміт одночасних запитів до одного сервіса.
+
+    Запити понад ліміт чекають у черзі обмеженого розміру; вільний слот
+    отримує запит з найвищим пріоритетом. Коли черга повна, новий запит
+    витісняє найменш пріоритетний, а якщо такого немає - відхиляється.
+    '''
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.options = get_concurrency_settings(service_name)
+        algorithm = self.options['ALGORITHM']
+        if algorithm not in LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown concurrency algorithm for {service_name}: {algorithm}")
+        self.algorithm = LIMIT_ALGORITHMS[algorithm](self.options)
+        self._lock = threading.Lock()
+        self._queue = []
+        self.in_flight = 0
+
+        self.queued = 0
+        self.shed = {name: 0 for name in PRIORITIES}
+
+    @property
+    def limit(self):
+        return int(self.algorithm.limit)
+
+    def queue_timeout(self, priority, timeout=None):
+        timeouts = self.options['QUEUE_TIMEOUTS']
+        queue_timeout = timeouts.get(priority, timeouts['normal'])
+        if timeout is not None:
+            queue_timeout = max(0, min(queue_timeout, timeout))
+        return queue_timeout
+
+    def _try_acquire(self, waiter):
+        '''Слот одразу (True), місце в черзі (None) або відмова (False)'''
+        if not self.options['ENABLED']:
+            return True
+        if self.in_flight < self.limit and not self._queue:
+            self.in_flight += 1
+            return True
+
+        if len(self._queue) >= self.options['MAX_QUEUE']:
+            worst = max(self._queue, key=lambda queued: queued.order)
+            if worst.order <= waiter.order:
+                return False
+            # Витісняємо менш пріоритетний запит
+            self._queue.remove(worst)
+            worst.wake()
+
+        self._queue.append(waiter)
+        self.queued += 1
+        return None
+
+    def _finish_wait(self, waiter, priority):
+        with self._lock:
+            if waiter.granted:
+                return True
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+            self.shed[priority] += 1
+        return False
+
+    def _reject(self, priority):
+        with self._lock:
+            self.shed[priority] += 1
+        return False
+
+    def acquire(self, priority, timeout=None):
+        '''Чекає на слот не довше QUEUE_TIMEOUTS[priority] (і timeout); False - запит відхилено'''
+        waiter = _SyncWaiter(PRIORITIES[priority])
+        with self._lock:
+            acquired = self._try_acquire(waiter)
+        if acquired is not None:
+            return acquired or self._reject(priority)
+
+        waiter.event.wait(self.queue_timeout(priority, timeout))
+        return self._finish_wait(waiter, priority)
+
+    async def aacquire(self, priority, timeout=None):
+        '''Async варіант acquire()'''
+        waiter = _AsyncWaiter(PRIORITIES[priority])
+        with self._lock:
+            acquired = self._try_acquire(waiter)
+        if acquired is not None:
+            return acquired or self._reject(priority)
+
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout(priority, timeout))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._cancel_wait(waiter)
+            raise
+        return self._finish_wait(waiter, priority)
+
+    def _cancel_wait(self, waiter):
+        '''Запит скасовано в черзі: прибираємо його або віддаємо вже виданий слот'''
+        with self._lock:
+            if waiter.granted:
+                self.in_flight -= 1
+                self._drain()
+            elif waiter in self._queue:
+                self._queue.remove(waiter)
+
+    def record(self, rtt, dropped):
+        '''Оновлює ліміт за результатом запиту (dropped - таймаут або 5xx)'''
+        if not self.options['ENABLED']:
+            return
+        with self._lock:
+            self.algorithm.update(rtt, dropped, self.in_flight)
+            self._drain()
+
+    def release(self):
+        if not self.options['ENABLED']:
+            return
+        with self._lock:
+            self.in_flight -= 1
+            self._drain()
+
+    def _drain(self):
+        while self._queue and self.in_flight < self.limit:
+            waiter = min(self._queue, key=lambda queued: queued.order)
+            self._queue.remove(waiter)
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queue': len(self._queue),
+            'queued': self.queued,
+            'shed': dict(self.shed),
+        }
+
+
+class ConcurrencyLimiterRegistry:
+    '''Ліміти одночасних запитів по сервісам'''
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, service_name):
+        limiter = self._limiters.get(service_name)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(service_name)
+                if limiter is None:
+                    limiter = ConcurrencyLimiter(service_name)
+                    self._limiters[service_name] = limiter
+        return limiter
+
+    def stats(self):
+        return {
+            service_name: self.get(service_name).stats()
+            for service_name in settings.MICROSERVICES
+        }
+
+
+concurrency_limiters = ConcurrencyLimiterRegistry()
+
+
+_priority_rules = None
+
+
+def get_priority_rules():
+    global _priority_rules
+    if _priority_rules is None:
+        _priority_rules = [
+            (re.compile(rule['pattern']), set(rule.get('methods') or []), rule['priority'])
+            for rule in getattr(settings, 'GATEWAY_PRIORITY_RULES', [])
+        ]
+    return _priority_rules
+
+
+def get_request_priority(request):
+    '''Пріоритет запиту: правила GATEWAY_PRIORITY_RULES, далі normal для
+    авторизованих користувачів і low для анонімних'''
+    for pattern, methods, priority in get_priority_rules():
+        if (not methods or request.method in methods) and pattern.match(request.path):
+            return priority
+    if get_token_claims(request):
+        return 'normal'
+    return 'low'
@@ -0,0 +1,207 @@
+import threading
+import time
+import logging
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HEDGING_SETTINGS = {
+    'ENABLED': True,
+    'METHODS': ['GET', 'HEAD'],
+    # Другий запит - якщо перший не відповів за цей перцентиль затримки
+    'PERCENTILE': 95,
+    'MIN_DELAY': 0.02,
+    'MAX_DELAY': 1.0,
+    'DEFAULT_DELAY': 0.2,        # поки вимірів менше за MIN_SAMPLES
+    'MIN_SAMPLES': 50,
+    'SAMPLE_SIZE': 1000,
+    'MAX_WORKERS': 32,           # потоки для hedge запитів у sync режимі
+}
+
+DEFAULT_RETRY_SETTINGS = {
+    'METHODS': ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'],
+    'MAX_RETRIES': 2,
+    # Бюджет: кожен запит додає BUDGET_RATIO повтору, плюс
+    # MIN_RETRIES_PER_SECOND на випадок малого трафіку
+    'BUDGET_RATIO': 0.1,
+    'MIN_RETRIES_PER_SECOND': 5,
+    'MAX_BALANCE': 20,
+}
+
+
+def get_hedging_settings():
+    options = dict(DEFAULT_HEDGING_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_HEDGING', {}))
+    return options
+
+
+def get_retry_settings():
+    options = dict(DEFAULT_RETRY_SETTINGS)
+    options.update(getattr(settings, 'GATEWAY_RETRIES', {}))
+    return options
+
+
+class LatencyTracker:
+    '''Останні затримки сервіса для обчислення перцентиля'''
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._sorted = []
+        self._dirty = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._dirty += 1
+
+    def percentile(self, p, min_samples):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            # Сортуємо не на кожен запит, а після накопичення нових вимірів
+            if self._dirty >= min_samples or not self._sorted:
+                self._sorted = sorted(self._samples)
+                self._dirty = 0
+            index = min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))
+            return self._sorted[index]
+
+
+class RetryBudget:
+    '''Спільний на весь gateway бюджет повторів і hedge запитів.
+
+    Обмежує додаткове навантаження часткою від звичайного трафіку, тому
+    під час аварії повтори не множать кількість запитів до сервісів.
+    '''
+
+    def __init__(self, options):
+        self.options = options
+        self._lock = threading.Lock()
+        self._balance = float(options['MAX_BALANCE'])
+        self._updated = time.monotonic()
+        self.denied = 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._balance = min(
+            self.options['MAX_BALANCE'],
+            self._balance + elapsed * self.options['MIN_RETRIES_PER_SECOND'])
+
+    def deposit(self):
+        '''Викликається на кожен звичайний запит'''
+        with self._lock:
+            self._balance = min(
+                self.options['MAX_BALANCE'],
+                self._balance + self.options['BUDGET_RATIO'])
+
+    def withdraw(self):
+        '''True, якщо додатковий запит вкладається в бюджет'''
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {'balance': round(self._balance, 2), 'denied': self.denied}
+
+
+class UpstreamHedging:
+    '''Hedge запити та повтори при помилках з'єднання'''
+
+    def __init__(self):
+        self.options = get_hedging_settings()
+        self.retry_options = get_retry_settings()
+        self.budget = RetryBudget(self.retry_options)
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.counters = defaultdict(lambda: {
+            'hedges': 0, 'hedge_wins': 0, 'retries': 0, 'retries_denied': 0,
+        })
+
+    def applies(self, request, route):
+        '''Чи можна дублювати запит (маршрути з options.hedge)'''
+        return (
+            self.options['ENABLED']
+            and route is not None
+            and route.options.get('hedge', False)
+            and request.method in self.options['METHODS']
+        )
+
+    def can_retry(self, request):
+        return request.method in self.retry_options['METHODS']
+
+    def _tracker(self, service_name):
+        tracker = self._trackers.get(service_name)
+        if tracker is None:
+            with self._lock:
+                tracker = self._trackers.setdefault(
+                    service_name, LatencyTracker(self.options['SAMPLE_SIZE']))
+        return tracker
+
+    def observe(self, service_name, seconds, success=True):
+        '''Результат запиту: поповнює бюджет, успішні - в статистику затримок'''
+        self.budget.deposit()
+        if success:
+            self._tracker(service_name).observe(seconds)
+
+    def delay(self, service_name):
+        '''Скільки чекати на перший запит перед hedge'''
+        value = self._tracker(service_name).percentile(
+            self.options['PERCENTILE'], self.options['MIN_SAMPLES'])
+        if value is None:
+            value = self.options['DEFAULT_DELAY']
+        return max(self.options['MIN_DELAY'], min(self.options['MAX_DELAY'], value))
+
+    def allow_hedge(self, service_name):
+        if not self.budget.withdraw():
+            return False
+        self.counters[service_name]['hedges'] += 1
+        return True
+
+    def hedge_won(self, service_name):
+        self.counters[service_name]['hedge_wins'] += 1
+
+    def allow_retry(self, service_name, attempt):
+        '''Чи повторювати після помилки з'єднання (attempt - номер повтору)'''
+        if attempt > self.retry_options['MAX_RETRIES']:
+            return False
+        if not self.budget.withdraw():
+            self.counters[service_name]['retries_denied'] += 1
+            return False
+        self.counters[service_name]['retries'] += 1
+        return True
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.options['MAX_WORKERS'],
+                        thread_name_prefix='gateway-hedge')
+        return self._executor
+
+    def stats(self):
+        return {
+            'budget': self.budget.stats(),
+            'services': {
+                service_name: dict(
+                    counters, hedge_delay=round(self.delay(service_name), 4))
+                for service_name, counters in self.counters.items()
+            },
+        }
+
+
+upstream_hedging = UpstreamHedging()
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+
+def is_lean_path(path):
+    '''Чи обслуговується шлях без sessions, auth і messages (запити проксі)'''
+    return path.startswith(tuple(getattr(settings, 'GATEWAY_LEAN_PATHS', ())))
+
+
+class LeanPathMixin:
+    '''Пропускає middleware для шляхів GATEWAY_LEAN_PATHS.
+
+    Проксі не використовує сесії, request.user і повідомлення, тому для
+    /api/* ці шари не створюють об'єктів і не звертаються до бази.
+    '''
+
+    def __call__(self, request):
+        if is_lean_path(request.path_info):
+            # Під ASGI get_response повертає корутину - її дочекається handler
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(LeanPathMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(LeanPathMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(LeanPathMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class FastPathHandlerMixin:
+    '''Handler з коротким ланцюжком GATEWAY_FAST_PATH_MIDDLEWARE.
+
+    Middleware з цього списку викликаються тільки через __call__:
+    process_view, process_exception і process_template_response
+    не підтримуються.
+    '''
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(settings.GATEWAY_FAST_PATH_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            middleware_is_async = is_async and getattr(middleware, 'async_capable', False)
+            adapted_handler = self.adapt_method_mode(
+                middleware_is_async, handler, handler_is_async,
+                name=f"middleware {middleware_path}")
+            handler = convert_exception_to_response(middleware(adapted_handler))
+            handler_is_async = middleware_is_async
+
+        self._middleware_chain = self.adapt_method_mode(is_async, handler, handler_is_async)
+
+
+class FastPathWSGIHandler(FastPathHandlerMixin, WSGIHandler):
+    pass
+
+
+class FastPathASGIHandler(FastPathHandlerMixin, ASGIHandler):
+    pass
+
+
+class FastPathWSGIApplication:
+    '''Запити проксі - через короткий ланцюжок, решта - через повний Django'''
+
+    def __init__(self, application):
+        self.application = application
+        self.fast_path = FastPathWSGIHandler()
+
+    def __call__(self, environ, start_response):
+        if is_lean_path(environ.get('PATH_INFO', '')):
+            return self.fast_path(environ, start_response)
+        return self.application(environ, start_response)
+
+
+class FastPathASGIApplication:
+    '''ASGI варіант FastPathWSGIApplication'''
+
+    def __init__(self, application):
+        self.application = application
+        self.fast_path = FastPathASGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            path = scope['path']
+            root_path = scope.get('root_path', '')
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            if is_lean_path(path):
+                return await self.fast_path(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+
+def fast_path_application(application):
+    '''Обгортає WSGI/ASGI application, якщо увімкнено GATEWAY_FAST_PATH'''
+    if not getattr(settings, 'GATEWAY_FAST_PATH', False):
+        return application
+    if isinstance(application, ASGIHandler):
+        return FastPathASGIApplication(application)
+    return FastPathWSGIApplication(application)
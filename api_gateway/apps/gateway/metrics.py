@@ -0,0 +1,205 @@
+import threading
+import time
+from bisect import bisect_left
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class ShardedMetric:
+    '''Метрика з окремими значеннями для кожного потоку.
+
+    Потік пише тільки у свій шард, тому запис не бере блокувань; шарди
+    сумуються тільки при читанні (/metrics). Блокування береться лише
+    один раз, коли потік вперше пише в метрику.
+    '''
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def _series(self, labels):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = self._new_series()
+        return series
+
+    def collect(self):
+        '''{labels: сумарні значення по всіх потоках}'''
+        totals = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, series in list(shard.items()):
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(series)
+                else:
+                    for index, value in enumerate(series):
+                        total[index] += value
+        return totals
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+
+class Counter(ShardedMetric):
+    metric_type = 'counter'
+
+    def _new_series(self):
+        return [0]
+
+    def inc(self, *labels, amount=1):
+        self._series(labels)[0] += amount
+
+    def expose(self):
+        lines = self.header()
+        for labels, (value,) in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self._series(labels)[0] -= amount
+
+
+class Histogram(ShardedMetric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self):
+        # Лічильники по кошиках (не накопичені), +Inf, сума
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, *labels):
+        series = self._series(labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def expose(self):
+        lines = self.header()
+        for labels, series in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = f'le="{bound if isinstance(bound, str) else float(bound)!r}"'
+                lines.append(
+                    f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def sample_lines(name, documentation, metric_type, samples, labelnames=()):
+    '''Рядки Prometheus для готових значень: samples - [(labels, value)]'''
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(labelnames, labels)} {format_value(value)}")
+    return lines
+
+
+class GatewayMetrics:
+    '''Метрики запитів gateway по маршрутах і сервісах'''
+
+    def __init__(self):
+        labels = ('route', 'service')
+        self.requests = Counter(
+            'gateway_requests_total', 'Requests handled by the gateway',
+            labels + ('method', 'status_class'))
+        self.duration = Histogram(
+            'gateway_request_duration_seconds',
+            'Time from request arrival to response headers at the gateway', labels)
+        self.upstream_duration = Histogram(
+            'gateway_upstream_duration_seconds',
+            'Time spent waiting for the upstream service', labels)
+        self.in_flight = Gauge(
+            'gateway_requests_in_flight', 'Requests currently handled by the gateway', labels)
+        self.metrics = [self.requests, self.duration, self.upstream_duration, self.in_flight]
+        self.collectors = []
+
+    @staticmethod
+    def route_labels(route):
+        if route is None:
+            return ('unmatched', 'none')
+        return (route.prefix, route.service)
+
+    def start(self, route):
+        '''Початок запиту; повертає мітку для finish()'''
+        labels = self.route_labels(route)
+        self.in_flight.inc(*labels)
+        return labels, time.perf_counter()
+
+    def finish(self, token, method, status_code):
+        '''Кінець запиту; повертає його тривалість у секундах'''
+        labels, started = token
+        duration = time.perf_counter() - started
+        self.in_flight.dec(*labels)
+        self.duration.observe(duration, *labels)
+        status_class = f"{status_code // 100}xx" if status_code else '5xx'
+        self.requests.inc(*labels, method, status_class)
+        return duration
+
+    def observe_upstream(self, route, seconds):
+        self.upstream_duration.observe(seconds, *self.route_labels(route))
+
+    def register_collector(self, collector):
+        '''collector() -> рядки Prometheus для метрик інших компонентів'''
+        self.collectors.append(collector)
+
+    def expose(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+gateway_metrics = GatewayMetrics()
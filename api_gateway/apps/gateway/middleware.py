@@ -1,55 +1,51 @@
-import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 
-from django.http import JsonResponse
-from django.core.cache import cache
-from django.conf import settings
+from .ratelimit import (add_rate_limit_headers, get_limiter, get_rate_limit_identity,
+                        limit_exceeded_response)
 
 
 class RateLimitMiddleware:
     '''Обмеження частоти запитів'''
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, resp):
         self.get_response = resp
+        self.limiter = get_limiter()
+        # Під ASGI працюємо без переходу в sync потік
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Пропускаєм статіку і адмінку
-        if request.path.startswith('/static/') or request.path.startswith('/admin/'):
+        if self.is_exempt(request):
             return self.get_response(request)
 
-        # Отримуємо ip клієнта
-        client_ip = self.get_client_ip(request)
-
-        # Створюємо ключ для кеша
-        cache_key = f"rate_limit:{client_ip}"
+        # Одна атомарна перевірка на запит
+        key, limit = get_rate_limit_identity(request)
+        result = self.limiter.hit(key, limit)
+        if not result.allowed:
+            return limit_exceeded_response(result)
 
-        # Отримуємо кількись запросів
-        current_request = cache.get(cache_key, 0)
+        response = self.get_response(request)
+        return add_rate_limit_headers(response, result)
 
-        # Перевіряємо ліміт
-        if current_request > settings.RATE_LIMIT_REQUESTS_PER_MINUTE:
-            return JsonResponse({
-                'error': 'Rate limit exceeded',
-                'message': f'Maximum {settings.RATE_LIMIT_REQUESTS_PER_MINUTE} requests per minute allowed'
-            }, status=429)
+    async def __acall__(self, request):
+        if self.is_exempt(request):
+            return await self.get_response(request)
 
-        # Збільшуємо лічильник
-        cache.set(cache_key, current_request + 1, 60)  # 60  секунд
+        key, limit = get_rate_limit_identity(request)
+        result = await self.limiter.ahit(key, limit)
+        if not result.allowed:
+            return limit_exceeded_response(result)
 
-        response = self.get_response(request)
+        response = await self.get_response(request)
+        return add_rate_limit_headers(response, result)
 
-        # Додаємо заголовки с інформацією по лімітам
-        response['X-RateLimit-Limit'] = str(
-            settings.RATE_LIMIT_REQUESTS_PER_MINUTE)
-        response['X-RateLimit-Remaining'] = str(
-            max(0, settings.RATE_LIMIT_REQUESTS_PER_MINUTE - current_request - 1))
-
-        return response
-
-    def get_client_ip(self, request):
-        '''Отримуємо IP адрес клієнта'''
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def is_exempt(self, request):
+        return (request.path.startswith('/static/') or request.path.startswith('/admin/')
+                or request.path == '/metrics')
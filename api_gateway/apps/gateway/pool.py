@@ -0,0 +1,299 @@
+import asyncio
+import threading
+import time
+import logging
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SETTINGS = {
+    'POOL_CONNECTIONS': 4,      # кількість хостів (пулів urllib3) на сесію
+    'POOL_MAXSIZE': 20,         # максимум keep-alive з'єднань на хост
+    'POOL_BLOCK': True,         # чекати вільне з'єднання замість нового
+    'POOL_TIMEOUT': 5,          # скільки чекати вільне з'єднання (сек)
+    'IDLE_TIMEOUT': 60,         # через скільки закривати простійний пул (сек)
+    'ASYNC_MAX_CONNECTIONS': 1000,  # ліміт з'єднань async клієнта (ASGI)
+}
+
+
+class PoolExhausted(requests.exceptions.ConnectionError):
+    '''Немає вільного з'єднання в пулі gateway (перевантажений gateway, а не сервіс)'''
+
+
+def get_pool_settings(service_name):
+    '''Налаштування пулу для сервіса (default + перевизначення)'''
+    pools = getattr(settings, 'UPSTREAM_POOLS', {})
+    options = dict(DEFAULT_POOL_SETTINGS)
+    options.update(pools.get('default', {}))
+    options.update(pools.get(service_name, {}))
+    return options
+
+
+class UpstreamPool:
+    '''Пул keep-alive з'єднань до одного мікросервіса'''
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.options = get_pool_settings(service_name)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.options['POOL_MAXSIZE'])
+        self._session = None
+        self._last_used = 0.0
+        self._in_use = 0
+
+        self.requests = 0
+        self.closed_connections = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.evictions = 0
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.options['POOL_CONNECTIONS'],
+            pool_maxsize=self.options['POOL_MAXSIZE'],
+            # Вільне з'єднання чекаємо на _slots з POOL_TIMEOUT: urllib3
+            # з pool_block чекав би без обмеження часу
+            pool_block=False,
+            max_retries=0,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _connection_pools(self, session):
+        '''Пули urllib3 всередині сесії'''
+        pools = []
+        for adapter in session.adapters.values():
+            manager = getattr(adapter, 'poolmanager', None)
+            if manager is None:
+                continue
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is not None and pool not in pools:
+                    pools.append(pool)
+        return pools
+
+    def _opened_connections(self, session):
+        return sum(pool.num_connections for pool in self._connection_pools(session))
+
+    def _get_session(self):
+        '''Повертає сесію, закриваючи її якшо вона довго простоювала'''
+        with self._lock:
+            now = time.monotonic()
+            idle = now - self._last_used
+            if (self._session is not None and self._in_use == 0
+                    and idle > self.options['IDLE_TIMEOUT']):
+                logger.info(
+                    f"Evicting idle pool for {self.service_name} after {idle:.0f}s")
+                self.closed_connections += self._opened_connections(
+                    self._session)
+                self._session.close()
+                self._session = None
+                self.evictions += 1
+            if self._session is None:
+                self._session = self._create_session()
+            self._last_used = now
+            self._in_use += 1
+            return self._session
+
+    def _release_session(self):
+        with self._lock:
+            self._in_use -= 1
+            self._last_used = time.monotonic()
+
+    def _acquire_slot(self):
+        '''True - слот зайнято; False - слотів немає, а POOL_BLOCK вимкнено
+        (запит піде на нове з'єднання, яке не лишиться в пулі)'''
+        if self._slots.acquire(blocking=False):
+            return True
+        self.waits += 1
+        if not self.options['POOL_BLOCK']:
+            return False
+        if not self._slots.acquire(timeout=self.options['POOL_TIMEOUT']):
+            self.wait_timeouts += 1
+            raise PoolExhausted(f"Connection pool for {self.service_name} is exhausted")
+        return True
+
+    def _finish_request(self, slot):
+        self._release_session()
+        if slot:
+            self._slots.release()
+
+    def _finish_on_close(self, response, slot):
+        '''Звільняє сесію і слот, коли відповідь закрито'''
+        close = response.close
+        finished = threading.Event()
+
+        def close_and_finish():
+            try:
+                close()
+            finally:
+                if not finished.is_set():
+                    finished.set()
+                    self._finish_request(slot)
+
+        response.close = close_and_finish
+
+    def request(self, method, url, **kwargs):
+        '''Виконує запит через пул з'єднань сервіса.
+
+        При stream=True з'єднання зайняте, доки тіло не прочитане, тому
+        слот і сесія звільняються, коли відповідь закрито (response.close()).
+        '''
+        slot = self._acquire_slot()
+        session = self._get_session()
+        self.requests += 1
+        try:
+            response = session.request(method=method, url=url, **kwargs)
+        except BaseException:
+            self._finish_request(slot)
+            raise
+        if kwargs.get('stream'):
+            self._finish_on_close(response, slot)
+        else:
+            self._finish_request(slot)
+        return response
+
+    def stats(self):
+        '''Статистика пулу: hits - запити на вже відкритому з'єднанні'''
+        with self._lock:
+            new_connections = self.closed_connections
+            idle_connections = 0
+            if self._session is not None:
+                new_connections += self._opened_connections(self._session)
+                for pool in self._connection_pools(self._session):
+                    if pool.pool is not None:
+                        idle_connections += sum(
+                            1 for conn in list(pool.pool.queue) if conn is not None)
+            return {
+                'requests': self.requests,
+                'hits': max(0, self.requests - new_connections),
+                'new_connections': new_connections,
+                'idle_connections': idle_connections,
+                'waits': self.waits,
+                'wait_timeouts': self.wait_timeouts,
+                'evictions': self.evictions,
+                'in_use': self._in_use,
+                'pool_maxsize': self.options['POOL_MAXSIZE'],
+                'idle_seconds': round(time.monotonic() - self._last_used, 1)
+                if self._last_used else None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self.closed_connections += self._opened_connections(
+                    self._session)
+                self._session.close()
+                self._session = None
+
+
+class UpstreamPoolRegistry:
+    '''Реєстр пулів по сервісам з settings.MICROSERVICES'''
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, service_name):
+        pool = self._pools.get(service_name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(service_name)
+                if pool is None:
+                    pool = UpstreamPool(service_name)
+                    self._pools[service_name] = pool
+        return pool
+
+    def request(self, service_name, method, url, **kwargs):
+        return self.get(service_name).request(method, url, **kwargs)
+
+    def stats(self):
+        return {
+            service_name: self.get(service_name).stats()
+            for service_name in settings.MICROSERVICES
+        }
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools = {}
+
+
+upstream_pools = UpstreamPoolRegistry()
+
+
+class AsyncUpstreamClients:
+    '''Async HTTP клієнти (httpx) по сервісам для ASGI проксі.
+
+    Клієнт прив'язаний до event loop, тому зберігаємо їх окремо для кожного loop.
+    '''
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._stats = {}
+
+    def _create_client(self, service_name):
+        options = get_pool_settings(service_name)
+        limits = httpx.Limits(
+            max_connections=options['ASYNC_MAX_CONNECTIONS'],
+            max_keepalive_connections=options['POOL_MAXSIZE'],
+            keepalive_expiry=options['IDLE_TIMEOUT'],
+        )
+        self._get_stats(service_name)['clients'] += 1
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(30, pool=options['POOL_TIMEOUT']),
+        )
+
+    def _get_stats(self, service_name):
+        return self._stats.setdefault(
+            service_name, {'requests': 0, 'in_flight': 0, 'clients': 0})
+
+    def get(self, service_name):
+        loop = asyncio.get_running_loop()
+        clients = self._clients.get(loop)
+        if clients is None:
+            clients = {}
+            self._clients[loop] = clients
+        client = clients.get(service_name)
+        if client is None:
+            client = self._create_client(service_name)
+            clients[service_name] = client
+        return client
+
+    async def request(self, service_name, method, url, stream=False, **kwargs):
+        '''Виконує запит через async клієнт сервіса.
+
+        При stream=True тіло не читається; відповідь треба закрити через aclose().
+        '''
+        client = self.get(service_name)
+        stats = self._get_stats(service_name)
+        stats['requests'] += 1
+        stats['in_flight'] += 1
+        timeout = kwargs.get('timeout')
+        if isinstance(timeout, (int, float)):
+            kwargs['timeout'] = httpx.Timeout(
+                timeout, pool=get_pool_settings(service_name)['POOL_TIMEOUT'])
+        try:
+            if stream:
+                upstream_request = client.build_request(method, url, **kwargs)
+                return await client.send(upstream_request, stream=True)
+            return await client.request(method=method, url=url, **kwargs)
+        finally:
+            stats['in_flight'] -= 1
+
+    def stats(self):
+        return {service_name: dict(stats) for service_name, stats in self._stats.items()}
+
+
+async_upstream_clients = AsyncUpstreamClients()
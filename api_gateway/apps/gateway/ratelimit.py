@@ -0,0 +1,516 @@
+import math
+import threading
+import time
+import uuid
+import logging
+from collections import deque, namedtuple
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.http import JsonResponse
+
+from .auth import get_token_claims
+
+
+logger = logging.getLogger(__name__)
+
+
+RateLimitResult = namedtuple(
+    'RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+# Ковзне вікно: zset з часом кожного запиту. Час беремо з Redis (TIME),
+# щоб декілька gateway не залежали від розбіжності годинників.
+SLIDING_WINDOW_SCRIPT = '''
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+local retry = window
+if oldest[2] then
+    retry = tonumber(oldest[2]) + window - now
+end
+return {0, 0, retry}
+'''
+
+# Token bucket: hash з кількістю токенів і часом останнього поповнення
+TOKEN_BUCKET_SCRIPT = '''
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+return {allowed, math.floor(tokens), retry}
+'''
+
+
+class LocalLimiter:
+    '''Базовий limiter в пам'яті процесу'''
+
+    def hit(self, key, limit=None):
+        raise NotImplementedError
+
+    async def ahit(self, key, limit=None):
+        return self.hit(key, limit)
+
+    def stats(self):
+        return {'backend': 'local'}
+
+
+class LocalSlidingWindow(LocalLimiter):
+    '''Ковзне вікно в пам'яті процесу (fallback без Redis)'''
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def hit(self, key, limit=None):
+        limit = limit or self.limit
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                self._sweep(now)
+
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) < limit:
+                hits.append(now)
+                return RateLimitResult(True, limit, limit - len(hits), 0)
+            retry_after = hits[-limit] + self.window - now
+            return RateLimitResult(False, limit, 0, retry_after)
+
+    def _sweep(self, now):
+        '''Видаляємо ключі без запитів у вікні'''
+        for key in [key for key, hits in self._hits.items()
+                    if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+
+class LocalTokenBucket(LocalLimiter):
+    '''Token bucket в пам'яті процесу (fallback без Redis)'''
+
+    def __init__(self, limit, window, capacity):
+        self.limit = limit
+        self.window = window
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def hit(self, key, limit=None):
+        capacity, rate = bucket_params(self, limit)
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                self._sweep(now)
+
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return RateLimitResult(True, capacity, int(tokens - 1), 0)
+            self._buckets[key] = (tokens, now)
+            return RateLimitResult(False, capacity, 0, (1 - tokens) / rate)
+
+    def _sweep(self, now):
+        '''Видаляємо bucket-и, які гарантовано вже повністю поповнені'''
+        for key in [key for key, (_, ts) in self._buckets.items()
+                    if now - ts >= self.window]:
+            del self._buckets[key]
+
+
+def bucket_params(limiter, limit=None):
+    '''(capacity, токенів за секунду) з урахуванням ліміту тарифу'''
+    if not limit or limit == limiter.limit:
+        return limiter.capacity, limiter.limit / limiter.window
+    capacity = max(1, math.ceil(limit * limiter.capacity / limiter.limit))
+    return capacity, limit / limiter.window
+
+
+class RedisLimiter:
+    '''Ліміт через один атомарний Lua скрипт в Redis на кожну перевірку.
+
+    Якшо Redis недоступний, перевірка йде через локальний limiter, а Redis
+    не опитується RATE_LIMIT_REDIS_RETRY_INTERVAL секунд.
+    '''
+
+    script = None
+
+    def __init__(self, local_limiter, limit):
+        self.local = local_limiter
+        self.limit = limit
+        self.redis_retry_interval = settings.RATE_LIMIT_REDIS_RETRY_INTERVAL
+        self._redis_down_until = 0.0
+        self.client = get_redis_client()
+        self.async_client = aioredis.Redis(**redis_client_options())
+        self._script = self.client.register_script(self.script)
+        self._async_script = self.async_client.register_script(self.script)
+
+    def script_args(self, limit):
+        raise NotImplementedError
+
+    def _redis_available(self):
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error):
+        logger.warning(f"Rate limit Redis unavailable, using local limiter: {error}")
+        self._redis_down_until = time.monotonic() + self.redis_retry_interval
+
+    def _result(self, raw, limit):
+        allowed, remaining, retry_after_ms = (int(value) for value in raw)
+        return RateLimitResult(
+            bool(allowed), limit, max(0, remaining), retry_after_ms / 1000)
+
+    def hit(self, key, limit=None):
+        limit = limit or self.limit
+        if self._redis_available():
+            try:
+                args, result_limit = self.script_args(limit)
+                return self._result(self._script(keys=[key], args=args), result_limit)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return self.local.hit(key, limit)
+
+    async def ahit(self, key, limit=None):
+        limit = limit or self.limit
+        if self._redis_available():
+            try:
+                args, result_limit = self.script_args(limit)
+                return self._result(
+                    await self._async_script(keys=[key], args=args), result_limit)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return self.local.hit(key, limit)
+
+    def stats(self):
+        return {
+            'backend': 'redis',
+            'redis_available': self._redis_available(),
+        }
+
+
+class SlidingWindowLimiter(RedisLimiter):
+    '''Ковзне вікно: не більше limit запитів за останні window секунд'''
+
+    script = SLIDING_WINDOW_SCRIPT
+
+    def __init__(self, limit, window):
+        self.window = window
+        super().__init__(LocalSlidingWindow(limit, window), limit)
+
+    def script_args(self, limit):
+        return [int(self.window * 1000), limit, uuid.uuid4().hex], limit
+
+
+class TokenBucketLimiter(RedisLimiter):
+    '''Token bucket: сплески до capacity, далі limit запитів за window секунд'''
+
+    script = TOKEN_BUCKET_SCRIPT
+
+    def __init__(self, limit, window, capacity):
+        self.window = window
+        self.capacity = capacity
+        super().__init__(LocalTokenBucket(limit, window, capacity), limit)
+
+    def script_args(self, limit):
+        capacity, rate = bucket_params(self, limit)
+        return [capacity, rate / 1000], capacity
+
+
+class ApproximateLimiter:
+    '''Наближений ліміт без Redis на шляху запиту.
+
+    Кожен процес рахує запити в пам'яті (ковзний лічильник по двох фіксованих
+    вікнах) і раз на flush_interval фоновий потік одним pipeline відправляє
+    накопичені дельти в Redis (INCRBY) та зчитує глобальні суми всіх gateway.
+
+    Точність: процес допускає запити на основі останньої відомої глобальної
+    суми плюс своїх ще не підтверджених Redis запитів. Як тільки не відправлених
+    запитів по ключу стає max_drift, фоновий потік відправляє дельти одразу
+    (запит на Redis не чекає). Тому перевищення ліміту - приблизно
+    (кількість процесів gateway - 1) * max_drift запитів на ключ, а зазвичай -
+    скільки інші процеси прийняли за flush_interval.
+    '''
+
+    def __init__(self, limit, window, flush_interval, max_drift):
+        self.limit = limit
+        self.window = window
+        self.flush_interval = flush_interval
+        self.max_drift = max_drift
+        self.client = get_redis_client()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}    # (key, window_id) -> не відправлені запити
+        self._flushing = {}   # (key, window_id) -> відправлені, ще без відповіді Redis
+        self._global = {}     # key -> [window_id, поточне вікно, попереднє вікно]
+        self._touched = {}    # key -> window_id останнього запиту
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._redis_down_until = 0.0
+
+        self.flushes = 0
+        self.forced_flushes = 0
+        self.flush_errors = 0
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='rate-limit-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _window(self, now):
+        window_id = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+        return window_id, elapsed
+
+    def _global_counts(self, key, window_id):
+        counts = self._global.get(key)
+        if counts is None:
+            return 0, 0
+        known_window, current, previous = counts
+        if known_window == window_id:
+            return current, previous
+        if known_window == window_id - 1:
+            return 0, current
+        return 0, 0
+
+    def _check(self, key, limit):
+        '''Повертає (RateLimitResult, чи треба відправити дельту одразу)'''
+        limit = limit or self.limit
+        window_id, elapsed = self._window(time.time())
+        with self._lock:
+            current, previous = self._global_counts(key, window_id)
+            pending = self._pending.get((key, window_id), 0)
+            local = pending + self._flushing.get((key, window_id), 0)
+            local_previous = (self._pending.get((key, window_id - 1), 0)
+                              + self._flushing.get((key, window_id - 1), 0))
+            estimate = (previous + local_previous) * (1 - elapsed) + current + local
+
+            if estimate >= limit:
+                retry_after = (1 - elapsed) * self.window
+                return RateLimitResult(False, limit, 0, retry_after), False
+
+            self._pending[(key, window_id)] = pending + 1
+            self._touched[key] = window_id
+            remaining = max(0, int(limit - estimate - 1))
+            return RateLimitResult(True, limit, remaining, 0), pending + 1 >= self.max_drift
+
+    def hit(self, key, limit=None):
+        self._start()
+        result, force_flush = self._check(key, limit)
+        if (force_flush and not self._wakeup.is_set()
+                and time.monotonic() >= self._redis_down_until):
+            # Запит не чекає на Redis - фоновий потік відправить дельти одразу
+            self.forced_flushes += 1
+            self._wakeup.set()
+        return result
+
+    async def ahit(self, key, limit=None):
+        return self.hit(key, limit)
+
+    def flush(self):
+        '''Відправляє дельти в Redis і зчитує глобальні суми'''
+        with self._flush_lock:
+            window_id, _ = self._window(time.time())
+            with self._lock:
+                # Поки Redis не відповів, дельти враховуються з _flushing
+                batch = self._flushing = self._pending
+                self._pending = {}
+                # Забуваємо ключі без запитів два вікна
+                for key in [key for key, touched in self._touched.items()
+                            if touched < window_id - 1]:
+                    del self._touched[key]
+                    self._global.pop(key, None)
+                keys = list(self._touched)
+
+            if not batch and not keys:
+                return
+
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for (key, batch_window), delta in batch.items():
+                    redis_key = f"{key}:{batch_window}"
+                    pipe.incrby(redis_key, delta)
+                    pipe.expire(redis_key, self.window * 2)
+                for key in keys:
+                    pipe.mget(f"{key}:{window_id}", f"{key}:{window_id - 1}")
+                results = pipe.execute()
+            except redis.RedisError as e:
+                self.flush_errors += 1
+                self._redis_down_until = (
+                    time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_INTERVAL)
+                logger.warning(f"Rate limit flush failed: {e}")
+                # Повертаємо дельти, щоб не втратити їх до наступної спроби
+                with self._lock:
+                    for batch_key, delta in batch.items():
+                        if batch_key[1] >= window_id - 1:
+                            self._pending[batch_key] = self._pending.get(
+                                batch_key, 0) + delta
+                    self._flushing = {}
+                return
+
+            totals = results[len(batch) * 2:]
+            with self._lock:
+                # Глобальні суми вже містять відправлені дельти
+                for key, (current, previous) in zip(keys, totals):
+                    self._global[key] = [
+                        window_id, int(current or 0), int(previous or 0)]
+                self._flushing = {}
+            self.flushes += 1
+
+    def stats(self):
+        return {
+            'backend': 'approximate',
+            'keys': len(self._touched),
+            'pending': sum(self._pending.values()) + sum(self._flushing.values()),
+            'flushes': self.flushes,
+            'forced_flushes': self.forced_flushes,
+            'flush_errors': self.flush_errors,
+            'flush_interval_ms': int(self.flush_interval * 1000),
+            'max_drift': self.max_drift,
+        }
+
+
+def redis_client_options():
+    return {
+        'host': settings.REDIS_HOST,
+        'port': settings.REDIS_PORT,
+        'db': settings.REDIS_DB,
+        'socket_timeout': settings.RATE_LIMIT_REDIS_TIMEOUT,
+        'socket_connect_timeout': settings.RATE_LIMIT_REDIS_TIMEOUT,
+    }
+
+
+def get_redis_client():
+    return redis.Redis(**redis_client_options())
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def create_limiter():
+    '''Limiter згідно з RATE_LIMIT_BACKEND і RATE_LIMIT_ALGORITHM'''
+    algorithm = settings.RATE_LIMIT_ALGORITHM
+    limit = settings.RATE_LIMIT_REQUESTS_PER_MINUTE
+    window = settings.RATE_LIMIT_WINDOW_SECONDS
+
+    # Наближений режим: лічильники в процесі, Redis тільки у фоні
+    if settings.RATE_LIMIT_BACKEND == 'approximate':
+        return ApproximateLimiter(
+            limit, window,
+            flush_interval=settings.RATE_LIMIT_APPROX_FLUSH_INTERVAL_MS / 1000,
+            max_drift=settings.RATE_LIMIT_APPROX_MAX_DRIFT)
+
+    if algorithm == 'sliding_window':
+        limiter = SlidingWindowLimiter(limit, window)
+    elif algorithm == 'token_bucket':
+        limiter = TokenBucketLimiter(
+            limit, window, settings.RATE_LIMIT_BURST or limit)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_ALGORITHM: {algorithm}")
+
+    # Без Redis - тільки локальні лічильники процесу
+    if settings.RATE_LIMIT_BACKEND == 'local':
+        return limiter.local
+    return limiter
+
+
+def get_limiter():
+    '''Спільний limiter процесу'''
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = create_limiter()
+    return _limiter
+
+
+def retry_after_header(result):
+    return str(max(1, math.ceil(result.retry_after)))
+
+
+def get_client_ip(request):
+    '''Отримуємо IP адрес клієнта'''
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def get_rate_limit_identity(request):
+    '''(ключ, ліміт): по користувачу з токена або по IP'''
+    claims = get_token_claims(request)
+    user_id = claims.get(settings.JWT_USER_ID_CLAIM) if claims else None
+    if user_id is not None:
+        tier = (claims.get(settings.RATE_LIMIT_TIER_CLAIM)
+                or settings.RATE_LIMIT_USER_TIERS.get(str(user_id))
+                or 'authenticated')
+        limit = settings.RATE_LIMIT_TIERS.get(
+            tier, settings.RATE_LIMIT_TIERS['authenticated'])
+        return f"rate_limit:user:{user_id}", limit
+
+    # Створюємо ключ для кеша
+    return f"rate_limit:{get_client_ip(request)}", settings.RATE_LIMIT_TIERS['anonymous']
+
+
+def add_rate_limit_headers(response, result):
+    # Додаємо заголовки с інформацією по лімітам
+    response['X-RateLimit-Limit'] = str(result.limit)
+    response['X-RateLimit-Remaining'] = str(result.remaining)
+    return response
+
+
+def limit_exceeded_response(result):
+    response = JsonResponse({
+        'error': 'Rate limit exceeded',
+        'message': f'Maximum {result.limit} requests per {settings.RATE_LIMIT_WINDOW_SECONDS} seconds allowed'
+    }, status=429)
+    response['Retry-After'] = retry_after_header(result)
+    return add_rate_limit_headers(response, result)
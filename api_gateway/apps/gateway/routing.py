@@ -0,0 +1,92 @@
+from django.conf import settings
+
+
+class Route:
+    '''Маршрут gateway: префікс шляху -> сервіс'''
+
+    def __init__(self, prefix, service, rewrite=None, options=None):
+        if not prefix.startswith('/') or not prefix.endswith('/'):
+            raise ValueError(f"Route prefix must start and end with '/': {prefix}")
+        self.prefix = prefix
+        self.service = service
+        # Чим замінити префікс у шляху для сервіса (None - лишаємо як є)
+        self.rewrite = rewrite
+        self.options = options or {}
+
+    def get_target_path(self, path):
+        '''Шлях для сервіса з урахуванням заміни префікса'''
+        if self.rewrite is None:
+            return path
+        return self.rewrite + path[len(self.prefix):]
+
+    def __repr__(self):
+        return f"<Route {self.prefix} -> {self.service}>"
+
+
+class _Node:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.route = None
+
+
+class RouteTable:
+    '''Таблиця маршрутів, скомпільована в trie по сегментах шляху.
+
+    Пошук найдовшого префікса проходить шлях один раз, тому його вартість
+    не залежить від кількості маршрутів.
+    '''
+
+    def __init__(self, routes):
+        self.routes = []
+        self._root = _Node()
+        for route in routes:
+            self.add(route)
+
+    @staticmethod
+    def _segments(path):
+        return [segment for segment in path.split('/') if segment]
+
+    def add(self, route):
+        node = self._root
+        for segment in self._segments(route.prefix):
+            node = node.children.setdefault(segment, _Node())
+        if node.route is not None:
+            raise ValueError(f"Duplicate gateway route prefix: {route.prefix}")
+        node.route = route
+        self.routes.append(route)
+
+    def resolve(self, path):
+        '''Маршрут з найдовшим префіксом для шляху або None'''
+        node = self._root
+        match = node.route
+        segments = path.split('/')
+        # Останній сегмент без '/' в кінці не може бути префіксом маршруту
+        for segment in segments[1:-1]:
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.route is not None:
+                match = node.route
+        return match
+
+
+def build_route_table(config=None):
+    '''Компілює GATEWAY_ROUTES з settings'''
+    if config is None:
+        config = settings.GATEWAY_ROUTES
+    return RouteTable(
+        Route(
+            prefix=entry['prefix'],
+            service=entry['service'],
+            rewrite=entry.get('rewrite'),
+            options=entry.get('options'),
+        )
+        for entry in config
+    )
+
+
+route_table = build_route_table()
@@ -1,3 +1,686 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import redis
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+import requests
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+
+from .auth import decode_access_token
+from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .cache import CachePolicy, response_cache
+from .checks import check_jwt_key
+from .coalescing import SingleFlight
+from .compression import ResponseCompressor
+from .concurrency import ConcurrencyLimiter
+from .hedging import upstream_hedging
+from .pool import PoolExhausted
+from .ratelimit import (
+    ApproximateLimiter, LocalSlidingWindow, LocalTokenBucket, RateLimitResult,
+    SlidingWindowLimiter, TokenBucketLimiter, get_rate_limit_identity,
+)
+from .upstreams import Upstream, UpstreamRegistry
+from .views import AsyncProxyView, BatchView, DeadlineReached, ProxyView, component_metrics
+
+
+class ResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.policy = CachePolicy(r'^/api/products/$', 30)
+        response_cache.local.clear()
+        cache.clear()
+
+    def test_head_response_is_not_stored(self):
+        head = self.factory.head('/api/products/?page=2')
+        response_cache.store(head, self.policy, HttpResponse(b'', content_type='application/json'))
+
+        get = self.factory.get('/api/products/?page=2')
+        self.assertIsNone(response_cache.lookup(get, self.policy))
+
+    def test_head_is_served_from_get_entry(self):
+        get = self.factory.get('/api/products/?page=2')
+        response_cache.store(get, self.policy, HttpResponse(b'[1, 2]', content_type='application/json'))
+
+        response = response_cache.lookup(self.factory.head('/api/products/?page=2'), self.policy)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Length'], '6')
+
+        response = response_cache.lookup(get, self.policy)
+        self.assertEqual(response.content, b'[1, 2]')
+
+
+@override_settings(GATEWAY_CIRCUIT_BREAKER={'default': {
+    'WINDOW_SIZE': 4, 'MIN_CALLS': 4, 'FAILURE_RATE_THRESHOLD': 0.5,
+    'SLOW_CALL_THRESHOLD': 5, 'SLOW_CALL_RATE_THRESHOLD': 0.8,
+    'OPEN_SECONDS': 30, 'HALF_OPEN_MAX_CALLS': 2,
+}})
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('apps.gateway.breaker.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test')
+
+    def open_breaker(self):
+        for success in (True, True, False, False):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(success, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_needs_min_calls_to_open(self):
+        for _ in range(3):
+            self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_slow_calls_open(self):
+        for _ in range(4):
+            self.breaker.record(True, 10)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_open_rejects_until_timeout(self):
+        self.open_breaker()
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 30)
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 2)
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_half_open_caps_probe_calls(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_successes_close(self):
+        self.open_breaker()
+        self.now += 30
+        for _ in range(2):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.stats()['calls_in_window'], 0)
+
+    def test_half_open_failure_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.opened, 2)
+        self.assertFalse(self.breaker.allow())
+
+    def test_cancel_returns_probe_slot(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+        self.breaker.cancel()
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_limiter_rejection_cancels_probe(self):
+        self.open_breaker()
+        self.now += 30
+        limiter = mock.Mock()
+        limiter.acquire.return_value = False
+        view = ProxyView()
+        with mock.patch('apps.gateway.views.circuit_breakers.get', return_value=self.breaker), \
+                mock.patch('apps.gateway.views.concurrency_limiters.get', return_value=limiter):
+            for _ in range(3):
+                response = view.proxy_request(RequestFactory().get('/api/orders/'), 'test', '/')
+                self.assertEqual(response.status_code, 503)
+        limiter.release.assert_not_called()
+        # Відхилені limiter-ом виклики не зайняли пробні слоти
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(GATEWAY_CONCURRENCY={'default': {'INITIAL_LIMIT': 1, 'MIN_LIMIT': 1}})
+class ConcurrencyCancelTests(SimpleTestCase):
+
+    def test_cancelled_waiter_leaves_queue(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter('test')
+            self.assertTrue(await limiter.aacquire('normal'))
+            waiter = asyncio.ensure_future(limiter.aacquire('normal', 5))
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.stats()['queue'], 1)
+
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.assertEqual(limiter.stats()['queue'], 0)
+            limiter.release()
+            self.assertEqual(limiter.in_flight, 0)
+
+        asyncio.run(scenario())
+
+    def test_granted_slot_is_passed_on_when_waiter_cancelled(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter('test')
+            self.assertTrue(await limiter.aacquire('normal'))
+            first = asyncio.ensure_future(limiter.aacquire('normal', 5))
+            second = asyncio.ensure_future(limiter.aacquire('low', 5))
+            await asyncio.sleep(0)
+
+            # Слот видано першому, але його скасовано раніше, ніж він прокинувся
+            first.cancel()
+            limiter.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            self.assertTrue(await second)
+            self.assertEqual(limiter.in_flight, 1)
+
+        asyncio.run(scenario())
+
+    def test_proxy_releases_slot_when_cancelled(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter('test')
+            breaker = mock.Mock()
+            breaker.allow.return_value = True
+            view = AsyncProxyView()
+            request = RequestFactory().post('/api/orders/')
+            started = asyncio.Event()
+
+            async def hang(*args, **kwargs):
+                started.set()
+                await asyncio.Event().wait()
+
+            with mock.patch('apps.gateway.views.concurrency_limiters.get', return_value=limiter), \
+                    mock.patch('apps.gateway.views.circuit_breakers.get', return_value=breaker), \
+                    mock.patch('apps.gateway.views.upstream_registry.get'), \
+                    mock.patch.object(view, 'send_with_retries_async', hang):
+                task = asyncio.ensure_future(
+                    view.proxy_request_async(request, 'test', '/api/orders/'))
+                await started.wait()
+                self.assertEqual(limiter.in_flight, 1)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            self.assertEqual(limiter.in_flight, 0)
+            breaker.cancel.assert_called_once_with()
+            breaker.record.assert_not_called()
+
+        asyncio.run(scenario())
+
+
+class HedgingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/api/products/')
+        self.response = mock.Mock(status_code=200)
+
+    def test_no_hedge_to_the_only_instance(self):
+        upstream = Upstream('test', 'http://products:8000')
+        with mock.patch.object(upstream_hedging, 'allow_hedge') as allow_hedge:
+            self.assertIsNone(ProxyView().choose_hedge('test', upstream, upstream.instances[0]))
+        allow_hedge.assert_not_called()
+
+    def test_sync_no_hedge_to_the_only_instance(self):
+        upstream = Upstream('test', 'http://products:8000')
+        view = ProxyView()
+        calls = []
+
+        def slow_attempt(request, service_name, upstream, instance, target_path, stream):
+            calls.append(instance)
+            time.sleep(0.3)
+            return self.response
+
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=5), \
+                mock.patch.object(view, 'send_attempt', side_effect=slow_attempt):
+            response, instance = view.send_hedged(self.request, 'test', upstream, '/api/products/')
+
+        self.assertIs(response, self.response)
+        self.assertEqual(calls, upstream.instances)
+
+    def test_sync_hedge_beats_slow_primary(self):
+        upstream = Upstream('test', ['http://products-1:8000', 'http://products-2:8000'])
+        slow, fast = upstream.instances
+        view = ProxyView()
+        fast_response = mock.Mock(status_code=200)
+
+        def attempt(request, service_name, upstream, instance, target_path, stream):
+            time.sleep(1 if instance is slow else 0.01)
+            return self.response if instance is slow else fast_response
+
+        started = time.monotonic()
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=5), \
+                mock.patch.object(upstream, 'choose',
+                                  side_effect=lambda exclude=(): fast if exclude else slow), \
+                mock.patch.object(upstream_hedging, 'allow_hedge', return_value=True), \
+                mock.patch.object(view, 'send_attempt', side_effect=attempt):
+            response, instance = view.send_hedged(self.request, 'test', upstream, '/api/products/')
+
+        self.assertIs(instance, fast)
+        self.assertIs(response, fast_response)
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_sync_connection_error_is_retried_without_hedge(self):
+        upstream = Upstream('test', ['http://products-1:8000', 'http://products-2:8000'])
+        broken, healthy = upstream.instances
+        view = ProxyView()
+
+        def attempt(request, service_name, upstream, instance, target_path, stream):
+            if instance is broken:
+                raise requests.exceptions.ConnectionError('refused')
+            return self.response
+
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=5), \
+                mock.patch.object(upstream, 'choose',
+                                  side_effect=lambda exclude=(): healthy if exclude else broken), \
+                mock.patch.object(upstream_hedging, 'allow_retry', return_value=True), \
+                mock.patch.object(view, 'send_attempt', side_effect=attempt):
+            response, instance = view.send_hedged(self.request, 'test', upstream, '/api/products/')
+
+        self.assertIs(instance, healthy)
+
+    def test_async_no_hedge_to_the_only_instance(self):
+        upstream = Upstream('test', 'http://products:8000')
+        view = AsyncProxyView()
+        calls = []
+
+        async def slow_attempt(request, service_name, upstream, instance, target_path, stream):
+            calls.append(instance)
+            await asyncio.sleep(0.3)
+            return self.response
+
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=5), \
+                mock.patch.object(view, 'send_attempt_async', side_effect=slow_attempt):
+            response, instance = asyncio.run(
+                view.send_hedged_async(self.request, 'test', upstream, '/api/products/'))
+
+        self.assertIs(response, self.response)
+        self.assertEqual(calls, upstream.instances)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_leader_cancel_does_not_cancel_waiters(self):
+        async def scenario():
+            flight = SingleFlight()
+            release = asyncio.Event()
+            calls = []
+
+            async def fetch():
+                calls.append(1)
+                await release.wait()
+                return 'response'
+
+            leader = asyncio.ensure_future(flight.ado('key', fetch, 5))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.ado('key', fetch, 5))
+            await asyncio.sleep(0)
+
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            release.set()
+
+            self.assertEqual(await waiter, ('response', True))
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(flight.stats()['in_flight'], 0)
+
+        asyncio.run(scenario())
+
+
+class BatchRateLimitTests(SimpleTestCase):
+
+    def test_each_part_is_charged_and_limited(self):
+        limiter = mock.Mock()
+        limiter.hit.side_effect = [
+            RateLimitResult(True, 2, 1, 0),
+            RateLimitResult(True, 2, 0, 0),
+            RateLimitResult(False, 2, 0, 30),
+        ]
+        body = {'requests': [
+            {'id': 'a', 'path': '/api/products/1/'},
+            {'id': 'b', 'path': '/api/products/2/'},
+            {'id': 'c', 'path': '/api/products/3/'},
+        ]}
+        request = RequestFactory().post(
+            '/api/batch/', json.dumps(body), content_type='application/json')
+
+        with mock.patch('apps.gateway.views.get_limiter', return_value=limiter), \
+                mock.patch('apps.gateway.views.proxy_view',
+                           return_value=JsonResponse({'ok': True})) as proxy:
+            response = BatchView.as_view()(request)
+
+        parts = json.loads(response.content)['responses']
+        self.assertEqual(limiter.hit.call_count, 3)
+        self.assertEqual(proxy.call_count, 2)
+        self.assertEqual([parts[part]['status'] for part in 'abc'], [200, 200, 429])
+        self.assertEqual(parts['c']['headers']['Retry-After'], '30')
+
+
+class LocalRateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('apps.gateway.ratelimit.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sliding_window_denies_over_limit(self):
+        limiter = LocalSlidingWindow(limit=2, window=60)
+        self.assertEqual(limiter.hit('key'), RateLimitResult(True, 2, 1, 0))
+        self.assertEqual(limiter.hit('key'), RateLimitResult(True, 2, 0, 0))
+        result = limiter.hit('key')
+        self.assertFalse(result.allowed)
+        self.assertEqual(result.retry_after, 60)
+        self.assertTrue(limiter.hit('other').allowed)
+
+    def test_sliding_window_rolls_over(self):
+        limiter = LocalSlidingWindow(limit=2, window=60)
+        limiter.hit('key')
+        self.now += 30
+        limiter.hit('key')
+        self.assertFalse(limiter.hit('key').allowed)
+        self.now += 30
+        # Перший запит вийшов з вікна, другий ще в ньому
+        self.assertTrue(limiter.hit('key').allowed)
+        self.assertFalse(limiter.hit('key').allowed)
+
+    def test_token_bucket_refills(self):
+        limiter = LocalTokenBucket(limit=60, window=60, capacity=2)
+        self.assertTrue(limiter.hit('key').allowed)
+        self.assertTrue(limiter.hit('key').allowed)
+        result = limiter.hit('key')
+        self.assertFalse(result.allowed)
+        self.assertAlmostEqual(result.retry_after, 1)
+        self.now += 1
+        self.assertTrue(limiter.hit('key').allowed)
+        self.assertFalse(limiter.hit('key').allowed)
+        # Поповнення не більше capacity
+        self.now += 100
+        self.assertEqual(limiter.hit('key').remaining, 1)
+
+    def test_token_bucket_scales_with_tier_limit(self):
+        limiter = LocalTokenBucket(limit=60, window=60, capacity=2)
+        for _ in range(4):
+            self.assertTrue(limiter.hit('key', limit=120).allowed)
+        self.assertFalse(limiter.hit('key', limit=120).allowed)
+
+
+@override_settings(
+    RATE_LIMIT_TIERS={'anonymous': 10, 'authenticated': 20, 'premium': 30},
+    RATE_LIMIT_USER_TIERS={'7': 'premium'})
+class RateLimitIdentityTests(SimpleTestCase):
+
+    def identity(self, claims, **extra):
+        request = RequestFactory().get('/api/products/', REMOTE_ADDR='10.0.0.1', **extra)
+        with mock.patch('apps.gateway.ratelimit.get_token_claims', return_value=claims):
+            return get_rate_limit_identity(request)
+
+    def test_anonymous_by_ip(self):
+        self.assertEqual(self.identity(None), ('rate_limit:10.0.0.1', 10))
+        self.assertEqual(
+            self.identity(None, HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.1'),
+            ('rate_limit:1.2.3.4', 10))
+
+    def test_authenticated_tier(self):
+        self.assertEqual(self.identity({'user_id': 1}), ('rate_limit:user:1', 20))
+
+    def test_tier_from_claim_and_settings(self):
+        self.assertEqual(
+            self.identity({'user_id': 1, 'rate_limit_tier': 'premium'}), ('rate_limit:user:1', 30))
+        self.assertEqual(self.identity({'user_id': 7}), ('rate_limit:user:7', 30))
+
+    def test_unknown_tier_falls_back_to_authenticated(self):
+        self.assertEqual(
+            self.identity({'user_id': 1, 'rate_limit_tier': 'gold'}), ('rate_limit:user:1', 20))
+
+
+class ApproximateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 6000.0
+        patcher = mock.patch('apps.gateway.ratelimit.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = mock.Mock()
+        self.pipe = self.redis.pipeline.return_value
+        with mock.patch('apps.gateway.ratelimit.get_redis_client', return_value=self.redis):
+            self.limiter = ApproximateLimiter(limit=5, window=60, flush_interval=60, max_drift=3)
+        # Без фонового потоку: flush викликаємо вручну
+        self.limiter._start = lambda: None
+
+    def test_local_count_until_flush(self):
+        for _ in range(5):
+            self.assertTrue(self.limiter.hit('key').allowed)
+        self.assertFalse(self.limiter.hit('key').allowed)
+
+    def test_flush_sends_deltas_and_reads_totals(self):
+        self.limiter.hit('key')
+        self.limiter.hit('key')
+        self.pipe.execute.return_value = [2, True, [b'4', None]]
+        self.limiter.flush()
+        self.pipe.incrby.assert_called_once_with('key:100', 2)
+        self.pipe.mget.assert_called_once_with('key:100', 'key:99')
+        self.assertEqual(self.limiter.stats()['pending'], 0)
+        # Глобальна сума 4 з інших gateway: лишився один запит
+        self.assertTrue(self.limiter.hit('key').allowed)
+        self.assertFalse(self.limiter.hit('key').allowed)
+
+    def test_failed_flush_keeps_deltas(self):
+        self.limiter.hit('key')
+        self.pipe.execute.side_effect = redis.RedisError('down')
+        with self.assertLogs('apps.gateway.ratelimit', 'WARNING'):
+            self.limiter.flush()
+        self.assertEqual(self.limiter.stats()['pending'], 1)
+        self.assertEqual(self.limiter.flush_errors, 1)
+
+    def test_max_drift_wakes_flusher(self):
+        for _ in range(3):
+            self.limiter.hit('key')
+        self.assertTrue(self.limiter._wakeup.is_set())
+        self.assertEqual(self.limiter.forced_flushes, 1)
+
+    def test_previous_window_is_weighted(self):
+        self.limiter.hit('key')
+        self.pipe.execute.return_value = [1, True, [b'5', None]]
+        self.limiter.flush()
+        # Половина наступного вікна: 5 * 0.5 з попереднього
+        self.now += 90
+        for _ in range(3):
+            self.assertTrue(self.limiter.hit('key').allowed)
+        self.assertFalse(self.limiter.hit('key').allowed)
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisRateLimitTests(SimpleTestCase):
+
+    def create(self, limiter_class, *args):
+        with mock.patch('apps.gateway.ratelimit.get_redis_client',
+                        return_value=fakeredis.FakeRedis()):
+            return limiter_class(*args)
+
+    def test_sliding_window_script(self):
+        limiter = self.create(SlidingWindowLimiter, 2, 60)
+        self.assertEqual(limiter.hit('key'), RateLimitResult(True, 2, 1, 0))
+        self.assertEqual(limiter.hit('key'), RateLimitResult(True, 2, 0, 0))
+        result = limiter.hit('key')
+        self.assertFalse(result.allowed)
+        self.assertGreater(result.retry_after, 59)
+
+    def test_token_bucket_script(self):
+        limiter = self.create(TokenBucketLimiter, 60, 60, 2)
+        self.assertTrue(limiter.hit('key').allowed)
+        self.assertTrue(limiter.hit('key').allowed)
+        result = limiter.hit('key')
+        self.assertFalse(result.allowed)
+        self.assertLessEqual(result.retry_after, 1)
+
+    def test_redis_error_uses_local_limiter(self):
+        limiter = self.create(SlidingWindowLimiter, 1, 60)
+        with mock.patch.object(limiter, '_script', side_effect=redis.RedisError('down')), \
+                self.assertLogs('apps.gateway.ratelimit', 'WARNING'):
+            self.assertTrue(limiter.hit('key').allowed)
+        self.assertFalse(limiter.stats()['redis_available'])
+        self.assertFalse(limiter.hit('key').allowed)
+
+
+class JWTKeyTests(SimpleTestCase):
+
+    @override_settings(JWT_SIGNING_KEY='', JWT_VERIFYING_KEY='')
+    def test_missing_key_is_reported(self):
+        self.assertEqual([warning.id for warning in check_jwt_key(None)], ['gateway.W001'])
+        self.assertIsNone(decode_access_token('a.b.c'))
+
+    @override_settings(JWT_SIGNING_KEY='key', JWT_VERIFYING_KEY='')
+    def test_bad_signature_is_logged(self):
+        token = jwt.encode({'user_id': 1, 'token_type': 'access'}, 'other-key', algorithm='HS256')
+        with self.assertLogs('shared.tokens', 'WARNING'):
+            self.assertIsNone(decode_access_token(token))
+        self.assertEqual(check_jwt_key(None), [])
+
+
+class ForwardHeadersTests(SimpleTestCase):
+
+    def test_upstream_is_asked_for_identity_encoding(self):
+        request = RequestFactory().get('/api/products/', headers={'Accept-Encoding': 'gzip, br'})
+        headers = ProxyView().get_forward_headers(request)
+        self.assertEqual(headers['Accept-Encoding'], 'identity')
+
+
+class RoutingTests(SimpleTestCase):
+
+    def test_prefix_without_slash_is_redirected(self):
+        response = self.client.get('/api/products')
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'], '/api/products/')
+
+    def test_nested_path_without_slash_is_proxied(self):
+        match = resolve('/api/products/1')
+        self.assertEqual(match.url_name, 'api-proxy')
+
+
+class StreamCompressionTests(SimpleTestCase):
+
+    chunks = [b'{"items": [' + b'1, ' * 500, b'2, ' * 500, b'3]}']
+
+    def check_counters(self, compressor, compressed):
+        self.assertEqual(gzip.decompress(compressed), b''.join(self.chunks))
+        self.assertEqual(compressor.counters, {
+            'compressed': 1,
+            'bytes_in': sum(len(chunk) for chunk in self.chunks),
+            'bytes_out': len(compressed),
+        })
+
+    def test_stream_counts_bytes(self):
+        compressor = ResponseCompressor()
+        compressed = b''.join(compressor.compress_stream(iter(self.chunks), 'gzip'))
+        self.check_counters(compressor, compressed)
+
+    def test_async_stream_counts_bytes(self):
+        async def chunks():
+            for chunk in self.chunks:
+                yield chunk
+
+        async def scenario(compressor):
+            return b''.join([data async for data in compressor.acompress_stream(chunks(), 'gzip')])
+
+        compressor = ResponseCompressor()
+        self.check_counters(compressor, asyncio.run(scenario(compressor)))
+
+
+class ComponentMetricsTests(SimpleTestCase):
+
+    def test_coalescing_and_pool_metrics(self):
+        coalescing = {'leaders': 3, 'coalesced': 5, 'timeouts': 1, 'in_flight': 0}
+        with mock.patch('apps.gateway.views.request_coalescer.stats', return_value=coalescing):
+            lines = component_metrics()
+        self.assertIn('gateway_coalescing_leaders_total 3', lines)
+        self.assertIn('gateway_coalescing_coalesced_total 5', lines)
+        self.assertIn('gateway_coalescing_timeouts_total 1', lines)
+        for name in ('gateway_pool_requests_total', 'gateway_pool_in_use'):
+            self.assertTrue(any(
+                line.startswith(f'{name}{{service="product-service"}} ') for line in lines))
+
+
+class UpstreamsFileTests(SimpleTestCase):
+
+    def test_file_is_reloaded_without_health_checks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'upstreams.json')
+            with override_settings(GATEWAY_UPSTREAMS_FILE=path, GATEWAY_HEALTH_CHECKS=False,
+                                   GATEWAY_UPSTREAMS_FILE_CHECK_INTERVAL=0):
+                registry = UpstreamRegistry()
+                self.assertEqual(len(registry.get('product-service').instances), 1)
+
+                with open(path, 'w') as f:
+                    json.dump({'product-service': ['http://p1:8000', 'http://p2:8000']}, f)
+                urls = [instance.url for instance in registry.get('product-service').instances]
+                self.assertEqual(urls, ['http://p1:8000', 'http://p2:8000'])
+
+                with open(path, 'w') as f:
+                    json.dump({'product-service': ['http://p3:8000']}, f)
+                os.utime(path, (time.time() + 10, time.time() + 10))
+                urls = [instance.url for instance in registry.get('product-service').instances]
+                self.assertEqual(urls, ['http://p3:8000'])
+                self.assertIsNone(registry._thread)
+
+
+class LocalErrorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/api/products/')
+        self.upstream = Upstream('test', 'http://products:8000')
+        self.instance = self.upstream.instances[0]
+
+    def test_pool_exhaustion_is_not_recorded_against_instance(self):
+        view = ProxyView()
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=5), \
+                mock.patch('apps.gateway.views.upstream_pools.request',
+                           side_effect=PoolExhausted('exhausted')), \
+                mock.patch.object(self.upstream, 'record') as record:
+            with self.assertRaises(PoolExhausted):
+                view.send_attempt(self.request, 'test', self.upstream, self.instance, '/', False)
+        record.assert_not_called()
+        self.assertEqual(self.instance.outstanding, 0)
+
+    def test_no_call_when_deadline_passed(self):
+        view = ProxyView()
+        with mock.patch.object(view, 'get_remaining_timeout', return_value=0), \
+                mock.patch('apps.gateway.views.upstream_pools.request') as send, \
+                mock.patch.object(self.upstream, 'record') as record:
+            with self.assertRaises(DeadlineReached):
+                view.send_attempt(self.request, 'test', self.upstream, self.instance, '/', False)
+        send.assert_not_called()
+        record.assert_not_called()
+
+    def test_local_error_cancels_breaker(self):
+        view = ProxyView()
+        breaker = mock.Mock()
+        breaker.allow.return_value = True
+        with mock.patch('apps.gateway.views.circuit_breakers.get', return_value=breaker), \
+                mock.patch('apps.gateway.views.upstream_registry.get', return_value=self.upstream), \
+                mock.patch.object(view, 'send_with_retries', side_effect=PoolExhausted('exhausted')):
+            response = view.proxy_request(RequestFactory().post('/api/orders/'), 'test', '/')
+        self.assertEqual(response.status_code, 503)
+        breaker.cancel.assert_called_once_with()
+        breaker.record.assert_not_called()
@@ -0,0 +1,324 @@
+import json
+import os
+import random
+import threading
+import time
+import logging
+from itertools import count
+
+import requests
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_UPSTREAM_SETTINGS = {
+    'BALANCING': 'least_outstanding',  # round_robin, least_outstanding, power_of_two
+    # Активні перевірки /health/
+    'HEALTH_CHECK_PATH': '/health/',
+    'HEALTH_CHECK_INTERVAL': 5,
+    'HEALTH_CHECK_TIMEOUT': 1,
+    'HEALTHY_THRESHOLD': 2,        # успішних перевірок, щоб повернути інстанс
+    'UNHEALTHY_THRESHOLD': 2,      # невдалих перевірок, щоб вивести інстанс
+    # Пасивне виключення по реальних запитах
+    'CONSECUTIVE_FAILURES': 5,
+    'BASE_EJECTION_SECONDS': 30,
+    'MAX_EJECTION_SECONDS': 300,
+    'MAX_EJECTION_PERCENT': 50,    # не виключаємо більше цієї частки інстансів
+}
+
+
+def get_upstream_settings(service_name):
+    upstreams = getattr(settings, 'GATEWAY_UPSTREAMS', {})
+    options = dict(DEFAULT_UPSTREAM_SETTINGS)
+    options.update(upstreams.get('default', {}))
+    options.update(upstreams.get(service_name, {}))
+    return options
+
+
+def normalize_instances(value):
+    '''URL або список URL сервіса -> список URL без '/' в кінці'''
+    if isinstance(value, str):
+        value = [value]
+    return [url.rstrip('/') for url in value]
+
+
+class Instance:
+    '''Один процес сервіса'''
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self._check_successes = 0
+        self._check_failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def is_ejected(self, now=None):
+        return (now or time.monotonic()) < self.ejected_until
+
+    def is_available(self, now=None):
+        return self.healthy and not self.is_ejected(now)
+
+    def acquire(self):
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+
+    def release(self):
+        with self._lock:
+            self.outstanding -= 1
+
+    def stats(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'ejected': self.is_ejected(),
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.ejections,
+        }
+
+
+class RoundRobin:
+    def __init__(self):
+        self._counter = count()
+
+    def choose(self, instances):
+        return instances[next(self._counter) % len(instances)]
+
+
+class LeastOutstanding:
+    def choose(self, instances):
+        # Серед рівних вибираємо випадково, щоб не вантажити перший
+        fewest = min(instance.outstanding for instance in instances)
+        return random.choice(
+            [instance for instance in instances if instance.outstanding == fewest])
+
+
+class PowerOfTwoChoices:
+    '''Два випадкові інстанси, з них - менш завантажений'''
+
+    def choose(self, instances):
+        if len(instances) == 1:
+            return instances[0]
+        first, second = random.sample(instances, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+
+BALANCING_POLICIES = {
+    'round_robin': RoundRobin,
+    'least_outstanding': LeastOutstanding,
+    'power_of_two': PowerOfTwoChoices,
+}
+
+
+class Upstream:
+    '''Інстанси одного сервіса з балансуванням і виключенням несправних'''
+
+    def __init__(self, service_name, urls):
+        self.service_name = service_name
+        self.options = get_upstream_settings(service_name)
+        policy = self.options['BALANCING']
+        if policy not in BALANCING_POLICIES:
+            raise ValueError(f"Unknown balancing policy for {service_name}: {policy}")
+        self.policy = BALANCING_POLICIES[policy]()
+        self._lock = threading.Lock()
+        self.instances = [Instance(url) for url in normalize_instances(urls)]
+
+    def set_instances(self, urls):
+        '''Оновлює список інстансів, зберігаючи стан тих, що лишились'''
+        urls = normalize_instances(urls)
+        with self._lock:
+            current = {instance.url: instance for instance in self.instances}
+            self.instances = [current.get(url) or Instance(url) for url in urls]
+        added = set(urls) - set(current)
+        removed = set(current) - set(urls)
+        if added or removed:
+            logger.warning(
+                f"Upstream {self.service_name} instances changed: "
+                f"added {sorted(added)}, removed {sorted(removed)}")
+
+    def choose(self, exclude=()):
+        '''Інстанс для наступного запиту (за можливості - не з exclude)'''
+        instances = self.instances
+        now = time.monotonic()
+        available = [instance for instance in instances if instance.is_available(now)]
+        if exclude:
+            available = [instance for instance in available if instance not in exclude] or available
+        # Якщо придатних немає - пробуємо всі, а не відмовляємо одразу
+        return self.policy.choose(available or instances)
+
+    def record(self, instance, success):
+        '''Результат запиту для пасивного виключення інстанса'''
+        with self._lock:
+            if success:
+                instance.consecutive_failures = 0
+                return
+            instance.failures += 1
+            instance.consecutive_failures += 1
+            if instance.consecutive_failures < self.options['CONSECUTIVE_FAILURES']:
+                return
+
+            now = time.monotonic()
+            ejected = sum(1 for other in self.instances if other.is_ejected(now))
+            max_ejected = len(self.instances) * self.options['MAX_EJECTION_PERCENT'] // 100
+            if instance.is_ejected(now) or ejected >= max_ejected:
+                return
+            instance.ejections += 1
+            instance.consecutive_failures = 0
+            seconds = min(
+                self.options['BASE_EJECTION_SECONDS'] * instance.ejections,
+                self.options['MAX_EJECTION_SECONDS'])
+            instance.ejected_until = now + seconds
+        logger.warning(
+            f"Ejected {instance.url} of {self.service_name} for {seconds}s")
+
+    def check_health(self, session):
+        '''Активна перевірка всіх інстансів'''
+        for instance in list(self.instances):
+            try:
+                response = session.get(
+                    instance.url + self.options['HEALTH_CHECK_PATH'],
+                    timeout=self.options['HEALTH_CHECK_TIMEOUT'])
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+
+            if ok:
+                instance._check_failures = 0
+                instance._check_successes += 1
+                if not instance.healthy and instance._check_successes >= self.options['HEALTHY_THRESHOLD']:
+                    instance.healthy = True
+                    logger.warning(f"Instance {instance.url} of {self.service_name} is healthy")
+            else:
+                instance._check_successes = 0
+                instance._check_failures += 1
+                if instance.healthy and instance._check_failures >= self.options['UNHEALTHY_THRESHOLD']:
+                    instance.healthy = False
+                    logger.warning(f"Instance {instance.url} of {self.service_name} is unhealthy")
+
+    def stats(self):
+        return {
+            'balancing': self.options['BALANCING'],
+            'instances': [instance.stats() for instance in self.instances],
+        }
+
+
+class UpstreamRegistry:
+    '''Сервіси gateway та їх інстанси.
+
+    Список інстансів береться з settings.MICROSERVICES (URL або список URL)
+    і може перевизначатись файлом GATEWAY_UPSTREAMS_FILE - зміни файла
+    підхоплюються без перезапуску gateway.
+    '''
+
+    def __init__(self):
+        self._upstreams = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file_lock = threading.Lock()
+        self._file_mtime = None
+        self._next_file_check = 0.0
+        self.reload()
+
+    def load_config(self):
+        config = dict(settings.MICROSERVICES)
+        path = getattr(settings, 'GATEWAY_UPSTREAMS_FILE', None)
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    config.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to read upstreams file {path}: {e}")
+        return config
+
+    def reload(self, config=None):
+        '''Застосовує новий список інстансів'''
+        if config is None:
+            config = self.load_config()
+        with self._lock:
+            for service_name, urls in config.items():
+                upstream = self._upstreams.get(service_name)
+                if upstream is None:
+                    self._upstreams[service_name] = Upstream(service_name, urls)
+                else:
+                    upstream.set_instances(urls)
+            for service_name in set(self._upstreams) - set(config):
+                del self._upstreams[service_name]
+
+    def _reload_if_changed(self):
+        path = getattr(settings, 'GATEWAY_UPSTREAMS_FILE', None)
+        if not path:
+            return
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if mtime != self._file_mtime:
+            self._file_mtime = mtime
+            self.reload()
+
+    def _check_file(self):
+        '''Перевіряє файл інстансів не частіше за GATEWAY_UPSTREAMS_FILE_CHECK_INTERVAL.
+
+        Викликається з get(), тому працює і без health check потоку;
+        запити не чекають, поки інший потік перечитує файл.
+        '''
+        now = time.monotonic()
+        if now < self._next_file_check or not self._file_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_file_check = now + getattr(
+                settings, 'GATEWAY_UPSTREAMS_FILE_CHECK_INTERVAL', 5)
+            self._reload_if_changed()
+        except Exception as e:
+            logger.error(f"Upstreams file reload failed: {e}")
+        finally:
+            self._file_lock.release()
+
+    def get(self, service_name):
+        '''Upstream сервіса або None'''
+        self._check_file()
+        self._ensure_health_checks()
+        return self._upstreams.get(service_name)
+
+    def _ensure_health_checks(self):
+        if self._thread is None and getattr(settings, 'GATEWAY_HEALTH_CHECKS', True):
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._health_check_loop, name='gateway-health-checks',
+                        daemon=True)
+                    self._thread.start()
+
+    def _health_check_loop(self):
+        session = requests.Session()
+        interval = DEFAULT_UPSTREAM_SETTINGS['HEALTH_CHECK_INTERVAL']
+        while True:
+            try:
+                upstreams = list(self._upstreams.values())
+                for upstream in upstreams:
+                    upstream.check_health(session)
+                if upstreams:
+                    interval = min(
+                        upstream.options['HEALTH_CHECK_INTERVAL'] for upstream in upstreams)
+            except Exception as e:
+                logger.error(f"Upstream health check failed: {e}")
+            time.sleep(interval)
+
+    def stats(self):
+        return {
+            service_name: upstream.stats()
+            for service_name, upstream in self._upstreams.items()
+        }
+
+
+upstream_registry = UpstreamRegistry()
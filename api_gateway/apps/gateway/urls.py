@@ -1,20 +1,19 @@
+from django.conf import settings
 from django.urls import re_path
 
 from . import views
 
 
-urlpatterns = [
-    # User service routes
-    re_path(r'^auth/.*', views.proxy_view, name='auth-proxy'),
-    re_path(r'^users/.*', views.proxy_view, name='users-proxy'),
-
-    # Product service routes
-    re_path(r'^products/.*', views.proxy_view, name='products-proxy'),
-    re_path(r'^categories/.*', views.proxy_view, name='categories-proxy'),
+# Під ASGI використовуємо асинхронний проксі
+proxy_view = views.async_proxy_view if settings.GATEWAY_ASYNC_PROXY else views.proxy_view
+batch_view = views.async_batch_view if settings.GATEWAY_ASYNC_PROXY else views.batch_view
 
-    # Cart service routes
-    re_path(r'^cart/.*', views.proxy_view, name='cart-proxy'),
+urlpatterns = [
+    # Кілька запитів до сервісів одним викликом
+    re_path(r'^batch/$', batch_view, name='api-batch'),
 
-    # Order service routes
-    re_path(r'^orders/.*', views.proxy_view, name='orders-proxy'),
+    # Сервіс визначається по таблиці GATEWAY_ROUTES. Перший сегмент має
+    # закінчуватися '/', інакше шлях не знайдеться і CommonMiddleware
+    # зробить редірект APPEND_SLASH (/api/products -> /api/products/)
+    re_path(r'^[^/]+/', proxy_view, name='api-proxy'),
 ]
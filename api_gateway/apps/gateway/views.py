@@ -1,157 +1,897 @@
+import asyncio
 import requests
-import json
+import httpx
 import logging
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
 
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.utils.decorators import method_decorator
 from django.views import View
 
+from shared.deadline import DEADLINE_HEADER, parse_timeout
+from shared.identity import IDENTITY_HEADER
+
+from .accesslog import access_log
+from .auth import get_identity_header
+from .batch import (BatchError, build_subrequest, decode_part, error_part,
+                    get_batch_settings, get_executor, parse_batch)
+from .breaker import circuit_breakers
+from .cache import response_cache
+from .compression import response_compressor
+from .coalescing import CoalesceTimeout, request_coalescer
+from .hedging import upstream_hedging
+from .metrics import gateway_metrics, sample_lines
+from .concurrency import concurrency_limiters, get_request_priority
+from .pool import PoolExhausted, upstream_pools, async_upstream_clients
+from .ratelimit import get_limiter, get_rate_limit_identity, limit_exceeded_response
+from .routing import route_table
+from .upstreams import upstream_registry
+
 
 logger = logging.getLogger(__name__)
 
 
+class DeadlineReached(Exception):
+    '''Час запиту вичерпано ще до виклику сервіса'''
+
+
+# Помилки самого gateway: не враховуються ні інстансу, ні breaker-у сервіса
+LOCAL_ERRORS = (PoolExhausted, httpx.PoolTimeout, DeadlineReached)
+
+
+def iter_upstream(response, on_close=None):
+    '''Сирі байти відповіді сервіса (без декомпресії), з'єднання повертається в пул'''
+    try:
+        yield from response.raw.stream(
+            settings.GATEWAY_STREAM_CHUNK_SIZE, decode_content=False)
+    finally:
+        response.close()
+        if on_close:
+            on_close()
+
+
+async def aiter_upstream(response, on_close=None):
+    '''Async варіант iter_upstream для httpx'''
+    try:
+        async for chunk in response.aiter_raw(settings.GATEWAY_STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await response.aclose()
+        if on_close:
+            on_close()
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ProxyView(View):
     '''Базовий клас для проксирования запросов до мікросервісів'''
 
+    # Заголовки запиту, які передаємо в сервіс
+    # (Accept-Encoding не передаємо: стисненням відповідей займається gateway)
+    important_headers = [
+        'Authorization', 'Content-Type', 'Accept', 'User-Agent',
+        'Accept-Language'
+    ]
+
+    # Заголовки відповіді, які копіюємо клієнту
+    response_headers_to_copy = ['Content-Type', 'Cache-Control', 'ETag']
+
+    # При стрімінгу тіло не декодується, тому передаємо і заголовки кодування
+    streaming_headers_to_copy = response_headers_to_copy + [
+        'Content-Length', 'Content-Encoding', 'Content-Disposition',
+        'Last-Modified', 'Vary',
+    ]
+
     def dispatch(self, request, *args, **kwargs):
-        # Логуємо запит
-        logger.info(f"Gateway request: {request.method} {request.path}")
-        logger.info(f"Headers: {dict(request.headers)}")
+        token = gateway_metrics.start(self.get_route(request))
+        response = None
+        try:
+            response = self.forward(request)
+            return response
+        finally:
+            self.finish_request(request, response, token)
+
+    def finish_request(self, request, response, token):
+        '''Метрики і запис логу доступу для обробленого запиту'''
+        status_code = response.status_code if response is not None else None
+        duration = gateway_metrics.finish(token, request.method, status_code)
+        access_log.log(request, response, duration)
+
+    def forward(self, request):
+        '''Відповідь на запит: кеш, coalescing або виклик сервіса'''
+        target = self.resolve_target(request)
+        if isinstance(target, HttpResponse):
+            return target
+        service_name, target_path = target
+        self.get_deadline(request)
+
+        # Публічні GET маршрути віддаємо з кешу
+        cache_policy = response_cache.get_policy(request)
+        if cache_policy:
+            cached_response = response_cache.lookup(request, cache_policy)
+            if cached_response:
+                return cached_response
 
-        # Визначаємо цільовий запит
-        service_name = self.get_service_name(request)
-        if not service_name:
+        # Проксуємо запит (однакові одночасні запити - одним викликом сервіса)
+        if request_coalescer.applies(request, self.get_route(request)):
+            try:
+                response = request_coalescer.run(
+                    request,
+                    lambda: self.proxy_request(request, service_name, target_path))
+            except CoalesceTimeout:
+                logger.error(f"Timeout waiting for coalesced request {request.path}")
+                return JsonResponse({'error': 'Service timeout'}, status=504)
+        else:
+            response = self.proxy_request(request, service_name, target_path)
+
+        if cache_policy:
+            # Закешована відповідь вже стиснена з варіанта в записі кешу
+            response = response_cache.store(request, cache_policy, response)
+        return response_compressor.compress(request, response)
+
+    def resolve_target(self, request):
+        '''Повертає (service_name, target_path) або JsonResponse з помилкою'''
+        # Визначаємо маршрут
+        route = self.get_route(request)
+        if not route:
             logger.error(f"Service not found for path: {request.path}")
             return JsonResponse({'error': 'Service not found'}, status=404)
+        service_name = route.service
 
-        # Отримуємо URL
-        service_url = settings.MICROSERVICES.get(service_name)
-        if not service_url:
+        # Сервіс має бути в реєстрі інстансів
+        if upstream_registry.get(service_name) is None:
             logger.error(f"Service {service_name} not configured")
             return JsonResponse({'error': f"Service {service_name} not configured"}, status=404)
 
-        # Формуємо цільовий URL
-        target_path = self.get_target_path(request)
-        target_url = f"{service_url}{target_path}"
+        # Формуємо цільовий шлях; інстанс вибирається перед самим запитом
+        target_path = route.get_target_path(request.path)
+        return service_name, target_path
+
+    def get_route(self, request):
+        '''Маршрут з GATEWAY_ROUTES для запиту (зберігається на request)'''
+        if not hasattr(request, 'gateway_route'):
+            request.gateway_route = route_table.resolve(request.path)
+        return request.gateway_route
+
+    def get_deadline(self, request):
+        '''Момент (time.monotonic()), до якого запит має бути оброблений.
 
-        logger.info(f"Proxying to: {target_path}")
+        Таймаут маршруту (options.timeout або GATEWAY_UPSTREAM_TIMEOUT),
+        скорочений дедлайном клієнта, якщо той його передав.
+        '''
+        if not hasattr(request, 'gateway_deadline'):
+            route = self.get_route(request)
+            timeout = settings.GATEWAY_UPSTREAM_TIMEOUT
+            if route is not None:
+                timeout = route.options.get('timeout', timeout)
+            client_timeout = parse_timeout(request.headers.get(DEADLINE_HEADER))
+            if client_timeout is not None:
+                timeout = min(timeout, client_timeout)
+            request.gateway_deadline = time.monotonic() + timeout
+        return request.gateway_deadline
 
-        # Проксуємо запит
-        return self.proxy_request(request, target_url)
+    def get_remaining_timeout(self, request):
+        return self.get_deadline(request) - time.monotonic()
 
-    def get_service_name(self, request):
-        '''Визначення сервіса по URL'''
-        path = request.path
+    def get_forward_headers(self, request):
+        '''Заголовки для запиту в сервіс'''
+        headers = {}
 
-        if path.startswith('/api/auth/') or path.startswith('/api/users/'):
-            return 'user-service'
-        elif path.startswith('/api/products/') or path.startswith('/api/categories/'):
-            return 'product-service'
-        elif path.startswith('/api/cart/'):
-            return 'cart-service'
-        elif path.startswith('/api/orders/'):
-            return 'order-service'
+        # Копируем важные заголовки
+        for header_name in self.important_headers:
+            header_value = request.headers.get(header_name)
+            if header_value:
+                headers[header_name] = header_value
 
+        # Інакше requests/httpx просять gzip/br від себе, і стиснене тіло
+        # потрапило б (при стрімінгу - як є) до клієнта, який його не приймає
+        headers['Accept-Encoding'] = 'identity'
+
+        # Токен перевірено тут - сервісам не треба питати user-service
+        identity = get_identity_header(request)
+        if identity:
+            headers[IDENTITY_HEADER] = identity
+
+        # Сервіс отримує залишок часу і передає його далі
+        remaining = self.get_remaining_timeout(request)
+        headers[DEADLINE_HEADER] = str(max(0, int(remaining * 1000)))
+        return headers
+
+    def get_forward_body(self, request):
+        '''Тіло запиту передаємо в сервіс байт в байт, без розбору'''
+        if request.method in ['POST', 'PUT', 'PATCH', 'DELETE'] and request.body:
+            return request.body
         return None
 
-    def get_target_path(self, request):
-        '''Формуємо шлях для сервіса'''
-        # Прибираємо префікс /api якшо він є і додаєм назад для сервіса
-        path = request.path
-        if path.startswith('/api/'):
-            return path  # лишаємо як є
-        return path
+    def get_forward_params(self, request):
+        '''Query parameters'''
+        return dict(request.GET.items())
 
-    def proxy_request(self, request, target_url):
-        """Проксирование HTTP запроса"""
-        try:
-            # Подготавливаем headers
-            headers = {}
-
-            # Копируем важные заголовки
-            important_headers = [
-                'Authorization', 'Content-Type', 'Accept', 'User-Agent',
-                'Accept-Language', 'Accept-Encoding'
-            ]
-
-            for header_name in important_headers:
-                header_value = request.headers.get(header_name)
-                if header_value:
-                    headers[header_name] = header_value
-
-            # Логируем заголовки для отладки
-            logger.info(f"Forwarding headers: {headers}")
-
-            # Подготавливаем данные
-            data = None
-            json_data = None
-
-            if request.method in ['POST', 'PUT', 'PATCH']:
-                content_type = request.headers.get('Content-Type', '')
-
-                if 'application/json' in content_type:
-                    try:
-                        if request.body:
-                            json_data = json.loads(
-                                request.body.decode('utf-8'))
-                            logger.info(f"JSON data: {json_data}")
-                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                        logger.error(f"Failed to parse JSON: {e}")
-                        data = request.body
-                else:
-                    data = request.body
+    def build_response(self, status_code, upstream_headers, content):
+        '''Формуємо відповідь клієнту з відповіді сервіса'''
+        django_response = HttpResponse(
+            content,
+            status=status_code,
+            content_type=upstream_headers.get(
+                'content-type', 'application/json')
+        )
+
+        # Копируем важные заголовки ответа
+        for key in self.response_headers_to_copy:
+            if key in upstream_headers:
+                django_response[key] = upstream_headers[key]
+
+        return django_response
+
+    def should_stream(self, request):
+        '''Чи передавати відповідь сервіса потоком'''
+        # Відповіді, які кешуються, діляться між запитами або збираються
+        # в batch, потрібні повністю
+        if getattr(request, 'gateway_batch', False):
+            return False
+        if upstream_hedging.applies(request, self.get_route(request)):
+            return False
+        if response_cache.get_policy(request):
+            return False
+        if request_coalescer.applies(request, self.get_route(request)):
+            return False
+        return settings.GATEWAY_STREAM_RESPONSES
+
+    def build_streaming_response(self, status_code, upstream_headers, chunks):
+        '''Відповідь, яка віддає тіло сервіса по частинах без буферизації'''
+        django_response = StreamingHttpResponse(
+            chunks,
+            status=status_code,
+            content_type=upstream_headers.get(
+                'content-type', 'application/json')
+        )
+
+        for key in self.streaming_headers_to_copy:
+            if key in upstream_headers:
+                django_response[key] = upstream_headers[key]
+
+        return django_response
 
-            # Добавляем query parameters
-            params = dict(request.GET.items())
-            if params:
-                logger.info(f"Query params: {params}")
+    def circuit_open_response(self, service_name, breaker):
+        '''Швидка відмова, поки breaker сервіса відкритий'''
+        logger.warning(f"Circuit open for {service_name}, rejecting request")
+        response = JsonResponse({
+            'error': 'Service unavailable',
+            'message': f'{service_name} is temporarily unavailable'
+        }, status=503)
+        response['Retry-After'] = str(max(1, math.ceil(breaker.retry_after())))
+        return response
 
-            # Выполняем запрос
-            response = requests.request(
+    def overloaded_response(self, service_name, priority):
+        '''Запит скинуто: немає вільного слота до сервіса'''
+        logger.warning(f"Shedding {priority} priority request to {service_name}")
+        response = JsonResponse({
+            'error': 'Service overloaded',
+            'message': f'{service_name} is overloaded, please retry later'
+        }, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    def deadline_exceeded_response(self, service_name):
+        logger.warning(f"Deadline exceeded before calling {service_name}")
+        return JsonResponse({'error': 'Service timeout'}, status=504)
+
+    def local_error_response(self, service_name, target_path, error):
+        '''Відповідь, коли запит не дійшов до сервіса через gateway'''
+        if isinstance(error, DeadlineReached):
+            return self.deadline_exceeded_response(service_name)
+        logger.error(f"No free upstream connection for {service_name}{target_path}: {error}")
+        return JsonResponse({'error': 'Service unavailable'}, status=503)
+
+    def finish_upstream_call(self, request, service_name, breaker, limiter, success, elapsed):
+        '''Записує результат виклику в breaker, ліміт і статистику затримок'''
+        request.gateway_upstream_seconds = elapsed
+        gateway_metrics.observe_upstream(self.get_route(request), elapsed)
+        breaker.record(success, elapsed)
+        limiter.record(elapsed, dropped=not success)
+        upstream_hedging.observe(service_name, elapsed, success)
+
+    @staticmethod
+    def discard_attempt(attempt, instance):
+        '''Відповідь, яка програла hedge, - звільняємо інстанс'''
+        if attempt.cancelled() or attempt.exception() is not None:
+            return
+        instance.release()
+
+    def send_attempt(self, request, service_name, upstream, instance, target_path, stream):
+        '''Один запит до інстанса; при помилці інстанс звільняється'''
+        timeout = self.get_remaining_timeout(request)
+        if timeout <= 0:
+            raise DeadlineReached(f"No time left to call {instance.url}{target_path}")
+        instance.acquire()
+        try:
+            # Выполняем запрос через keep-alive пул сервиса
+            response = upstream_pools.request(
+                service_name,
                 method=request.method,
-                url=target_url,
-                headers=headers,
-                json=json_data,
-                data=data if json_data is None else None,
-                params=params,
-                timeout=30
+                url=f"{instance.url}{target_path}",
+                headers=self.get_forward_headers(request),
+                data=self.get_forward_body(request),
+                params=self.get_forward_params(request),
+                timeout=timeout,
+                stream=stream
             )
+        except LOCAL_ERRORS:
+            instance.release()
+            raise
+        except Exception:
+            upstream.record(instance, False)
+            instance.release()
+            raise
+        upstream.record(instance, response.status_code < 500)
+        return response
 
-            logger.info(f"Response status: {response.status_code}")
-            # Логируем первые 200 символов
-            logger.info(f"Response content: {response.text[:200]}...")
+    def should_retry(self, request, service_name, attempt):
+        '''Чи повторювати запит після помилки з'єднання (attempt - номер повтору)'''
+        return (upstream_hedging.can_retry(request)
+                and self.get_remaining_timeout(request) > 0
+                and upstream_hedging.allow_retry(service_name, attempt))
 
-            # Возвращаем ответ
-            django_response = HttpResponse(
-                response.content,
-                status=response.status_code,
-                content_type=response.headers.get(
-                    'content-type', 'application/json')
-            )
+    def send_with_retries(self, request, service_name, upstream, target_path, stream, tried=()):
+        '''Запит з повтором на іншому інстансі при помилці з'єднання'''
+        tried = list(tried)
+        while True:
+            instance = upstream.choose(exclude=tried)
+            try:
+                return self.send_attempt(
+                    request, service_name, upstream, instance, target_path, stream), instance
+            except PoolExhausted:
+                raise
+            except requests.exceptions.ConnectionError as e:
+                tried.append(instance)
+                if not self.should_retry(request, service_name, len(tried)):
+                    raise
+                logger.warning(f"Retrying {target_path} after connection error on {instance.url}: {e}")
+
+    def choose_hedge(self, service_name, upstream, primary):
+        '''Інстанс для hedge запиту; None - іншого інстанса немає або бюджет вичерпано'''
+        hedge = upstream.choose(exclude=[primary])
+        if hedge is None or hedge is primary:
+            return None
+        if not upstream_hedging.allow_hedge(service_name):
+            return None
+        return hedge
+
+    def send_hedged(self, request, service_name, upstream, target_path):
+        '''Якщо перший запит не відповів за перцентиль затримки, дублюємо його
+        на інший інстанс і беремо першу успішну відповідь.
+
+        Обидва запити йдуть з пулу потоків, а потік запиту чекає на перший
+        успішний, тому повільний інстанс не затримує відповідь. Якщо дубль
+        не надсилався, помилка з'єднання повторюється як у send_with_retries.
+        '''
+        executor = upstream_hedging.executor
+        primary = upstream.choose()
+        attempts = {
+            executor.submit(self.send_attempt, request, service_name,
+                            upstream, primary, target_path, False): primary
+        }
+        done, _ = wait(attempts, timeout=upstream_hedging.delay(service_name))
+        hedge = None if done else self.choose_hedge(service_name, upstream, primary)
+        if hedge is not None:
+            attempts[executor.submit(self.send_attempt, request, service_name,
+                                     upstream, hedge, target_path, False)] = hedge
+
+        try:
+            return self.wait_hedged(request, service_name, target_path, primary, attempts)
+        except requests.exceptions.ConnectionError as e:
+            if (len(attempts) > 1 or isinstance(e, PoolExhausted)
+                    or not self.should_retry(request, service_name, 1)):
+                raise
+            logger.warning(f"Retrying {target_path} after connection error on {primary.url}: {e}")
+            return self.send_with_retries(
+                request, service_name, upstream, target_path, False, tried=[primary])
+
+    def wait_hedged(self, request, service_name, target_path, primary, attempts):
+        '''Перша успішна відповідь з attempts; решта звільняє інстанси по завершенні'''
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = wait(
+                pending, timeout=max(0, self.get_remaining_timeout(request)),
+                return_when=FIRST_COMPLETED)
+            if not done:
+                for attempt in pending:
+                    attempt.cancel()
+                    attempt.add_done_callback(
+                        partial(self.discard_attempt, instance=attempts[attempt]))
+                raise requests.exceptions.Timeout(f"Hedged request to {target_path} timed out")
+
+            winner = next((attempt for attempt in done if attempt.exception() is None), None)
+            if winner is None:
+                error = next(iter(done)).exception()
+                continue
 
-            # Копируем важные заголовки ответа
-            response_headers_to_copy = [
-                'Content-Type', 'Cache-Control', 'ETag']
-            for key in response_headers_to_copy:
-                if key in response.headers:
-                    django_response[key] = response.headers[key]
+            for attempt in (done | pending) - {winner}:
+                attempt.cancel()
+                attempt.add_done_callback(
+                    partial(self.discard_attempt, instance=attempts[attempt]))
+            if attempts[winner] is not primary:
+                upstream_hedging.hedge_won(service_name)
+            return winner.result(), attempts[winner]
+        raise error
 
-            return django_response
+    def proxy_request(self, request, service_name, target_path):
+        """Проксирование HTTP запроса"""
+        breaker = circuit_breakers.get(service_name)
+        if not breaker.allow():
+            return self.circuit_open_response(service_name, breaker)
+
+        # Чекаємо слот до сервіса; при перевантаженні першими скидаються низькі пріоритети
+        limiter = concurrency_limiters.get(service_name)
+        priority = get_request_priority(request)
+        if not limiter.acquire(priority, self.get_remaining_timeout(request)):
+            breaker.cancel()
+            return self.overloaded_response(service_name, priority)
 
+        # Дедлайн міг минути в черзі - тоді сервіс не викликаємо
+        if self.get_remaining_timeout(request) <= 0:
+            breaker.cancel()
+            limiter.release()
+            return self.deadline_exceeded_response(service_name)
+
+        upstream = upstream_registry.get(service_name)
+        stream = self.should_stream(request)
+        started = time.monotonic()
+        error_response = None
+        try:
+            if upstream_hedging.applies(request, self.get_route(request)):
+                response, instance = self.send_hedged(
+                    request, service_name, upstream, target_path)
+            else:
+                response, instance = self.send_with_retries(
+                    request, service_name, upstream, target_path, stream)
+        except LOCAL_ERRORS as e:
+            breaker.cancel()
+            limiter.release()
+            return self.local_error_response(service_name, target_path, e)
         except requests.exceptions.Timeout:
-            logger.error(f"Timeout when calling {target_url}")
-            return JsonResponse({'error': 'Service timeout'}, status=504)
+            logger.error(f"Timeout when calling {service_name}{target_path}")
+            error_response = JsonResponse({'error': 'Service timeout'}, status=504)
         except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error when calling {target_url}: {e}")
+            logger.error(f"Connection error when calling {service_name}{target_path}: {e}")
+            error_response = JsonResponse({'error': 'Service unavailable'}, status=503)
+        except Exception as e:
+            logger.error(f"Error proxying request to {service_name}{target_path}: {e}")
+            error_response = JsonResponse({'error': 'Internal server error'}, status=500)
+
+        success = error_response is None and response.status_code < 500
+        self.finish_upstream_call(
+            request, service_name, breaker, limiter, success, time.monotonic() - started)
+        if error_response is not None:
+            limiter.release()
+            return error_response
+
+        request.gateway_instance = instance.url
+
+        def release():
+            instance.release()
+            limiter.release()
+
+        try:
+            if stream:
+                return self.build_streaming_response(
+                    response.status_code, response.headers,
+                    iter_upstream(response, on_close=release))
+
+            # Возвращаем ответ
+            return self.build_response(
+                response.status_code, response.headers, response.content)
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error reading response from {instance.url}{target_path}: {e}")
             return JsonResponse({'error': 'Service unavailable'}, status=503)
         except Exception as e:
-            logger.error(f"Error proxying request to {target_url}: {e}")
+            logger.error(f"Error proxying request to {instance.url}{target_path}: {e}")
             return JsonResponse({'error': 'Internal server error'}, status=500)
+        finally:
+            # При стрімінгу слот звільняється, коли тіло дочитане
+            if not stream:
+                release()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncProxyView(ProxyView):
+    '''Асинхронний проксі для запуску під ASGI.
+
+    Не займає потік на час запиту до сервіса, тому один воркер
+    тримає тисячі запитів до сервісів одночасно.
+    '''
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        token = gateway_metrics.start(self.get_route(request))
+        response = None
+        try:
+            response = await self.forward(request)
+            return response
+        finally:
+            self.finish_request(request, response, token)
+
+    async def forward(self, request):
+        target = self.resolve_target(request)
+        if isinstance(target, HttpResponse):
+            return target
+        service_name, target_path = target
+        self.get_deadline(request)
+
+        cache_policy = response_cache.get_policy(request)
+        if cache_policy:
+            cached_response = response_cache.lookup(request, cache_policy)
+            if cached_response:
+                return cached_response
+
+        if request_coalescer.applies(request, self.get_route(request)):
+            try:
+                response = await request_coalescer.arun(
+                    request,
+                    lambda: self.proxy_request_async(request, service_name, target_path))
+            except CoalesceTimeout:
+                logger.error(f"Timeout waiting for coalesced request {request.path}")
+                return JsonResponse({'error': 'Service timeout'}, status=504)
+        else:
+            response = await self.proxy_request_async(request, service_name, target_path)
+
+        if cache_policy:
+            # Закешована відповідь вже стиснена з варіанта в записі кешу
+            response = response_cache.store(request, cache_policy, response)
+        return response_compressor.compress(request, response)
+
+    async def send_attempt_async(self, request, service_name, upstream, instance, target_path, stream):
+        '''Async варіант send_attempt'''
+        timeout = self.get_remaining_timeout(request)
+        if timeout <= 0:
+            raise DeadlineReached(f"No time left to call {instance.url}{target_path}")
+        instance.acquire()
+        try:
+            response = await async_upstream_clients.request(
+                service_name,
+                method=request.method,
+                url=f"{instance.url}{target_path}",
+                headers=self.get_forward_headers(request),
+                content=self.get_forward_body(request),
+                params=self.get_forward_params(request),
+                timeout=timeout,
+                stream=stream
+            )
+        except (asyncio.CancelledError, *LOCAL_ERRORS):
+            # Hedge запит, що програв, або помилка gateway - не помилка інстанса
+            instance.release()
+            raise
+        except Exception:
+            upstream.record(instance, False)
+            instance.release()
+            raise
+        upstream.record(instance, response.status_code < 500)
+        return response
+
+    async def send_with_retries_async(self, request, service_name, upstream, target_path, stream,
+                                      tried=()):
+        tried = list(tried)
+        while True:
+            instance = upstream.choose(exclude=tried)
+            try:
+                return await self.send_attempt_async(
+                    request, service_name, upstream, instance, target_path, stream), instance
+            except httpx.NetworkError as e:
+                tried.append(instance)
+                if not self.should_retry(request, service_name, len(tried)):
+                    raise
+                logger.warning(f"Retrying {target_path} after connection error on {instance.url}: {e}")
+
+    async def send_hedged_async(self, request, service_name, upstream, target_path):
+        primary = upstream.choose()
+        attempts = {
+            asyncio.ensure_future(self.send_attempt_async(
+                request, service_name, upstream, primary, target_path, False)): primary
+        }
+        try:
+            return await self.wait_hedged_async(
+                request, service_name, upstream, target_path, primary, attempts)
+        except asyncio.CancelledError:
+            # Запит скасовано - спроби, що ще йдуть, теж, інакше вони тримають інстанси
+            for attempt, instance in attempts.items():
+                attempt.add_done_callback(partial(self.discard_attempt, instance=instance))
+                attempt.cancel()
+            raise
+        except httpx.NetworkError as e:
+            if len(attempts) > 1 or not self.should_retry(request, service_name, 1):
+                raise
+            logger.warning(f"Retrying {target_path} after connection error on {primary.url}: {e}")
+            return await self.send_with_retries_async(
+                request, service_name, upstream, target_path, False, tried=[primary])
+
+    async def wait_hedged_async(self, request, service_name, upstream, target_path, primary, attempts):
+        done, _ = await asyncio.wait(attempts, timeout=upstream_hedging.delay(service_name))
+        hedge = None if done else self.choose_hedge(service_name, upstream, primary)
+        if hedge is not None:
+            attempts[asyncio.ensure_future(self.send_attempt_async(
+                request, service_name, upstream, hedge, target_path, False))] = hedge
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0, self.get_remaining_timeout(request)),
+                return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                for attempt in pending:
+                    attempt.cancel()
+                raise httpx.TimeoutException(f"Hedged request to {target_path} timed out")
+
+            winner = next((attempt for attempt in done if attempt.exception() is None), None)
+            if winner is None:
+                error = next(iter(done)).exception()
+                continue
+
+            for attempt in (done | pending) - {winner}:
+                attempt.add_done_callback(
+                    partial(self.discard_attempt, instance=attempts[attempt]))
+                attempt.cancel()
+            if attempts[winner] is not primary:
+                upstream_hedging.hedge_won(service_name)
+            return winner.result(), attempts[winner]
+        raise error
+
+    async def proxy_request_async(self, request, service_name, target_path):
+        """Асинхронне проксирование HTTP запроса"""
+        breaker = circuit_breakers.get(service_name)
+        if not breaker.allow():
+            return self.circuit_open_response(service_name, breaker)
+
+        limiter = concurrency_limiters.get(service_name)
+        priority = get_request_priority(request)
+        if not await limiter.aacquire(priority, self.get_remaining_timeout(request)):
+            breaker.cancel()
+            return self.overloaded_response(service_name, priority)
+
+        # Слот і breaker звільняються в finally - і при скасуванні запиту
+        # (CancelledError при відключенні клієнта або таймауті coalescer-а)
+        instance = None
+        recorded = False
+        streaming = False
+        try:
+            if self.get_remaining_timeout(request) <= 0:
+                return self.deadline_exceeded_response(service_name)
+
+            upstream = upstream_registry.get(service_name)
+            stream = self.should_stream(request)
+            started = time.monotonic()
+            error_response = None
+            try:
+                if upstream_hedging.applies(request, self.get_route(request)):
+                    response, instance = await self.send_hedged_async(
+                        request, service_name, upstream, target_path)
+                else:
+                    response, instance = await self.send_with_retries_async(
+                        request, service_name, upstream, target_path, stream)
+            except LOCAL_ERRORS as e:
+                return self.local_error_response(service_name, target_path, e)
+            except httpx.TimeoutException:
+                logger.error(f"Timeout when calling {service_name}{target_path}")
+                error_response = JsonResponse({'error': 'Service timeout'}, status=504)
+            except httpx.TransportError as e:
+                logger.error(f"Connection error when calling {service_name}{target_path}: {e}")
+                error_response = JsonResponse({'error': 'Service unavailable'}, status=503)
+            except Exception as e:
+                logger.error(f"Error proxying request to {service_name}{target_path}: {e}")
+                error_response = JsonResponse({'error': 'Internal server error'}, status=500)
+
+            success = error_response is None and response.status_code < 500
+            self.finish_upstream_call(
+                request, service_name, breaker, limiter, success, time.monotonic() - started)
+            recorded = True
+            if error_response is not None:
+                return error_response
+
+            request.gateway_instance = instance.url
+
+            def release():
+                instance.release()
+                limiter.release()
+
+            try:
+                if stream:
+                    proxied = self.build_streaming_response(
+                        response.status_code, response.headers,
+                        aiter_upstream(response, on_close=release))
+                    # Далі слот звільняє aiter_upstream, коли тіло дочитане
+                    streaming = True
+                    return proxied
+
+                return self.build_response(
+                    response.status_code, response.headers, response.content)
+
+            except Exception as e:
+                logger.error(f"Error proxying request to {instance.url}{target_path}: {e}")
+                return JsonResponse({'error': 'Internal server error'}, status=500)
+        finally:
+            if not recorded:
+                breaker.cancel()
+            if not streaming:
+                if instance is not None:
+                    instance.release()
+                limiter.release()
 
 
 # Создаем экземпляр для всех API запросов
 proxy_view = ProxyView.as_view()
+async_proxy_view = AsyncProxyView.as_view()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchView(View):
+    '''Кілька запитів до сервісів одним викликом gateway.
+
+    Тіло: {"requests": [{"id", "method", "path", "query", "body"}, ...]}.
+    Частини виконуються одночасно через той самий проксі (кеш, ліміти,
+    breaker-и) з авторизацією batch запиту; відповідь - один JSON з
+    статусом кожної частини.
+    '''
+
+    http_method_names = ['post']
+
+    def get_parts(self, request):
+        options = get_batch_settings()
+        return parse_batch(request, options, request.path)
+
+    def build_batch_response(self, request, parts, results):
+        response = JsonResponse({
+            'responses': {
+                part['id']: result for part, result in zip(parts, results)
+            }
+        })
+        return response_compressor.compress(request, response)
+
+    def run_part(self, subrequest, limit_result):
+        # Частина понад rate limit отримує 429, інші виконуються
+        if not limit_result.allowed:
+            return decode_part(limit_exceeded_response(limit_result))
+        try:
+            return decode_part(proxy_view(subrequest))
+        except Exception as e:
+            return error_part(e)
+
+    def post(self, request):
+        try:
+            parts = self.get_parts(request)
+        except BatchError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # Кожна частина - окремий запит для rate limit, як і без batch
+        key, limit = get_rate_limit_identity(request)
+        limit_results = [get_limiter().hit(key, limit) for _ in parts]
+        subrequests = [build_subrequest(request, part) for part in parts]
+        results = list(get_executor().map(self.run_part, subrequests, limit_results))
+        return self.build_batch_response(request, parts, results)
+
+
+class AsyncBatchView(BatchView):
+    '''Batch для ASGI: частини виконуються в одному event loop'''
+
+    view_is_async = True
+
+    async def run_part(self, subrequest, limit_result):
+        if not limit_result.allowed:
+            return decode_part(limit_exceeded_response(limit_result))
+        try:
+            return decode_part(await async_proxy_view(subrequest))
+        except Exception as e:
+            return error_part(e)
+
+    async def post(self, request):
+        try:
+            parts = self.get_parts(request)
+        except BatchError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        key, limit = get_rate_limit_identity(request)
+        limit_results = [await get_limiter().ahit(key, limit) for _ in parts]
+        results = await asyncio.gather(*(
+            self.run_part(build_subrequest(request, part), limit_result)
+            for part, limit_result in zip(parts, limit_results)
+        ))
+        return self.build_batch_response(request, parts, results)
+
+
+batch_view = BatchView.as_view()
+async_batch_view = AsyncBatchView.as_view()
+
+
+def component_metrics():
+    '''Метрики компонентів gateway у форматі Prometheus'''
+    breaker_states = {'closed': 0, 'half_open': 1, 'open': 2}
+    breakers = circuit_breakers.stats()
+    limits = concurrency_limiters.stats()
+    hedging = upstream_hedging.stats()
+    cache_stats = response_cache.stats()
+    coalescing = request_coalescer.stats()
+    pools = upstream_pools.stats()
+    async_pools = async_upstream_clients.stats()
+
+    lines = []
+    lines += sample_lines(
+        'gateway_circuit_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+        'gauge', [((name,), breaker_states[stats['state']]) for name, stats in breakers.items()],
+        ('service',))
+    lines += sample_lines(
+        'gateway_concurrency_limit', 'Adaptive concurrency limit', 'gauge',
+        [((name,), stats['limit']) for name, stats in limits.items()], ('service',))
+    lines += sample_lines(
+        'gateway_concurrency_queue', 'Requests waiting for a concurrency slot', 'gauge',
+        [((name,), stats['queue']) for name, stats in limits.items()], ('service',))
+    lines += sample_lines(
+        'gateway_shed_total', 'Requests shed by the concurrency limiter', 'counter',
+        [((name, priority), count)
+         for name, stats in limits.items() for priority, count in stats['shed'].items()],
+        ('service', 'priority'))
+    for counter in ('hedges', 'hedge_wins', 'retries', 'retries_denied'):
+        lines += sample_lines(
+            f'gateway_{counter}_total', f'Upstream {counter.replace("_", " ")}', 'counter',
+            [((name,), stats[counter]) for name, stats in hedging['services'].items()],
+            ('service',))
+    lines += sample_lines(
+        'gateway_retry_budget_balance', 'Tokens left in the retry budget', 'gauge',
+        [((), hedging['budget']['balance'])])
+    lines += sample_lines(
+        'gateway_response_cache_total', 'Response cache lookups', 'counter',
+        [((result,), cache_stats[result])
+         for result in ('local_hits', 'shared_hits', 'misses', 'not_modified', 'bypass')],
+        ('result',))
+    for counter in ('leaders', 'coalesced', 'timeouts'):
+        lines += sample_lines(
+            f'gateway_coalescing_{counter}_total', f'Request coalescing {counter}', 'counter',
+            [((), coalescing[counter])])
+    lines += sample_lines(
+        'gateway_coalescing_in_flight', 'Coalesced upstream calls in progress', 'gauge',
+        [((), coalescing['in_flight'])])
+    for counter in ('requests', 'new_connections', 'waits', 'wait_timeouts', 'evictions'):
+        lines += sample_lines(
+            f'gateway_pool_{counter}_total', f'Upstream connection pool {counter.replace("_", " ")}',
+            'counter', [((name,), stats[counter]) for name, stats in pools.items()], ('service',))
+    for gauge in ('in_use', 'idle_connections'):
+        lines += sample_lines(
+            f'gateway_pool_{gauge}', f'Upstream connection pool {gauge.replace("_", " ")}',
+            'gauge', [((name,), stats[gauge]) for name, stats in pools.items()], ('service',))
+    lines += sample_lines(
+        'gateway_async_pool_in_flight', 'Requests in flight on async upstream clients', 'gauge',
+        [((name,), stats['in_flight']) for name, stats in async_pools.items()], ('service',))
+    return lines
+
+
+gateway_metrics.register_collector(component_metrics)
+
+
+def metrics(request):
+    '''Метрики gateway для Prometheus'''
+    return HttpResponse(
+        gateway_metrics.expose(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def gateway_stats(request):
+    '''Стан gateway: пули, інстанси, ліміти, кеш, rate limit, coalescing, breakers'''
+    return JsonResponse({
+        'pools': upstream_pools.stats(),
+        'async_pools': async_upstream_clients.stats(),
+        'response_cache': response_cache.stats(),
+        'rate_limit': get_limiter().stats(),
+        'coalescing': request_coalescer.stats(),
+        'compression': response_compressor.stats(),
+        'hedging': upstream_hedging.stats(),
+        'access_log': access_log.stats(),
+        'circuit_breakers': circuit_breakers.stats(),
+        'upstreams': upstream_registry.stats(),
+        'concurrency': concurrency_limiters.stats(),
+    })
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Під ASGI gateway проксує запити асинхронно
+os.environ.setdefault('GATEWAY_ASYNC_PROXY', 'True')
 
 application = get_asgi_application()
+
+# Запити проксі - окремим коротким ланцюжком middleware (GATEWAY_FAST_PATH)
+from apps.gateway.lean import fast_path_application  # noqa: E402
+
+application = fast_path_application(application)
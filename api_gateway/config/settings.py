@@ -1,8 +1,12 @@
+import sys
 from pathlib import Path
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Спільні модулі (shared/) лежать в корені репозиторію
+sys.path.append(str(BASE_DIR.parent))
+
 SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
@@ -30,15 +34,30 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # Sessions, auth і messages потрібні тільки адмінці: для GATEWAY_LEAN_PATHS
+    # ці middleware пропускаються
+    'apps.gateway.lean.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'apps.gateway.lean.AuthenticationMiddleware',
+    'apps.gateway.lean.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'apps.gateway.middleware.RateLimitMiddleware',
 ]
 
+# Шляхи проксі: без сесій, користувача і повідомлень, без звернень до бази
+GATEWAY_LEAN_PATHS = ['/api/']
+
+# Fast path: запити GATEWAY_LEAN_PATHS обробляє окремий handler з коротким
+# ланцюжком GATEWAY_FAST_PATH_MIDDLEWARE замість повного MIDDLEWARE
+GATEWAY_FAST_PATH = config('GATEWAY_FAST_PATH', default=False, cast=bool)
+GATEWAY_FAST_PATH_MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'apps.gateway.middleware.RateLimitMiddleware',
+]
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -90,7 +109,7 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Service URLs
+# Service URLs (URL або список URL інстансів сервіса)
 # docker run -d --name redis-local -p 6379:6379 redis:7-alpine
 MICROSERVICES = {
     'user-service': 'http://localhost:8004',
@@ -99,5 +118,209 @@ MICROSERVICES = {
     'order-service': 'http://localhost:8003',
 }
 
+# Таймаут запиту до сервіса за замовчуванням (секунд)
+GATEWAY_UPSTREAM_TIMEOUT = 30
+
+# JSON файл {"service": ["http://...", ...]}, який перевизначає MICROSERVICES;
+# зміни підхоплюються без перезапуску (файл перевіряється раз на інтервал, сек)
+GATEWAY_UPSTREAMS_FILE = config('GATEWAY_UPSTREAMS_FILE', default='')
+GATEWAY_UPSTREAMS_FILE_CHECK_INTERVAL = 5
+
+# Активні перевірки /health/ інстансів
+GATEWAY_HEALTH_CHECKS = config('GATEWAY_HEALTH_CHECKS', default=True, cast=bool)
+
+# Балансування та виключення інстансів ('default' + перевизначення по сервісу)
+GATEWAY_UPSTREAMS = {
+    'default': {
+        'BALANCING': 'least_outstanding',
+        'HEALTH_CHECK_INTERVAL': 5,
+        'CONSECUTIVE_FAILURES': 5,
+        'BASE_EJECTION_SECONDS': 30,
+    },
+    'product-service': {
+        'BALANCING': 'power_of_two',
+    },
+}
+
+# Маршрути gateway: префікс шляху -> сервіс.
+# 'rewrite' - на що замінити префікс для сервіса, 'options' - налаштування маршруту
+# (coalesce, hedge - дублювати повільні GET на інший інстанс,
+# timeout - секунд на весь запит замість GATEWAY_UPSTREAM_TIMEOUT)
+GATEWAY_ROUTES = [
+    # User service routes
+    {'prefix': '/api/auth/', 'service': 'user-service'},
+    {'prefix': '/api/users/', 'service': 'user-service'},
+
+    # Product service routes
+    {'prefix': '/api/products/', 'service': 'product-service',
+     'options': {'coalesce': True, 'hedge': True, 'timeout': 10}},
+    {'prefix': '/api/categories/', 'service': 'product-service',
+     'options': {'coalesce': True, 'hedge': True, 'timeout': 10}},
+
+    # Cart service routes
+    {'prefix': '/api/cart/', 'service': 'cart-service'},
+
+    # Order service routes
+    {'prefix': '/api/orders/', 'service': 'order-service'},
+]
+
+# Об'єднання однакових одночасних запитів (для маршрутів з options.coalesce)
+GATEWAY_COALESCING = {
+    'ENABLED': True,
+    'METHODS': ['GET', 'HEAD'],
+    'KEY_HEADERS': ['Authorization', 'Accept', 'Accept-Language'],
+    'WAIT_TIMEOUT': 10,
+}
+
+# Circuit breaker по сервісам ('default' + перевизначення по сервісу)
+GATEWAY_CIRCUIT_BREAKER = {
+    'default': {
+        'WINDOW_SIZE': 20,
+        'MIN_CALLS': 10,
+        'FAILURE_RATE_THRESHOLD': 0.5,
+        'SLOW_CALL_THRESHOLD': 5,
+        'SLOW_CALL_RATE_THRESHOLD': 0.8,
+        'OPEN_SECONDS': 30,
+        'HALF_OPEN_MAX_CALLS': 3,
+    },
+}
+
+# Адаптивні ліміти одночасних запитів до сервісів ('default' + по сервісу)
+GATEWAY_CONCURRENCY = {
+    'default': {
+        'ALGORITHM': 'gradient',
+        'INITIAL_LIMIT': 20,
+        'MIN_LIMIT': 4,
+        'MAX_LIMIT': 200,
+        'MAX_QUEUE': 100,
+        'QUEUE_TIMEOUTS': {'critical': 5, 'high': 3, 'normal': 1, 'low': 0.2},
+    },
+}
+
+# Пріоритети запитів при перевантаженні: critical > high > normal > low.
+# Запити без правила - normal для авторизованих, low для анонімних
+GATEWAY_PRIORITY_RULES = [
+    {'pattern': r'^/api/orders/create/$', 'methods': ['POST'], 'priority': 'critical'},
+    {'pattern': r'^/api/cart/', 'methods': ['POST', 'PUT', 'PATCH', 'DELETE'],
+     'priority': 'high'},
+]
+
+# Пули keep-alive з'єднань до сервісів ('default' + перевизначення по сервісу)
+UPSTREAM_POOLS = {
+    'default': {
+        'POOL_MAXSIZE': 20,
+        'IDLE_TIMEOUT': 60,
+    },
+    'product-service': {
+        'POOL_MAXSIZE': 50,
+    },
+}
+
+# Асинхронний проксі (httpx); вмикається в config/asgi.py
+GATEWAY_ASYNC_PROXY = config('GATEWAY_ASYNC_PROXY', default=False, cast=bool)
+
+# Передача відповідей сервісів потоком, без буферизації в пам'яті gateway
+GATEWAY_STREAM_RESPONSES = True
+GATEWAY_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Hedge запити для маршрутів з options.hedge
+GATEWAY_HEDGING = {
+    'PERCENTILE': 95,
+    'MIN_DELAY': 0.02,
+    'MAX_DELAY': 1.0,
+}
+
+# Повтори при помилках з'єднання в межах спільного бюджету
+# (hedge запити витрачають той самий бюджет)
+GATEWAY_RETRIES = {
+    'MAX_RETRIES': 2,
+    'BUDGET_RATIO': 0.1,
+    'MIN_RETRIES_PER_SECOND': 5,
+}
+
+# Лог доступу: один JSON запис на запит, пишеться фоновим потоком
+GATEWAY_ACCESS_LOG = {
+    'ENABLED': config('GATEWAY_ACCESS_LOG', default=True, cast=bool),
+    'SAMPLE_RATE': config('GATEWAY_ACCESS_LOG_SAMPLE_RATE', default=1.0, cast=float),
+    'SLOW_MS': 1000,
+    'HEADERS': ['User-Agent', 'Authorization'],
+    'REDACT_HEADERS': ['Authorization', 'Cookie', 'X-Internal-Identity'],
+    'FILE': config('GATEWAY_ACCESS_LOG_FILE', default=''),
+}
+
+# Batch endpoint /api/batch/
+GATEWAY_BATCH = {
+    'MAX_REQUESTS': 10,
+    'METHODS': ['GET'],
+    'MAX_WORKERS': 32,
+}
+
+# Стиснення відповідей gateway (gzip, brotli - якщо встановлено пакет brotli)
+GATEWAY_COMPRESSION = {
+    'ENABLED': True,
+    'ENCODINGS': ['br', 'gzip'],
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    # Префікс Content-Type -> мінімальний розмір тіла для стиснення (байт)
+    'CONTENT_TYPES': {
+        'application/json': 1024,
+        'text/': 1024,
+        'application/javascript': 1024,
+        'image/svg+xml': 1024,
+    },
+}
+
+# Кеш відповідей для публічних GET маршрутів каталогу (TTL в секундах)
+GATEWAY_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'LOCAL_MAX_ENTRIES': 512,
+    'VARY_HEADERS': ['Accept', 'Accept-Language'],
+    'ROUTES': [
+        {'pattern': r'^/api/products/$', 'ttl': 30},
+        {'pattern': r'^/api/products/\d+/$', 'ttl': 60},
+        {'pattern': r'^/api/categories/', 'ttl': 300},
+    ],
+}
+
+# Redis настройки
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+REDIS_DB = 0
+
 # Rate limiting settings
 RATE_LIMIT_REQUESTS_PER_MINUTE = 100
+RATE_LIMIT_WINDOW_SECONDS = 60
+# 'sliding_window' або 'token_bucket'
+RATE_LIMIT_ALGORITHM = 'sliding_window'
+# Розмір сплеску для token_bucket (None - як RATE_LIMIT_REQUESTS_PER_MINUTE)
+RATE_LIMIT_BURST = None
+# 'redis' (атомарно, з локальним fallback), 'local' або 'approximate'
+RATE_LIMIT_BACKEND = 'redis'
+RATE_LIMIT_REDIS_TIMEOUT = 0.05
+RATE_LIMIT_REDIS_RETRY_INTERVAL = 5
+# approximate: лічильники в процесі, дельти в Redis пачками раз на інтервал.
+# Перевищення ліміту не більше (процесів gateway - 1) * MAX_DRIFT на ключ.
+RATE_LIMIT_APPROX_FLUSH_INTERVAL_MS = 200
+RATE_LIMIT_APPROX_MAX_DRIFT = 10
+
+# Ліміти по тарифам: anonymous - по IP, решта - по користувачу з токена
+RATE_LIMIT_TIERS = {
+    'anonymous': RATE_LIMIT_REQUESTS_PER_MINUTE,
+    'authenticated': 300,
+    'premium': 1000,
+}
+# user_id -> тариф (якшо в токені немає claim RATE_LIMIT_TIER_CLAIM)
+RATE_LIMIT_USER_TIERS = {}
+RATE_LIMIT_TIER_CLAIM = 'rate_limit_tier'
+
+# JWT токени user-service (simplejwt підписує їх SECRET_KEY user-service).
+# Для RS256 задати JWT_ALGORITHM і публічний ключ в JWT_VERIFYING_KEY.
+# Без ключа токени не перевіряються і всі запити анонімні (check gateway.W001)
+JWT_SIGNING_KEY = config('JWT_SIGNING_KEY', default='')
+JWT_VERIFYING_KEY = config('JWT_VERIFYING_KEY', default='')
+JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
+JWT_USER_ID_CLAIM = 'user_id'
+
+# Секрет для підпису X-Internal-Identity (такий самий в cart/order service).
+# Порожній - gateway не передає ідентичність, сервіси питають user-service
+INTERNAL_IDENTITY_SECRET = config('INTERNAL_IDENTITY_SECRET', default='')
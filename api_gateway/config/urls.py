@@ -3,6 +3,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 
+from apps.gateway.views import gateway_stats, metrics
+
 
 def health_check(request):
     return JsonResponse({
@@ -20,5 +22,7 @@ def health_check(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health_check),
+    path('gateway/stats/', gateway_stats),
+    path('metrics', metrics),
     path('api/', include('apps.gateway.urls')),
 ]
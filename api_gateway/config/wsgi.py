@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Запити проксі - окремим коротким ланцюжком middleware (GATEWAY_FAST_PATH)
+from apps.gateway.lean import fast_path_application  # noqa: E402
+
+application = fast_path_application(application)
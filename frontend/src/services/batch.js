@@ -0,0 +1,27 @@
+// frontend/src/services/batch.js
+import api from './api'
+
+// Query params the way axios sends them: skip null/undefined, values as strings
+const toQuery = (params = {}) => {
+  const query = {}
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== null && value !== undefined) query[key] = String(value)
+  })
+  return query
+}
+
+const batchService = {
+  // requests: [{ id, path, query }] -> { [id]: { status, headers, body } }
+  async fetchAll(requests) {
+    const response = await api.post('/batch/', {
+      requests: requests.map(({ query, ...request }) => ({
+        method: 'GET',
+        ...request,
+        query: toQuery(query)
+      }))
+    })
+    return response.data.responses
+  }
+}
+
+export default batchService
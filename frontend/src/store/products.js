@@ -1,6 +1,7 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import productService from '../services/products'
+import batchService from '../services/batch'
 
 export const useProductsStore = defineStore('products', () => {
   // State
@@ -59,26 +60,36 @@ export const useProductsStore = defineStore('products', () => {
   })
 
   // Actions
+  function buildProductQuery(params = {}) {
+    return {
+      page: pagination.value.currentPage,
+      page_size: pagination.value.pageSize,
+      ...filters.value,
+      ...params
+    }
+  }
+
+  function setProducts(data) {
+    products.value = data.results || data
+
+    // Update pagination if response has pagination info
+    if (data.count !== undefined) {
+      pagination.value.totalCount = data.count
+      pagination.value.totalPages = Math.ceil(data.count / pagination.value.pageSize)
+    }
+  }
+
+  function setCategories(data) {
+    categories.value = data.results || data
+  }
+
   async function fetchProducts(params = {}) {
     try {
       loading.value = true
-      const queryParams = {
-        page: pagination.value.currentPage,
-        page_size: pagination.value.pageSize,
-        ...filters.value,
-        ...params
-      }
-
-      const response = await productService.getProducts(queryParams)
+      const response = await productService.getProducts(buildProductQuery(params))
 
       if (response.data) {
-        products.value = response.data.results || response.data
-
-        // Update pagination if response has pagination info
-        if (response.data.count !== undefined) {
-          pagination.value.totalCount = response.data.count
-          pagination.value.totalPages = Math.ceil(response.data.count / pagination.value.pageSize)
-        }
+        setProducts(response.data)
       }
 
       return { success: true }
@@ -94,13 +105,45 @@ export const useProductsStore = defineStore('products', () => {
     try {
       const response = await productService.getCategories()
       if (response.data) {
-        categories.value = response.data.results || response.data
+        setCategories(response.data)
       }
     } catch (error) {
       console.error('Fetch categories error:', error)
     }
   }
 
+  // Categories and products in one gateway round trip (/api/batch/)
+  async function fetchCatalog(params = {}) {
+    let responses
+    try {
+      loading.value = true
+      responses = await batchService.fetchAll([
+        { id: 'categories', path: '/api/categories/' },
+        { id: 'products', path: '/api/products/', query: buildProductQuery(params) }
+      ])
+    } catch (error) {
+      // Batch unavailable - fall back to separate requests in parallel
+      console.error('Fetch catalog batch error:', error)
+      const [, result] = await Promise.all([fetchCategories(), fetchProducts(params)])
+      return result
+    } finally {
+      loading.value = false
+    }
+
+    const { categories: categoriesPart, products: productsPart } = responses
+    if (categoriesPart?.status === 200) {
+      setCategories(categoriesPart.body)
+    } else {
+      console.error('Fetch categories error:', categoriesPart)
+    }
+    if (productsPart?.status === 200) {
+      setProducts(productsPart.body)
+      return { success: true }
+    }
+    console.error('Fetch products error:', productsPart)
+    return { success: false, error: productsPart?.body?.error || 'Failed to load products' }
+  }
+
   async function fetchProduct(id) {
     try {
       loading.value = true
@@ -161,6 +204,7 @@ export const useProductsStore = defineStore('products', () => {
     // Actions
     fetchProducts,
     fetchCategories,
+    fetchCatalog,
     fetchProduct,
     setFilters,
     clearFilters,
@@ -1,7 +1,10 @@
-import jwt
 from django.http import JsonResponse
 from django.conf import settings
 
+from shared.deadline import DeadlineExceeded, deadline_exceeded_response
+from shared.identity import IDENTITY_HEADER, verify_identity
+from shared.tokens import AccessTokenVerifier
+
 from .services import UserService
 
 import logging
@@ -13,16 +16,29 @@ class JWTAuthenticationMiddleware:
 
     def __init__(self, get_response):
         self.get_response = get_response
+        # Токен перевіряється локально; user-service - тільки для відсутніх claims
+        self.token_verifier = AccessTokenVerifier(
+            settings.JWT_VERIFYING_KEY or settings.JWT_SIGNING_KEY,
+            settings.JWT_ALGORITHM,
+            fetch_user=UserService.get_user_from_token)
 
     def __call__(self, request):
-        # Пропускаемо health check і admin
-        if request.path in ['/health/', '/admin']:
+        # Пропускаемо health check, stats і admin
+        if request.path in ['/health/', '/stats/', '/admin']:
             return self.get_response(request)
 
         # Пропускаємо OPTIONS заприти
         if request.method == 'OPTIONS':
             return self.get_response(request)
 
+        # Користувач, якого вже перевірив gateway
+        identity = verify_identity(
+            request.headers.get(IDENTITY_HEADER), settings.INTERNAL_IDENTITY_SECRET)
+        if identity:
+            request.user_id = identity['user_id']
+            request.user_email = identity.get('email', '')
+            return self.get_response(request)
+
         # Беремо токен
         auth_header = request.headers.get('Authorization')
 
@@ -30,8 +46,12 @@ class JWTAuthenticationMiddleware:
             token = auth_header.split(' ')[1]
             logger.info(f"Found auth token in request to {request.path}")
 
-            # Получаємо користувача через user-service
-            user_data = UserService.get_user_from_token(token)
+            # Перевіряємо токен (без запиту до user-service, якщо вистачає claims)
+            try:
+                user_data = self.token_verifier.get_user(token)
+            except DeadlineExceeded:
+                # Виключення з middleware не доходять до DeadlineMiddleware
+                return deadline_exceeded_response()
             if user_data:
                 request.user_id = user_data['id']
                 request.user_email = user_data['email']
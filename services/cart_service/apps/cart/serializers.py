@@ -1,9 +1,22 @@
+from django.db import models
 from rest_framework import serializers
 
 from .models import Cart, CartItem
 from .services import ProductServices
 
 
+class CartItemListSerializer(serializers.ListSerializer):
+    '''Список товарів кошика: інформація про всі товари - одним запитом'''
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(items)
+        product_info = self.context.setdefault('product_info', {})
+        missing = {item.product_id for item in items} - set(product_info)
+        product_info.update(ProductServices.get_products(missing))
+        return super().to_representation(items)
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     subtotal = serializers.DecimalField(
         max_digits=10, decimal_places=2, read_only=True)
@@ -15,10 +28,15 @@ class CartItemSerializer(serializers.ModelSerializer):
             'id', 'product_id', 'product_name', 'quantity',
             'price', 'subtotal', 'product_info', 'created_at'
         ]
+        list_serializer_class = CartItemListSerializer
 
     def get_product_info(self, obj):
-        '''Получаєм ітформацію о товарі'''
-        product_data = ProductServices.get_product(obj.product_id)
+        '''Получаєм ітформацію о товарі (None - товар недоступний)'''
+        product_info = self.context.get('product_info', {})
+        if obj.product_id in product_info:
+            product_data = product_info[obj.product_id]
+        else:
+            product_data = ProductServices.get_product(obj.product_id)
         if product_data:
             return {
                 'name': product_data.get('name'),
@@ -1,10 +1,29 @@
+import contextvars
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
+
+from shared.client import ServiceClient, json_or_none
+from shared.tokens import TokenCache, cached_by_token
 
 logger = logging.getLogger(__name__)
 
+# Виклики інших сервісів: пули з'єднань, повтори, метрики (SERVICE_CLIENT)
+service_client = ServiceClient({
+    'product-service': settings.PRODUCT_SERVICE_URL,
+    'user-service': settings.USER_SERVICE_URL,
+}, getattr(settings, 'SERVICE_CLIENT', None))
+
+# Паралельні запити товарів, якщо product-service не підтримує batch
+product_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PRODUCT_FETCH_WORKERS', 8),
+    thread_name_prefix='product-fetch')
+
+# Користувачі по токену: однакові запити до user-service з кешу
+user_token_cache = TokenCache(getattr(settings, 'USER_TOKEN_CACHE', None))
+
 
 class ProductServices:
     '''Сервіс для взаємодії з сервісом продуктів'''
@@ -13,52 +32,71 @@ class ProductServices:
     def get_product(product_id: int) -> Optional[Dict[str, Any]]:
         '''Отримання інформації о товарі'''
         try:
-            response = requests.get(
-                f'{settings.PRODUCT_SERVICE_URL}/api/products/{product_id}',
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return service_client.get(
+                'product-service', f'/api/products/{product_id}',
+                endpoint='/api/products/{id}', decode=json_or_none)
         except requests.exceptions.RequestException as e:
             logger.error(f'Failed to get product {product_id}: {e}')
             return None
 
+    @staticmethod
+    def get_products(product_ids: Iterable[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        '''Інформація про кілька товарів: {id: дані або None, якщо товар недоступний}'''
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return {}
+        try:
+            data = service_client.get(
+                'product-service', '/api/products/batch/',
+                params={'ids': ','.join(str(product_id) for product_id in product_ids)},
+                endpoint='/api/products/batch/', decode=json_or_none)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f'Batch product request failed: {e}')
+            data = None
+
+        if data is not None:
+            products = {product['id']: product for product in data.get('results', [])}
+            return {product_id: products.get(product_id) for product_id in product_ids}
+
+        # Без batch - паралельні запити (з дедлайном і memo поточного запиту)
+        futures = {
+            product_id: product_executor.submit(
+                contextvars.copy_context().run, ProductServices.get_product, product_id)
+            for product_id in product_ids
+        }
+        return {product_id: future.result() for product_id, future in futures.items()}
+
     @staticmethod
     def check_availability(product_id: int, quantity: int) -> bool:
         '''Перевірка наявності на складі'''
         try:
-            response = requests.get(
-                f'{settings.PRODUCT_SERVICE_URL}/api/products/{product_id}/check-availability/',
+            data = service_client.get(
+                'product-service', f'/api/products/{product_id}/check-availability/',
                 params={'quantity': quantity},
-                timeout=10
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('available', False)
-            return False
+                endpoint='/api/products/{id}/check-availability/', decode=json_or_none)
+            return data.get('available', False) if data else False
         except requests.exceptions.RequestException as e:
             logger.error(
                 f"Failed to check availability for product {product_id}: {e}")
             return False
 
+    @staticmethod
+    def is_available(product_data: Dict[str, Any], quantity: int) -> bool:
+        '''Наявність по вже отриманих даних товару (умова як у check-availability)'''
+        return product_data.get('stock_quantity', 0) >= quantity
+
 
 class UserService:
     '''Сервіс для взаімодії з User Service'''
 
     @staticmethod
+    @cached_by_token(user_token_cache)
     def get_user_from_token(token: str) -> Optional[Dict[str, Any]]:
         '''Інформація про користувача за токеном'''
         try:
-            headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
-                f"{settings.USER_SERVICE_URL}/api/users/profile/",
-                headers=headers,
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return service_client.get(
+                'user-service', '/api/users/profile/',
+                headers={'Authorization': f'Bearer {token}'}, decode=json_or_none)
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get user from token: {e}")
             return None
@@ -1,3 +1,71 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase
+
+from shared.deadline import remaining, reset_deadline, set_deadline
+
+from .services import ProductServices
+
+
+class GetProductsTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('apps.cart.services.service_client')
+        self.client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_batch_call(self):
+        self.client.get.return_value = {'results': [{'id': 1, 'name': 'a'}, {'id': 3, 'name': 'c'}]}
+
+        products = ProductServices.get_products([3, 1, 2, 1])
+
+        self.assertEqual(products, {1: {'id': 1, 'name': 'a'}, 2: None, 3: {'id': 3, 'name': 'c'}})
+        self.client.get.assert_called_once()
+        args, kwargs = self.client.get.call_args
+        self.assertEqual(args, ('product-service', '/api/products/batch/'))
+        self.assertEqual(kwargs['params'], {'ids': '1,2,3'})
+
+    def test_no_ids_no_calls(self):
+        self.assertEqual(ProductServices.get_products([]), {})
+        self.client.get.assert_not_called()
+
+    def fetch_one_by_one(self, batch):
+        '''batch - що повертає batch endpoint (або виключення)'''
+        def get(service, path, **kwargs):
+            if path == '/api/products/batch/':
+                if isinstance(batch, Exception):
+                    raise batch
+                return batch
+            product_id = int(path.rstrip('/').rsplit('/', 1)[1])
+            # Запити в потоках бачать дедлайн запиту
+            self.assertIsNotNone(remaining())
+            return {'id': product_id} if product_id != 2 else None
+
+        self.client.get.side_effect = get
+        token = set_deadline(time.monotonic() + 5)
+        try:
+            return ProductServices.get_products([1, 2, 3])
+        finally:
+            reset_deadline(token)
+
+    def test_falls_back_to_parallel_requests(self):
+        products = self.fetch_one_by_one(batch=None)
+        self.assertEqual(products, {1: {'id': 1}, 2: None, 3: {'id': 3}})
+        self.assertEqual(self.client.get.call_count, 4)
+
+    def test_falls_back_when_batch_fails(self):
+        with self.assertLogs('apps.cart.services', 'WARNING'):
+            products = self.fetch_one_by_one(batch=requests.exceptions.ConnectionError('refused'))
+        self.assertEqual(products, {1: {'id': 1}, 2: None, 3: {'id': 3}})
+
+    def test_failed_product_is_none(self):
+        self.client.get.side_effect = [None, {'id': 1}, requests.exceptions.ConnectionError('refused')]
+        with mock.patch('apps.cart.services.product_executor') as executor:
+            # Послідовно, щоб порядок side_effect був детермінованим
+            executor.submit.side_effect = lambda func, *args: mock.Mock(
+                result=mock.Mock(return_value=func(*args)))
+            with self.assertLogs('apps.cart.services', 'ERROR'):
+                products = ProductServices.get_products([1, 2])
+        self.assertEqual(products, {1: {'id': 1}, 2: None})
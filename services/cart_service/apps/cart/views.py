@@ -56,15 +56,8 @@ def add_to_cart(request):
         logger.info(
             f"Cart for user {request.user_id}: {'created' if created else 'found'}")
 
-        # Перевіряєм наявність товару
-        if not ProductServices.check_availability(product_id, quantity):
-            logger.warning(
-                f'Product {product_id} not available in quantity {quantity}')
-            return Response({
-                'error': 'Product is not available in requested quantity.'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Отримуємо інформацію о товрарі
+        # Отримуємо інформацію о товрарі (вже завантажена при валідації -
+        # береться з memo запиту)
         product_data = ProductServices.get_product(product_id)
         if not product_data:
             logger.warning(f"Product {product_id} not found")
@@ -72,6 +65,14 @@ def add_to_cart(request):
                 'error': 'Product not found'
             }, status=status.HTTP_404_NOT_FOUND)
 
+        # Перевіряєм наявність товару по тих самих даних, без окремого запиту
+        if not ProductServices.is_available(product_data, quantity):
+            logger.warning(
+                f'Product {product_id} not available in quantity {quantity}')
+            return Response({
+                'error': 'Product is not available in requested quantity.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         # Додаємо чи оновлюємо товар
         cart_item, created = CartItem.objects.get_or_create(
             cart=cart,
@@ -86,7 +87,7 @@ def add_to_cart(request):
         if not created:
             # Якшо вже у кошику, то збільшуємо кількість
             new_quantity = cart_item.quantity + quantity
-            if not ProductServices.check_availability(product_id, new_quantity):
+            if not ProductServices.is_available(product_data, new_quantity):
                 return Response({
                     'error': 'Not enough stock available'
                 }, status=status.HTTP_400_BAD_REQUEST)
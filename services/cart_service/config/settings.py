@@ -1,8 +1,12 @@
+import sys
 from pathlib import Path
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Спільні модулі (shared/) лежать в корені репозиторію
+sys.path.append(str(BASE_DIR.parent.parent))
+
 SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
@@ -30,6 +34,8 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'shared.deadline.DeadlineMiddleware',
+    'shared.memo.RequestMemoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +96,32 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Секрет для перевірки X-Internal-Identity від gateway (порожній - вимкнено)
+INTERNAL_IDENTITY_SECRET = config('INTERNAL_IDENTITY_SECRET', default='')
+
+# Локальна перевірка access токенів user-service (його SIMPLE_JWT ключ).
+# Без ключа користувач визначається запитом до user-service
+JWT_SIGNING_KEY = config('JWT_SIGNING_KEY', default='')
+JWT_VERIFYING_KEY = config('JWT_VERIFYING_KEY', default='')
+JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
+
+# Клієнт для викликів інших сервісів ('default' + перевизначення по сервісу),
+# решта налаштувань - shared.client.DEFAULT_CLIENT_SETTINGS
+SERVICE_CLIENT = {
+    'default': {
+        'TIMEOUT': 10,
+        'POOL_MAXSIZE': 20,
+        'RETRIES': 2,
+    },
+}
+
+# Кеш UserService.get_user_from_token (ключ - хеш токена, TTL не довший за exp)
+USER_TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+    'NEGATIVE_TTL': 5,
+}
+
 # Service URLs
 PRODUCT_SERVICE_URL = 'http://localhost:8001'
 USER_SERVICE_URL = 'http://localhost:8004'
@@ -2,13 +2,24 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 
+from apps.cart.services import service_client, user_token_cache
+
 
 def health_check(request):
     return JsonResponse({'status': 'healthy', 'service': 'cart-service'})
 
 
+def service_stats(request):
+    '''Кеш токенів і затримки викликів інших сервісів (окремо від health check)'''
+    return JsonResponse({
+        'user_token_cache': user_token_cache.stats(),
+        'service_client': service_client.stats(),
+    })
+
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health_check),
+    path('stats/', service_stats),
     path('api/', include('apps.cart.urls')),
 ]
@@ -1,4 +1,9 @@
 from django.http import JsonResponse
+from django.conf import settings
+
+from shared.deadline import DeadlineExceeded, deadline_exceeded_response
+from shared.identity import IDENTITY_HEADER, verify_identity
+from shared.tokens import AccessTokenVerifier
 
 from .services import UserService
 
@@ -8,10 +13,29 @@ class JWTAuthenticationMiddleware:
 
     def __init__(self, get_response):
         self.get_response = get_response
+        # Токен перевіряється локально; user-service - тільки для відсутніх claims
+        self.token_verifier = AccessTokenVerifier(
+            settings.JWT_VERIFYING_KEY or settings.JWT_SIGNING_KEY,
+            settings.JWT_ALGORITHM,
+            fetch_user=UserService.get_user_from_token)
 
     def __call__(self, request):
-        # Пропускаєм health і admin
-        if request.path in ['/health/', '/admin/']:
+        # Пропускаєм health, stats і admin
+        if request.path in ['/health/', '/stats/', '/admin/']:
+            return self.get_response(request)
+
+        # Користувач, якого вже перевірив gateway
+        identity = verify_identity(
+            request.headers.get(IDENTITY_HEADER), settings.INTERNAL_IDENTITY_SECRET)
+        if identity:
+            request.user_id = identity['user_id']
+            request.user_email = identity.get('email', '')
+            # Без email в токені (старі токени) профіль візьме view з user-service
+            if request.user_email:
+                request.user_data = {
+                    'id': identity['user_id'],
+                    'email': request.user_email,
+                }
             return self.get_response(request)
 
         # Беремо токен
@@ -19,8 +43,12 @@ class JWTAuthenticationMiddleware:
         if auth_header and auth_header.startswith('Bearer'):
             token = auth_header.split(' ')[1]
 
-            # Получаемо користувача через user srvicr
-            user_data = UserService.get_user_from_token(token)
+            # Перевіряємо токен (без запиту до user-service, якщо вистачає claims)
+            try:
+                user_data = self.token_verifier.get_user(token)
+            except DeadlineExceeded:
+                # Виключення з middleware не доходять до DeadlineMiddleware
+                return deadline_exceeded_response()
             if user_data:
                 request.user_id = user_data['id']
                 request.user_email = user_data['email']
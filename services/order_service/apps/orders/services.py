@@ -5,8 +5,22 @@ import logging
 from django.conf import settings
 from typing import Optional, Dict, Any, List
 
+from shared.client import ServiceClient, is_ok, json_or_none
+from shared.deadline import DeadlineExceeded
+from shared.tokens import TokenCache, cached_by_token
+
 logger = logging.getLogger(__name__)
 
+# Виклики інших сервісів: пули з'єднань, повтори, метрики (SERVICE_CLIENT)
+service_client = ServiceClient({
+    'product-service': settings.PRODUCT_SERVICE_URL,
+    'cart-service': settings.CART_SERVICE_URL,
+    'user-service': settings.USER_SERVICE_URL,
+}, getattr(settings, 'SERVICE_CLIENT', None))
+
+# Користувачі по токену: однакові запити до user-service з кешу
+user_token_cache = TokenCache(getattr(settings, 'USER_TOKEN_CACHE', None))
+
 
 class EventBus:
     '''Сервес для публікацій подій'''
@@ -45,15 +59,9 @@ class CartService:
     def get_user_cart(user_id: int, token: str) -> Optional[Dict[str, Any]]:
         '''Отримання кошика користувача'''
         try:
-            headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
-                f"{settings.CART_SERVICE_URL}/api/cart/",
-                headers=headers,
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return service_client.get(
+                'cart-service', '/api/cart/',
+                headers={'Authorization': f'Bearer {token}'}, decode=json_or_none)
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get cart for user {user_id}: {e}")
             return None
@@ -64,33 +72,45 @@ class ProductService:
 
     @staticmethod
     def reserve_products(items: List[Dict]) -> bool:
-        '''Резервування продуктів'''
+        '''Резервування продуктів.
+
+        Якщо зарезервувати всі товари не вдалось (або минув дедлайн
+        запиту), вже зарезервовані вивільняються.
+        '''
+        reserved_items = []
         try:
             for item in items:
-                response = requests.post(
-                    f"{settings.PRODUCT_SERVICE_URL}/api/products/{item['product_id']}/reserve/",
+                reserved = service_client.post(
+                    'product-service', f"/api/products/{item['product_id']}/reserve/",
                     json={'quantity': item['quantity']},
-                    timeout=10
-                )
-                if response.status_code != 200:
+                    endpoint='/api/products/{id}/reserve/', decode=is_ok)
+                if not reserved:
                     logger.error(
                         f"Failed to reserve product {item['product_id']}")
+                    ProductService.release_products(reserved_items)
                     return False
+                reserved_items.append(item)
             return True
+        except DeadlineExceeded:
+            logger.error(f"Deadline exceeded while reserving products, releasing {reserved_items}")
+            ProductService.release_products(reserved_items)
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to reserve products: {e}")
+            ProductService.release_products(reserved_items)
             return False
 
     @staticmethod
     def release_products(items: List[Dict]) -> bool:
         '''Вивільнення зарезервованих товарів'''
+        # Компенсація виконується і після дедлайна запиту, інакше товари
+        # лишаться зарезервованими
         try:
             for item in items:
-                requests.post(
-                    f"{settings.PRODUCT_SERVICE_URL}/api/products/{item['product_id']}/release/",
+                service_client.post(
+                    'product-service', f"/api/products/{item['product_id']}/release/",
                     json={'quantity': item['quantity']},
-                    timeout=10
-                )
+                    endpoint='/api/products/{id}/release/', use_deadline=False)
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to release products: {e}")
 
@@ -99,18 +119,13 @@ class UserService:
     '''Суквіс для взаімодії з сервісом користувачів'''
 
     @staticmethod
+    @cached_by_token(user_token_cache)
     def get_user_from_token(token: str) -> Optional[Dict[str, Any]]:
         '''Отримуємо інформацію користувача по токену'''
         try:
-            headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(
-                f"{settings.USER_SERVICE_URL}/api/user/profile/",
-                headers=headers,
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return service_client.get(
+                'user-service', '/api/users/profile/',
+                headers={'Authorization': f'Bearer {token}'}, decode=json_or_none)
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get user from token: {e}")
             return None
@@ -1,3 +1,282 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import requests
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from shared.client import ServiceClient
+from shared.deadline import DEADLINE_HEADER, DeadlineExceeded, reset_deadline, set_deadline
+from shared.identity import IDENTITY_HEADER, sign_identity, verify_identity
+from shared.tokens import AccessTokenVerifier, TokenCache, cached_by_token
+
+from .middleware import JWTAuthenticationMiddleware
+from .services import ProductService
+
+
+class ReserveProductsTests(SimpleTestCase):
+
+    items = [
+        {'product_id': 1, 'quantity': 2},
+        {'product_id': 2, 'quantity': 1},
+        {'product_id': 3, 'quantity': 5},
+    ]
+
+    @mock.patch('apps.orders.services.service_client')
+    def test_reserved_items_released_on_deadline(self, client):
+        client.post.side_effect = [True, DeadlineExceeded(), None]
+
+        with self.assertRaises(DeadlineExceeded):
+            ProductService.reserve_products(self.items)
+
+        release_calls = client.post.call_args_list[2:]
+        self.assertEqual(len(release_calls), 1)
+        args, kwargs = release_calls[0]
+        self.assertEqual(args[1], '/api/products/1/release/')
+        self.assertEqual(kwargs['json'], {'quantity': 2})
+        self.assertFalse(kwargs['use_deadline'])
+
+    @mock.patch('apps.orders.services.service_client')
+    def test_reserved_items_released_when_item_unavailable(self, client):
+        client.post.side_effect = [True, True, False, None, None]
+
+        self.assertFalse(ProductService.reserve_products(self.items))
+        released = [args[1] for args, kwargs in client.post.call_args_list[3:]]
+        self.assertEqual(released, ['/api/products/1/release/', '/api/products/2/release/'])
+
+
+@override_settings(INTERNAL_IDENTITY_SECRET='secret')
+class IdentityHeaderTests(SimpleTestCase):
+
+    def authenticate(self, identity):
+        identity = dict(identity, exp=time.time() + 60)
+        request = RequestFactory().post('/api/orders/create/', headers={
+            IDENTITY_HEADER: sign_identity(identity, 'secret')})
+        JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_identity_with_email_sets_user_data(self):
+        request = self.authenticate({'user_id': 7, 'email': 'user@example.com'})
+        self.assertEqual(request.user_data, {'id': 7, 'email': 'user@example.com'})
+
+    def test_identity_without_email_leaves_profile_to_user_service(self):
+        request = self.authenticate({'user_id': 7})
+        self.assertEqual(request.user_id, 7)
+        self.assertFalse(hasattr(request, 'user_data'))
+
+    def test_forged_identity_is_rejected(self):
+        header = sign_identity({'user_id': 7, 'exp': time.time() + 60}, 'other-secret')
+        self.assertIsNone(verify_identity(header, 'secret'))
+
+        signature = sign_identity(
+            {'user_id': 7, 'exp': time.time() + 60}, 'secret').split('.')[1]
+        forged_payload = sign_identity({'user_id': 1, 'exp': time.time() + 60}, 'x').split('.')[0]
+        self.assertIsNone(verify_identity(f"{forged_payload}.{signature}", 'secret'))
+
+    def test_malformed_and_non_ascii_identity_is_rejected(self):
+        for value in ['', 'abc', 'abc.', '.def', 'abé.def', 'abc.déf', '%%%.***']:
+            with self.subTest(value=value):
+                self.assertIsNone(verify_identity(value, 'secret'))
+
+    def test_non_ascii_identity_header_gets_401(self):
+        request = RequestFactory().post('/api/orders/create/', headers={IDENTITY_HEADER: 'abc.déf'})
+        response = JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+        self.assertEqual(response.status_code, 401)
+
+
+class ServiceClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = ServiceClient({'product-service': 'http://products:8000/'},
+                                    {'default': {'TIMEOUT': 10, 'RETRIES': 2}})
+        self.session = mock.Mock()
+        patcher = mock.patch.object(self.client, 'session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('shared.client.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, status):
+        return mock.Mock(status_code=status)
+
+    def with_deadline(self, seconds):
+        token = set_deadline(time.monotonic() + seconds)
+        self.addCleanup(reset_deadline, token)
+
+    def test_get_is_retried_with_backoff(self):
+        self.session.request.side_effect = [
+            requests.exceptions.ConnectionError('refused'), self.response(503), self.response(200)]
+        with mock.patch('shared.client.random.uniform', side_effect=lambda low, high: high):
+            response = self.client.get('product-service', '/api/products/1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.05, 0.1])
+        self.session.request.assert_called_with(
+            'GET', 'http://products:8000/api/products/1/', params=None, json=None,
+            headers={}, timeout=10)
+        stats = self.client.stats()['product-service']['GET /api/products/1/']
+        self.assertEqual((stats['calls'], stats['errors'], stats['retries']), (3, 2, 2))
+
+    def test_retries_are_limited(self):
+        self.session.request.side_effect = requests.exceptions.ConnectionError('refused')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.get('product-service', '/api/products/1/')
+        self.assertEqual(self.session.request.call_count, 3)
+
+    def test_post_is_not_retried(self):
+        self.session.request.side_effect = requests.exceptions.ConnectionError('refused')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.post('product-service', '/api/products/1/reserve/', json={'quantity': 1})
+        self.session.request.assert_called_once()
+
+        self.session.request.side_effect = [self.response(503)]
+        response = self.client.post('product-service', '/api/products/1/reserve/')
+        self.assertEqual(response.status_code, 503)
+        self.sleep.assert_not_called()
+
+    def test_read_timeout_is_not_retried(self):
+        self.session.request.side_effect = requests.exceptions.ReadTimeout('slow')
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.client.get('product-service', '/api/products/1/')
+        self.session.request.assert_called_once()
+
+    def test_deadline_limits_timeout_and_is_forwarded(self):
+        self.with_deadline(2)
+        self.session.request.return_value = self.response(200)
+        self.client.get('product-service', '/api/products/1/')
+        kwargs = self.session.request.call_args.kwargs
+        self.assertLessEqual(kwargs['timeout'], 2)
+        self.assertGreater(kwargs['timeout'], 1.5)
+        self.assertLessEqual(int(kwargs['headers'][DEADLINE_HEADER]), 2000)
+
+    def test_expired_deadline_skips_call(self):
+        self.with_deadline(-1)
+        with self.assertRaises(DeadlineExceeded):
+            self.client.get('product-service', '/api/products/1/')
+        self.session.request.assert_not_called()
+
+    def test_no_retry_when_backoff_exceeds_deadline(self):
+        self.with_deadline(0.01)
+        self.session.request.side_effect = requests.exceptions.ConnectionError('refused')
+        with mock.patch('shared.client.random.uniform', return_value=0.05):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.get('product-service', '/api/products/1/')
+        self.session.request.assert_called_once()
+        self.sleep.assert_not_called()
+
+    def test_compensating_call_ignores_deadline(self):
+        self.with_deadline(-1)
+        self.session.request.return_value = self.response(200)
+        self.client.post('product-service', '/api/products/1/release/', use_deadline=False)
+        kwargs = self.session.request.call_args.kwargs
+        self.assertEqual(kwargs['timeout'], 10)
+        self.assertNotIn(DEADLINE_HEADER, kwargs['headers'])
+
+
+class AccessTokenVerifierTests(SimpleTestCase):
+
+    def token(self, key='secret', **claims):
+        claims = dict({'user_id': 7, 'email': 'user@example.com', 'token_type': 'access',
+                       'exp': int(time.time()) + 60}, **claims)
+        return jwt.encode(claims, key, algorithm='HS256')
+
+    def test_valid_token(self):
+        verifier = AccessTokenVerifier('secret')
+        self.assertEqual(verifier.get_user(self.token()), {'id': 7, 'email': 'user@example.com'})
+
+    def test_expired_token_is_rejected(self):
+        fetch_user = mock.Mock()
+        verifier = AccessTokenVerifier('secret', fetch_user=fetch_user)
+        self.assertIsNone(verifier.get_user(self.token(exp=int(time.time()) - 10)))
+        fetch_user.assert_not_called()
+
+    def test_refresh_token_is_rejected(self):
+        verifier = AccessTokenVerifier('secret')
+        self.assertIsNone(verifier.get_user(self.token(token_type='refresh')))
+
+    def test_bad_signature_is_rejected_and_logged(self):
+        verifier = AccessTokenVerifier('secret')
+        with self.assertLogs('shared.tokens', 'WARNING'):
+            self.assertIsNone(verifier.get_user(self.token(key='other-secret')))
+
+    def test_token_without_email_asks_user_service(self):
+        fetch_user = mock.Mock(return_value={'id': 7, 'email': 'user@example.com'})
+        verifier = AccessTokenVerifier('secret', fetch_user=fetch_user)
+        token = self.token(email=None)
+        self.assertEqual(verifier.get_user(token), {'id': 7, 'email': 'user@example.com'})
+        fetch_user.assert_called_once_with(token)
+
+    def test_without_key_uses_user_service(self):
+        fetch_user = mock.Mock(return_value=None)
+        verifier = AccessTokenVerifier('', fetch_user=fetch_user)
+        self.assertIsNone(verifier.get_user(self.token()))
+        fetch_user.assert_called_once()
+
+
+class TokenCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('shared.tokens.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, expires_in, user_id=7):
+        return jwt.encode({'user_id': user_id, 'exp': int(time.time()) + expires_in},
+                          'secret', algorithm='HS256')
+
+    def test_ttl_is_capped_at_token_exp(self):
+        cache = TokenCache({'TTL': 300})
+        token = self.token(expires_in=30)
+        cache.set(token, {'id': 7})
+        self.now += 25
+        self.assertEqual(cache.get(token), (True, {'id': 7}))
+        self.now += 10
+        self.assertEqual(cache.get(token), (False, None))
+
+    def test_expired_token_is_not_cached(self):
+        cache = TokenCache()
+        cache.set(self.token(expires_in=-10), {'id': 7})
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_invalid_result_uses_negative_ttl(self):
+        cache = TokenCache({'TTL': 300, 'NEGATIVE_TTL': 5})
+        token = self.token(expires_in=600)
+        cache.set(token, None)
+        self.assertEqual(cache.get(token), (True, None))
+        self.now += 6
+        self.assertEqual(cache.get(token), (False, None))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TokenCache({'MAX_SIZE': 2})
+        tokens = [self.token(expires_in=600, user_id=user_id) for user_id in range(3)]
+        cache.set(tokens[0], 0)
+        cache.set(tokens[1], 1)
+        cache.get(tokens[0])
+        cache.set(tokens[2], 2)
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertEqual(cache.get(tokens[1]), (False, None))
+        self.assertEqual(cache.get(tokens[0]), (True, 0))
+        self.assertEqual(cache.get(tokens[2]), (True, 2))
+
+    def test_decorator_calls_function_once(self):
+        fetch_user = mock.Mock(return_value={'id': 7})
+        cached = cached_by_token(TokenCache())(fetch_user)
+        token = self.token(expires_in=600)
+        self.assertEqual(cached(token), {'id': 7})
+        self.assertEqual(cached(token), {'id': 7})
+        fetch_user.assert_called_once_with(token)
+        self.assertEqual(cached.cache.stats()['hits'], 1)
+
+
+class HealthCheckTests(SimpleTestCase):
+
+    def test_health_is_cheap_and_stats_are_separate(self):
+        response = self.client.get('/health/')
+        self.assertEqual(response.json(), {'status': 'healthy', 'service': 'order-service'})
+        response = self.client.get('/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'user_token_cache', 'service_client'})
@@ -10,6 +10,8 @@ from .serializers import (OrderSerializer, CreateOrderSerializer,
                           UpdateOrderStatusSerializer)
 from .services import CartService, ProductService, UserService, event_bus
 
+from shared.deadline import DeadlineExceeded
+
 import logging
 
 
@@ -75,8 +77,8 @@ def create_order(request):
             logger.info(
                 f"Cart data for user {user_id}: {len(cart_data['items'])} items")
 
-            # Отримуємо інформацію о користувачі
-            user_data = UserService.get_user_from_token(token)
+            # Користувача вже визначив JWTAuthenticationMiddleware
+            user_data = getattr(request, 'user_data', None) or UserService.get_user_from_token(token)
             if not user_data:
                 return Response({
                     'error': 'User not found'
@@ -162,6 +164,11 @@ def create_order(request):
                 ProductService.release_products(items_to_reserve)
                 raise
 
+    except DeadlineExceeded:
+        logger.error(f"Deadline exceeded while creating order for user {user_id}")
+        return Response({
+            'error': 'Request deadline exceeded'
+        }, status=status.HTTP_504_GATEWAY_TIMEOUT)
     except Exception as e:
         logger.error(f"Error creating order: {e}")
         return Response({
@@ -1,24 +1,33 @@
-import jwt
-import requests
 from django.http import JsonResponse
 from django.conf import settings
 
+from shared.tokens import AccessTokenVerifier, get_bearer_token
+
 
 class JWTAuthenticationMiddleware:
     '''Middleware для перевірки JWT токенів від інших сервісів.'''
 
     def __init__(self, get_response):
         self.get_response = get_response
+        # Токен перевіряється локально, email береться з claims
+        self.token_verifier = AccessTokenVerifier(
+            settings.JWT_VERIFYING_KEY or settings.JWT_SIGNING_KEY,
+            settings.JWT_ALGORITHM)
 
     def __call__(self, request):
-        # Перевіряємо токен для адмінских запитів
-        if request.method in ['POST', 'PUT', 'PATCH', 'DELETE'] and '/admin/' not in request.path:
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-                # В налаштуваннях має бути вказаний секретний ключ для перевірки токенів
-                # та URL сервісу аутентифікації
-                pass
+        request.user_id = None
+        request.user_email = ''
+
+        # Без ключа перевірити токен неможливо - каталог працює без автентифікації
+        token = get_bearer_token(request)
+        if token and self.token_verifier.key and '/admin/' not in request.path:
+            user_data = self.token_verifier.get_user(token)
+            if user_data:
+                request.user_id = user_data['id']
+                request.user_email = user_data['email']
+            elif request.method in ['POST', 'PUT', 'PATCH', 'DELETE']:
+                # Недійсний токен у запиті на зміну даних
+                return JsonResponse({'error': 'Invalid token'}, status=401)
 
         response = self.get_response(request)
         return response
@@ -1,3 +1,47 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+import jwt
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .middleware import JWTAuthenticationMiddleware
+
+
+@override_settings(JWT_SIGNING_KEY='secret', JWT_VERIFYING_KEY='')
+class JWTAuthenticationTests(SimpleTestCase):
+
+    def call(self, method, token):
+        request = getattr(RequestFactory(), method)(
+            '/api/products/', headers={'Authorization': f'Bearer {token}'})
+        response = JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+        return request, response
+
+    def token(self, key='secret', **claims):
+        claims = dict({'user_id': 7, 'email': 'user@example.com', 'token_type': 'access',
+                       'exp': int(time.time()) + 60}, **claims)
+        return jwt.encode(claims, key, algorithm='HS256')
+
+    def test_valid_token_sets_user(self):
+        request, response = self.call('post', self.token())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request.user_id, 7)
+        self.assertEqual(request.user_email, 'user@example.com')
+
+    def test_invalid_token_on_write_gets_401(self):
+        for token in ['garbage', self.token(exp=int(time.time()) - 10),
+                      self.token(token_type='refresh')]:
+            for method in ['post', 'put', 'patch', 'delete']:
+                with self.subTest(method=method, token=token):
+                    _, response = self.call(method, token)
+                    self.assertEqual(response.status_code, 401)
+
+    def test_invalid_token_on_read_is_anonymous(self):
+        request, response = self.call('get', 'garbage')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(request.user_id)
+
+    @override_settings(JWT_SIGNING_KEY='')
+    def test_without_key_tokens_are_not_checked(self):
+        request, response = self.call('post', 'garbage')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(request.user_id)
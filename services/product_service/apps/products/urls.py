@@ -6,6 +6,7 @@ urlpatterns = [
     path('categories/<slug:slug>/',
          views.CategoryDetailView.as_view(), name='category-detail'),
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/batch/', views.product_batch, name='product-batch'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(),
          name='product-detail'),
     path('products/<int:product_id>/reserve/',
@@ -65,6 +65,29 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         return ProductDetailSerializer
 
 
+# Найбільше товарів в одному batch запиті
+MAX_BATCH_PRODUCTS = 100
+
+
+@api_view(['GET'])
+def product_batch(request):
+    '''Кілька товарів одним запитом: ?ids=1,2,3 (відсутніх немає в results).'''
+    try:
+        ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+    except ValueError:
+        return Response({
+            'error': 'ids must be a comma-separated list of integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(ids) > MAX_BATCH_PRODUCTS:
+        return Response({
+            'error': f'At most {MAX_BATCH_PRODUCTS} products per request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    products = Product.objects.filter(id__in=ids).select_related('category')
+    return Response({'results': ProductSerializer(products, many=True).data})
+
+
 @api_view(['POST'])
 def reserve_product(request, product_id):
     '''Резервування продукту шляхом зменшення кількості на складі.'''
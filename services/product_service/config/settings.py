@@ -1,8 +1,12 @@
+import sys
 from pathlib import Path
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Спільні модулі (shared/) лежать в корені репозиторію
+sys.path.append(str(BASE_DIR.parent.parent))
+
 SECRET_KEY = config('SECRET_KEY')
 DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
@@ -93,6 +97,12 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Локальна перевірка access токенів user-service (його SIMPLE_JWT ключ).
+# Без ключа токени не перевіряються
+JWT_SIGNING_KEY = config('JWT_SIGNING_KEY', default='')
+JWT_VERIFYING_KEY = config('JWT_VERIFYING_KEY', default='')
+JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
+
 # Redis настройки
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
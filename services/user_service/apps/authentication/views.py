@@ -21,6 +21,8 @@ def login_view(request):
 
     if user and user.is_active:
         refresh = RefreshToken.for_user(user)
+        # email в токені - gateway і сервіси беруть його без запиту до user-service
+        refresh['email'] = user.email
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -0,0 +1,227 @@
+import random
+import threading
+import time
+import logging
+from collections import deque
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared import memo as request_memo
+from shared.deadline import deadline_headers, remaining, timeout_for
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CLIENT_SETTINGS = {
+    'TIMEOUT': 10,
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': 20,
+    # Повтори тільки для ідемпотентних методів
+    'RETRIES': 2,
+    'RETRY_METHODS': ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'],
+    'RETRY_STATUSES': [502, 503, 504],
+    # Пауза перед повтором - випадкова в [0, min(MAX, BASE * 2^спроба)]
+    'BACKOFF_BASE': 0.05,
+    'BACKOFF_MAX': 1.0,
+    'LATENCY_SAMPLES': 500,
+}
+
+
+def json_or_none(response: requests.Response) -> Optional[Any]:
+    """Декодер відповіді: JSON для 200, інакше None"""
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+def is_ok(response: requests.Response) -> bool:
+    """Декодер відповіді: чи успішний виклик"""
+    return response.status_code == 200
+
+
+class EndpointStats:
+    """Затримки викликів одного endpoint"""
+
+    def __init__(self, size: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float, error: bool):
+        self.calls += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+        self._samples.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 2)
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': round(self.total / self.calls * 1000, 2) if self.calls else None,
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+        }
+
+
+class ServiceClient:
+    """HTTP клієнт для викликів між сервісами.
+
+    Для кожного сервіса - своя requests.Session з пулом keep-alive
+    з'єднань. Таймаут кожного виклику обмежується дедлайном запиту
+    (shared.deadline), ідемпотентні виклики повторюються з випадковою
+    паузою. Налаштування: 'default' + перевизначення по сервісу.
+    """
+
+    def __init__(self, base_urls: Dict[str, str], options: Optional[Dict[str, Dict]] = None):
+        self.base_urls = {name: url.rstrip('/') for name, url in base_urls.items()}
+        self._options = options or {}
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get_options(self, service: str) -> Dict[str, Any]:
+        options = dict(DEFAULT_CLIENT_SETTINGS)
+        options.update(self._options.get('default', {}))
+        options.update(self._options.get(service, {}))
+        return options
+
+    def session(self, service: str) -> requests.Session:
+        session = self._sessions.get(service)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(service)
+                if session is None:
+                    options = self.get_options(service)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=options['POOL_CONNECTIONS'],
+                        pool_maxsize=options['POOL_MAXSIZE'])
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[service] = session
+        return session
+
+    def _endpoint_stats(self, service: str, endpoint: str) -> EndpointStats:
+        key = (service, endpoint)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(
+                    key, EndpointStats(self.get_options(service)['LATENCY_SAMPLES']))
+        return stats
+
+    def backoff(self, options: Dict[str, Any], attempt: int) -> float:
+        return random.uniform(
+            0, min(options['BACKOFF_MAX'], options['BACKOFF_BASE'] * 2 ** attempt))
+
+    def request(self, service: str, method: str, path: str, *,
+                params: Optional[Dict] = None, json: Any = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout: Optional[float] = None, retries: Optional[int] = None,
+                decode: Optional[Callable[[requests.Response], Any]] = None,
+                endpoint: Optional[str] = None, use_deadline: bool = True,
+                memoize: bool = True) -> Any:
+        """Виклик сервіса.
+
+        decode(response) - що повернути замість відповіді; endpoint - назва
+        для метрик (шаблон шляху, напр. '/api/products/{id}/'); use_deadline=False
+        - виклик не обмежується дедлайном запиту (компенсуючі дії).
+        Декодовані результати GET/HEAD в межах запиту беруться з memo
+        (shared.memo), якщо не вказано memoize=False.
+        Помилки з'єднання після всіх повторів - requests.RequestException.
+        """
+        method = method.upper()
+        send = partial(
+            self._send, service, method, path, params=params, json=json, headers=headers,
+            timeout=timeout, retries=retries, decode=decode, endpoint=endpoint,
+            use_deadline=use_deadline)
+        # Сиру відповідь можна прочитати тільки один раз - її не кешуємо
+        if not (memoize and decode and method in ('GET', 'HEAD')):
+            return send()
+
+        # Той самий виклик з іншим decode - інший результат
+        key = (service, method, path, repr(sorted((params or {}).items())),
+               (headers or {}).get('Authorization'), decode)
+        return request_memo.memoize(key, send, label=f"{service} {method} {endpoint or path}")
+
+    def _send(self, service: str, method: str, path: str, *, params, json, headers,
+              timeout, retries, decode, endpoint, use_deadline) -> Any:
+        options = self.get_options(service)
+        url = f"{self.base_urls[service]}{path}"
+        stats = self._endpoint_stats(service, f"{method} {endpoint or path}")
+        if retries is None:
+            retries = options['RETRIES'] if method in options['RETRY_METHODS'] else 0
+        timeout = timeout or options['TIMEOUT']
+
+        attempt = 0
+        while True:
+            request_headers = dict(headers or {})
+            if use_deadline:
+                request_headers.update(deadline_headers())
+            call_timeout = timeout_for(timeout) if use_deadline else timeout
+
+            started = time.perf_counter()
+            try:
+                response = self.session(service).request(
+                    method, url, params=params, json=json,
+                    headers=request_headers, timeout=call_timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                stats.observe(time.perf_counter() - started, error=True)
+                # Таймаут читання не повторюємо: він з'їв би весь бюджет часу
+                retryable = isinstance(e, requests.exceptions.ConnectionError)
+                if not retryable or not self._sleep_before_retry(options, attempt, retries, use_deadline):
+                    raise
+                stats.retries += 1
+                attempt += 1
+                logger.warning(f"Retrying {method} {url} after error: {e}")
+                continue
+
+            stats.observe(time.perf_counter() - started, error=response.status_code >= 500)
+            if (response.status_code in options['RETRY_STATUSES']
+                    and self._sleep_before_retry(options, attempt, retries, use_deadline)):
+                response.close()
+                stats.retries += 1
+                attempt += 1
+                logger.warning(f"Retrying {method} {url} after status {response.status_code}")
+                continue
+            return decode(response) if decode else response
+
+    def _sleep_before_retry(self, options, attempt, retries, use_deadline) -> bool:
+        """Пауза перед повтором; False - повторювати не можна"""
+        if attempt >= retries:
+            return False
+        delay = self.backoff(options, attempt)
+        left = remaining() if use_deadline else None
+        if left is not None and left <= delay:
+            return False
+        time.sleep(delay)
+        return True
+
+    def get(self, service: str, path: str, **kwargs) -> Any:
+        return self.request(service, 'GET', path, **kwargs)
+
+    def post(self, service: str, path: str, **kwargs) -> Any:
+        return self.request(service, 'POST', path, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{сервіс: {'METHOD endpoint': затримки}}"""
+        result = {}
+        for (service, endpoint), stats in list(self._stats.items()):
+            result.setdefault(service, {})[endpoint] = stats.snapshot()
+        return result
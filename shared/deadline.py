@@ -0,0 +1,97 @@
+import contextvars
+import time
+from typing import Dict, Optional
+
+from django.http import JsonResponse
+
+
+# Скільки мілісекунд лишилось на обробку запиту. Передається відносним
+# значенням, щоб не залежати від розбіжності годинників між хостами
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+# Дедлайн поточного запиту (time.monotonic()) або None
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Час на обробку запиту вичерпано"""
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Значення заголовка -> секунди або None"""
+    if not value:
+        return None
+    try:
+        return int(value) / 1000
+    except (TypeError, ValueError):
+        return None
+
+
+def set_deadline(deadline: Optional[float]):
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Секунди до дедлайна поточного запиту або None, якщо його немає"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout_for(default: float) -> float:
+    """Таймаут для виклику іншого сервіса: не довший за залишок часу"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+def deadline_headers() -> Dict[str, str]:
+    """Заголовок з залишком часу для наступного сервіса"""
+    left = remaining()
+    if left is None:
+        return {}
+    return {DEADLINE_HEADER: str(max(0, int(left * 1000)))}
+
+
+def deadline_exceeded_response():
+    return JsonResponse({'error': 'Request deadline exceeded'}, status=504)
+
+
+class DeadlineMiddleware:
+    """Встановлює дедлайн запиту з заголовка.
+
+    Запит, дедлайн якого вже минув, не обробляється; DeadlineExceeded
+    з викликів інших сервісів у view перетворюється на 504. Виключення
+    з middleware Django перетворює на відповідь ще до цього middleware,
+    тому middleware, які викликають інші сервіси, обробляють
+    DeadlineExceeded самі (deadline_exceeded_response).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timeout = parse_timeout(request.headers.get(DEADLINE_HEADER))
+        if timeout is None:
+            return self.get_response(request)
+        if timeout <= 0:
+            return deadline_exceeded_response()
+
+        token = set_deadline(time.monotonic() + timeout)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_deadline(token)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, DeadlineExceeded):
+            return deadline_exceeded_response()
+        return None
@@ -0,0 +1,55 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Dict, Any, Optional
+
+
+# Заголовок з ідентичністю користувача, яку gateway перевірив по JWT
+IDENTITY_HEADER = 'X-Internal-Identity'
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _signature(payload: str, secret: str) -> str:
+    digest = hmac.new(secret.encode('utf-8'),
+                      payload.encode('ascii'), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def sign_identity(identity: Dict[str, Any], secret: str) -> str:
+    """Підписує ідентичність (user_id, email, exp) для передачі сервісам"""
+    payload = _b64encode(json.dumps(
+        identity, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+    return f"{payload}.{_signature(payload, secret)}"
+
+
+def verify_identity(value: Optional[str], secret: str) -> Optional[Dict[str, Any]]:
+    """Перевіряє підпис і термін дії заголовка, повертає ідентичність або None"""
+    if not value or not secret:
+        return None
+
+    payload, _, signature = value.partition('.')
+    if not payload or not signature:
+        return None
+    try:
+        # Заголовок приходить від клієнта: не-ASCII значення - підробка, а не помилка
+        if not hmac.compare_digest(signature.encode('ascii'),
+                                   _signature(payload, secret).encode('ascii')):
+            return None
+        identity = json.loads(_b64decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+
+    if not isinstance(identity, dict) or identity.get('user_id') is None:
+        return None
+    if identity.get('exp', 0) <= time.time():
+        return None
+    return identity
@@ -0,0 +1,70 @@
+import contextvars
+import logging
+from collections import Counter
+from typing import Any, Callable, Hashable, Optional
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Заголовок з кількістю повторних викликів (тільки в DEBUG)
+DUPLICATE_CALLS_HEADER = 'X-Upstream-Duplicate-Calls'
+
+# Memo поточного запиту або None поза запитом
+_memo = contextvars.ContextVar('request_memo', default=None)
+
+
+class RequestMemo:
+    """Результати читань з інших сервісів в межах одного запиту"""
+
+    def __init__(self):
+        self.values = {}
+        self.duplicates = Counter()
+
+    def get_or_call(self, key: Hashable, func: Callable[[], Any], label: str = '') -> Any:
+        if key in self.values:
+            self.duplicates[label or str(key)] += 1
+            return self.values[key]
+        value = func()
+        self.values[key] = value
+        return value
+
+
+def current_memo() -> Optional[RequestMemo]:
+    return _memo.get()
+
+
+def memoize(key: Hashable, func: Callable[[], Any], label: str = '') -> Any:
+    """func() один раз на запит для key; поза запитом - без кешування"""
+    memo = _memo.get()
+    if memo is None:
+        return func()
+    return memo.get_or_call(key, func, label)
+
+
+class RequestMemoMiddleware:
+    """Створює memo на час запиту.
+
+    В DEBUG кількість викликів, відданих з memo, повертається в
+    заголовку X-Upstream-Duplicate-Calls і пишеться в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        memo = RequestMemo()
+        token = _memo.set(memo)
+        try:
+            response = self.get_response(request)
+        finally:
+            _memo.reset(token)
+
+        if settings.DEBUG and memo.duplicates:
+            response[DUPLICATE_CALLS_HEADER] = str(sum(memo.duplicates.values()))
+            logger.info(
+                f"Duplicate upstream calls for {request.method} {request.path}: "
+                f"{dict(memo.duplicates)}")
+        return response
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import jwt
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TOKEN_CACHE_SETTINGS = {
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+    # Недійсні токени кешуються коротко: користувач може одразу увійти знову
+    'NEGATIVE_TTL': 5,
+}
+
+
+def get_bearer_token(request) -> Optional[str]:
+    """Токен з заголовка Authorization: Bearer <token>"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header[len('Bearer '):].strip() or None
+    return None
+
+
+def decode_access_token(token: str, key: str,
+                        algorithm: str = 'HS256') -> Optional[Dict[str, Any]]:
+    """Перевіряє access токен simplejwt (підпис, exp, тип) і повертає claims"""
+    try:
+        claims = jwt.decode(token, key, algorithms=[algorithm])
+    except (jwt.InvalidSignatureError, jwt.InvalidAlgorithmError) as e:
+        # Зазвичай - не той ключ в налаштуваннях, а не підроблений токен
+        logger.warning(f"Access token signature check failed: {e}")
+        return None
+    except jwt.InvalidTokenError as e:
+        logger.debug(f"Invalid access token: {e}")
+        return None
+
+    if claims.get('token_type') != 'access':
+        return None
+    return claims
+
+
+class AccessTokenVerifier:
+    """Автентифікація сервісу по access токену без запиту до user-service.
+
+    Підпис, exp і тип токена перевіряються локально; fetch_user(token)
+    (запит до user-service) викликається тільки якщо в токені немає
+    потрібних claims. Без ключа (key порожній) локальна перевірка
+    неможлива - тоді користувача повертає fetch_user.
+    """
+
+    def __init__(self, key: str, algorithm: str = 'HS256', user_id_claim: str = 'user_id',
+                 fetch_user: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.key = key
+        self.algorithm = algorithm
+        self.user_id_claim = user_id_claim
+        self.fetch_user = fetch_user
+
+    def get_user(self, token: str) -> Optional[Dict[str, Any]]:
+        """{'id', 'email'} користувача токена або None для недійсного токена"""
+        if not self.key:
+            return self.fetch_user(token) if self.fetch_user else None
+
+        claims = decode_access_token(token, self.key, self.algorithm)
+        if not claims or claims.get(self.user_id_claim) is None:
+            return None
+
+        user = {'id': claims[self.user_id_claim], 'email': claims.get('email')}
+        if user['email'] is None and self.fetch_user:
+            # Токени, видані до появи email в claims
+            user_data = self.fetch_user(token)
+            if user_data:
+                user['email'] = user_data.get('email')
+        if user['email'] is None:
+            user['email'] = ''
+        return user
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """exp токена без перевірки підпису (тільки для обмеження TTL кешу)"""
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None
+    exp = claims.get('exp')
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+class TokenCache:
+    """LRU кеш з TTL для результатів, отриманих по токену.
+
+    Ключ - sha256 токена, сам токен в пам'яті не зберігається. Запис живе
+    не довше за exp токена; None (недійсний токен) - NEGATIVE_TTL секунд.
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        self.options = dict(DEFAULT_TOKEN_CACHE_SETTINGS)
+        self.options.update(options or {})
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token: str) -> Tuple[bool, Any]:
+        """(знайдено, значення)"""
+        key = self.make_key(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, token: str, value: Any):
+        ttl = self.options['TTL'] if value is not None else self.options['NEGATIVE_TTL']
+        exp = get_token_expiry(token)
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+
+        key = self.make_key(token)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.options['MAX_SIZE']:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+def cached_by_token(cache: TokenCache):
+    """Декоратор для func(token): результат береться з cache"""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(token):
+            found, value = cache.get(token)
+            if found:
+                return value
+            value = func(token)
+            cache.set(token, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -5,6 +5,9 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 import logging
 
+from shared.client import ServiceClient
+from shared.tokens import TokenCache, cached_by_token
+
 logger = logging.getLogger(__name__)
 
 # Redis клиент для межсервисного взаимодействия
@@ -54,25 +57,22 @@ class ServiceCommunication:
         'order-service': 'http://localhost:8003'
     }
 
+    # Пули з'єднань, повтори і метрики - в ServiceClient
+    client = ServiceClient(BASE_URLS)
+
     @classmethod
     def make_request(cls, service: str, endpoint: str, method: str = 'GET',
                      data: Optional[Dict] = None, headers: Optional[Dict] = None):
         """Выполнение HTTP запроса к другому сервису"""
         try:
-            url = f"{cls.BASE_URLS[service]}{endpoint}"
-            response = requests.request(
-                method=method,
-                url=url,
-                json=data,
-                headers=headers or {},
-                timeout=10
-            )
-            return response
+            return cls.client.request(
+                service, method, endpoint, json=data, headers=headers)
         except requests.exceptions.RequestException as e:
             logger.error(f"Service communication error: {service} - {e}")
             return None
 
 
+@cached_by_token(TokenCache())
 def get_user_from_token(token: str) -> Optional[Dict]:
     """Получение информации о пользователе по токену"""
     headers = {'Authorization': f'Bearer {token}'}